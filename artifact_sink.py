@@ -0,0 +1,285 @@
+import copy
+import importlib.util
+import io
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Папка отчетов по умолчанию (можно переопределить переменной окружения)
+DEFAULT_OUTPUT_DIR = os.environ.get('PORTFOLIO_OUTPUT_DIR',
+                                    os.path.join(os.path.expanduser('~'), 'portfolio_reports'))
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.csv': 'text/csv; charset=utf-8',
+    '.json': 'application/json',
+}
+
+
+def content_type(name):
+    """MIME-тип артефакта по расширению имени"""
+    return CONTENT_TYPES.get(os.path.splitext(name)[1].lower(), 'application/octet-stream')
+
+
+class ArtifactSink:
+    """
+    Хранилище артефактов (HTML-отчетов, Excel-файлов).
+
+    Артефакт записывается через open(name) в блоке with и становится видимым
+    целиком только после успешного выхода из блока: при исключении частично
+    записанные данные отбрасываются. Имена могут содержать '/' для вложенности.
+
+    Args:
+        prefix (str, optional): Префикс имен (подпапка) для всех артефактов
+    """
+
+    def __init__(self, prefix=''):
+        self.prefix = prefix.strip('/')
+        self.artifacts = {}
+        self.errors = {}
+
+    def key(self, name):
+        """Полное имя артефакта с префиксом"""
+        return f"{self.prefix}/{name}" if self.prefix else name
+
+    def child(self, name):
+        """Хранилище для подпапки name, использующее те же ресурсы (папку, буфер, клиент S3)"""
+        sink = copy.copy(self)
+        sink.prefix = self.key(name)
+        sink.artifacts = {}
+        sink.errors = {}
+        return sink
+
+    @contextmanager
+    def open(self, name, mode='w'):
+        """
+        Открывает артефакт на запись.
+
+        Args:
+            name (str): Имя артефакта
+            mode (str, optional): 'w' - текст в UTF-8, 'wb' - байты
+        """
+        if mode not in ('w', 'wb'):
+            raise ValueError(f"Неподдерживаемый режим записи: {mode}")
+        buffer = self._begin(name)
+        stream = io.TextIOWrapper(buffer, encoding='utf-8', newline='') if mode == 'w' else buffer
+        try:
+            yield stream
+            if mode == 'w':
+                stream.flush()
+                stream.detach()
+        except BaseException:
+            self._abort(name, buffer)
+            raise
+        self._commit(name, buffer)
+
+    def write(self, name, data):
+        """Записывает артефакт целиком (str или bytes)"""
+        with self.open(name, 'w' if isinstance(data, str) else 'wb') as stream:
+            stream.write(data)
+
+    def flush(self):
+        """
+        Дожидается завершения записи всех артефактов.
+
+        Returns:
+            dict: Имя артефакта -> расположение (путь, URL)
+        """
+        return dict(self.artifacts)
+
+    def close(self):
+        return self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    def _begin(self, name):
+        raise NotImplementedError
+
+    def _commit(self, name, buffer):
+        raise NotImplementedError
+
+    def _abort(self, name, buffer):
+        buffer.close()
+
+
+class LocalSink(ArtifactSink):
+    """
+    Артефакты в локальной папке. Запись идет во временный файл в той же папке,
+    который после закрытия атомарно переименовывается в целевой (os.replace).
+
+    Args:
+        directory (str, optional): Папка отчетов. По умолчанию - DEFAULT_OUTPUT_DIR.
+    """
+
+    def __init__(self, directory=None, prefix=''):
+        super().__init__(prefix)
+        self.directory = DEFAULT_OUTPUT_DIR if directory is None else directory
+
+    @property
+    def location(self):
+        """Папка, в которую пишутся артефакты этого хранилища (с учетом префикса)"""
+        return os.path.join(self.directory, *self.prefix.split('/')) if self.prefix else self.directory
+
+    def path(self, name):
+        return os.path.join(self.directory, *self.key(name).split('/'))
+
+    def _begin(self, name):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # open(..., 'x') создает файл с правами 0o666 с учетом umask, как обычный open();
+        # NamedTemporaryFile дал бы 0o600, и os.replace перенес бы их на отчет
+        temp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{os.urandom(8).hex()}.tmp")
+        return open(temp_path, 'x+b')
+
+    def _commit(self, name, buffer):
+        buffer.close()
+        os.replace(buffer.name, self.path(name))
+        self.artifacts[name] = self.path(name)
+
+    def _abort(self, name, buffer):
+        buffer.close()
+        if os.path.exists(buffer.name):
+            os.unlink(buffer.name)
+
+
+class MemorySink(ArtifactSink):
+    """
+    Артефакты в памяти процесса (для тестов и дальнейшей передачи без файловой системы).
+    Дочерние хранилища (child) пишут в общий словарь objects.
+    """
+
+    def __init__(self, prefix=''):
+        super().__init__(prefix)
+        self.objects = {}
+
+    def getvalue(self, name):
+        """Содержимое артефакта в байтах"""
+        return self.objects[self.key(name)]
+
+    def _begin(self, name):
+        return io.BytesIO()
+
+    def _commit(self, name, buffer):
+        self.objects[self.key(name)] = buffer.getvalue()
+        self.artifacts[name] = f"memory://{self.key(name)}"
+
+
+def _load_converter_module(name):
+    """Загружает модуль html_converter_ios по пути к файлу под закрытым именем"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'html_converter_ios', f"{name}.py")
+    spec = importlib.util.spec_from_file_location(f"_html_converter_ios_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@lru_cache(maxsize=None)
+def _converter_s3_module():
+    """
+    Модуль s3 из html_converter_ios. Он рассчитан на запуск из своей папки и импортирует
+    constants как модуль верхнего уровня: на время загрузки под этим именем подставляется
+    constants конвертера, затем прежнее значение восстанавливается. sys.path не меняется.
+    """
+    constants = _load_converter_module('constants')
+    previous = sys.modules.get('constants')
+    sys.modules['constants'] = constants
+    try:
+        return _load_converter_module('s3')
+    finally:
+        if previous is None:
+            del sys.modules['constants']
+        else:
+            sys.modules['constants'] = previous
+
+
+def _default_s3_client():
+    """S3Client из html_converter_ios"""
+    return _converter_s3_module().S3Client()
+
+
+class S3Sink(ArtifactSink):
+    """
+    Артефакты в S3-совместимом хранилище через html_converter_ios.s3.S3Client.
+
+    Артефакт рендерится в буфер в памяти (без временных файлов) и после закрытия
+    отправляется одним put_object в пуле потоков, поэтому загрузки идут параллельно
+    с расчетом следующих отчетов. Объект в S3 появляется только целиком.
+    flush() дожидается загрузок и возвращает URL.
+
+    Args:
+        client (S3Client, optional): Клиент с методом upload_bytes(data, key, content_type)
+        client_factory (callable, optional): Создает клиент при первой загрузке (в том числе
+            в дочерних процессах, куда клиент не передается). По умолчанию - S3Client().
+        prefix (str, optional): Префикс ключей
+        max_workers (int, optional): Число параллельных загрузок
+    """
+
+    def __init__(self, client=None, client_factory=None, prefix='', max_workers=8):
+        super().__init__(prefix)
+        self.client_factory = client_factory or _default_s3_client
+        self.max_workers = max_workers
+        # Клиент и пул общие для всех дочерних хранилищ
+        self._shared = {'client': client, 'executor': None, 'lock': threading.Lock()}
+        self._pending = {}
+
+    def child(self, name):
+        sink = super().child(name)
+        sink._pending = {}
+        return sink
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shared'] = None
+        state['_pending'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shared = {'client': None, 'executor': None, 'lock': threading.Lock()}
+
+    def _resources(self):
+        shared = self._shared
+        with shared['lock']:
+            if shared['client'] is None:
+                shared['client'] = self.client_factory()
+            if shared['executor'] is None:
+                shared['executor'] = ThreadPoolExecutor(max_workers=self.max_workers)
+        return shared['client'], shared['executor']
+
+    def _begin(self, name):
+        return io.BytesIO()
+
+    def _commit(self, name, buffer):
+        client, executor = self._resources()
+        self._pending[name] = executor.submit(client.upload_bytes, buffer.getvalue(), self.key(name), content_type(name))
+
+    def flush(self):
+        for name, future in self._pending.items():
+            success, message = future.result()
+            if success:
+                self.artifacts[name] = message
+            else:
+                self.errors[name] = message
+        self._pending = {}
+        if self.errors:
+            raise IOError("Не удалось загрузить: " + "; ".join(f"{name}: {error}" for name, error in self.errors.items()))
+        return dict(self.artifacts)
+
+    def close(self):
+        try:
+            return self.flush()
+        finally:
+            shared = self._shared
+            with shared['lock']:
+                if shared['executor'] is not None:
+                    shared['executor'].shutdown(wait=True)
+                    shared['executor'] = None
@@ -0,0 +1,159 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from portfolio_volatile import PortfolioVolatilityAnalyzer, extract_portfolio_from_screenshots
+from artifact_sink import LocalSink
+from excel_export import DECIMAL_FORMAT, ExcelExporter
+from position_book import PositionBook
+from price_store import ClosePanelSource, PriceStore, YFinanceSource
+
+# Общая панель цен в процессе-воркере (подключается один раз через initializer)
+_PANEL = {}
+
+
+def _portfolio_tickers(portfolio_data):
+    """Тикеры акций и базовых активов опционов портфеля"""
+    if isinstance(portfolio_data, PositionBook):
+        return set(portfolio_data.underlying)
+    tickers = set()
+    for item in portfolio_data:
+        if item.get('type', 'stock') == 'stock':
+            tickers.add(item['ticker'])
+        else:
+            tickers.add(item.get('underlying', item['ticker'].split()[0]))
+    return tickers
+
+
+def _attach_panel(shm_name, shape, dates, columns):
+    """Подключает панель цен из разделяемой памяти без копирования"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    values = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    _PANEL['shm'] = shm
+    _PANEL['close'] = pd.DataFrame(values, index=pd.DatetimeIndex(dates), columns=columns, copy=False)
+
+
+def _analyze_portfolio(task):
+    """Рассчитывает метрики (и при необходимости отчеты) для одного портфеля"""
+    name, portfolio_data, settings = task
+    result = {'portfolio': name, 'error': None}
+    try:
+        analyzer = PortfolioVolatilityAnalyzer(
+            portfolio_data=portfolio_data,
+            benchmark_ticker=settings['benchmark_ticker'],
+            start_date=settings['start_date'],
+            end_date=settings['end_date'],
+            risk_free_rate=settings['risk_free_rate'],
+            price_source=ClosePanelSource(_PANEL['close'])
+        )
+        beta = analyzer.calculate_beta()
+        volatility = analyzer.calculate_volatility()
+        var = analyzer.calculate_var()
+        sharpe = analyzer.calculate_sharpe_ratio()
+        result.update({
+            'portfolio_beta': beta['portfolio_beta'],
+            'portfolio_volatility': volatility['portfolio_volatility'],
+            'relative_volatility': volatility['relative_volatility'],
+            'portfolio_correlation': analyzer.calculate_correlation()['portfolio_correlation'],
+            'historical_var': var['historical_var'],
+            'parametric_var': var['parametric_var'],
+            'portfolio_sharpe': sharpe['portfolio_sharpe'],
+            'tracking_error': analyzer.calculate_tracking_error(),
+            'stale_price_tickers': ', '.join(analyzer.stale_price_tickers),
+        })
+
+        if settings['output'] is not None:
+            analyzer.output = settings['output'].child(str(name))
+            analyzer.generate_extended_report()
+            result['artifacts'] = analyzer.output.flush()
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def run_batch(portfolios, benchmark_ticker='^IXIC', start_date=None, end_date=None, risk_free_rate=0.04,
+              price_source=None, output=None, n_jobs=None):
+    """
+    Пакетный анализ множества портфелей.
+
+    Цены объединения тикеров всех портфелей загружаются один раз в общую панель,
+    которая передается воркерам через разделяемую память (без копирования в каждый процесс).
+    Расчет метрик и отчетов распределяется по пулу процессов.
+
+    Args:
+        portfolios (dict): Имя портфеля -> список позиций (формат portfolio_data анализатора)
+        benchmark_ticker (str, optional): Тикер бенчмарка
+        start_date (str, optional): Начальная дата 'YYYY-MM-DD'. По умолчанию - начало года.
+        end_date (str, optional): Конечная дата 'YYYY-MM-DD'. По умолчанию - сегодня.
+        risk_free_rate (float, optional): Безрисковая ставка
+        price_source (PriceSource, optional): Источник котировок. По умолчанию - локальный кэш PriceStore.
+        output (str | ArtifactSink, optional): Папка или хранилище артефактов для отчетов
+            (по подпапке на портфель). None - без отчетов. MemorySink работает только при n_jobs=1,
+            S3Sink в воркерах создает свой клиент через client_factory.
+        n_jobs (int, optional): Число процессов. По умолчанию - число ядер; 1 - расчет в текущем процессе.
+
+    Returns:
+        tuple: (dict имя -> результаты портфеля, pd.DataFrame сводная таблица по портфелям).
+            При заданном output сводная таблица также сохраняется в batch_summary.xlsx.
+    """
+    end = datetime.now() if end_date is None else datetime.strptime(end_date, '%Y-%m-%d')
+    start = datetime(end.year, 1, 1) if start_date is None else datetime.strptime(start_date, '%Y-%m-%d')
+    settings = {
+        'benchmark_ticker': benchmark_ticker,
+        'start_date': start.strftime('%Y-%m-%d'),
+        'end_date': end.strftime('%Y-%m-%d'),
+        'risk_free_rate': risk_free_rate,
+        'output': LocalSink(output) if isinstance(output, str) else output,
+    }
+
+    # Загружаем объединение тикеров одним запросом
+    tickers = set()
+    for portfolio_data in portfolios.values():
+        tickers |= _portfolio_tickers(portfolio_data)
+    tickers = sorted(tickers - {benchmark_ticker}) + [benchmark_ticker]
+    if price_source is None:
+        price_source = PriceStore(source=YFinanceSource())
+    close = price_source.get_history(tickers, settings['start_date'], settings['end_date'])['Close']
+    close = close.astype(np.float64)
+
+    tasks = [(name, portfolio_data, settings) for name, portfolio_data in portfolios.items()]
+    if n_jobs == 1 or len(tasks) <= 1:
+        _PANEL['close'] = close
+        results = [_analyze_portfolio(task) for task in tasks]
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=max(close.values.nbytes, 1))
+        try:
+            panel = np.ndarray(close.shape, dtype=np.float64, buffer=shm.buf)
+            panel[:] = close.values
+            init_args = (shm.name, close.shape, close.index.values, list(close.columns))
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_attach_panel, initargs=init_args) as pool:
+                results = list(pool.map(_analyze_portfolio, tasks))
+            del panel
+        finally:
+            shm.close()
+            shm.unlink()
+
+    per_portfolio = {result['portfolio']: result for result in results}
+    summary = pd.DataFrame(results).set_index('portfolio')
+    
+    if settings['output'] is not None:
+        # Сводная таблица по всем портфелям - одним потоковым xlsx
+        metric_columns = summary.select_dtypes('number').columns
+        with settings['output'].open('batch_summary.xlsx', 'wb') as stream, ExcelExporter(stream) as exporter:
+            exporter.add_frame('Сводка', summary.drop(columns='artifacts', errors='ignore'),
+                               number_formats={column: DECIMAL_FORMAT for column in metric_columns})
+        settings['output'].flush()
+    return per_portfolio, summary
+
+
+# Пример использования:
+if __name__ == "__main__":
+    portfolios = {
+        'screenshots': extract_portfolio_from_screenshots(None),
+        'stocks_only': [item for item in extract_portfolio_from_screenshots(None) if item['type'] == 'stock'],
+    }
+    results, summary = run_batch(portfolios, start_date='2024-01-01')
+    print(summary)
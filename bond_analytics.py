@@ -0,0 +1,284 @@
+import numpy as np
+
+from bond_engine import to_dates
+
+DAY_COUNTS = ('ACT/365', 'ACT/ACT', '30/360')
+FREQUENCIES = (1, 2, 4, 12)
+
+
+def _add_months(dates, months):
+    """
+    Сдвигает даты на months месяцев (массивы, broadcasting). Если в целевом месяце
+    нет такого дня, берется последний день месяца (31.08 - 6 мес. = 28/29.02).
+    """
+    dates = to_dates(dates)
+    month_start = dates.astype('datetime64[M]')
+    day = (dates - month_start.astype('datetime64[D]')).astype(np.int64)
+    target = month_start + np.asarray(months).astype('timedelta64[M]')
+    days_in_month = ((target + 1).astype('datetime64[D]') - target.astype('datetime64[D]')).astype(np.int64)
+    return target.astype('datetime64[D]') + np.minimum(day, days_in_month - 1)
+
+
+def _days_30_360(start, end):
+    """Число дней по конвенции 30/360 (US bond basis)"""
+    start, end = to_dates(start), to_dates(end)
+    y1 = start.astype('datetime64[Y]').astype(np.int64)
+    y2 = end.astype('datetime64[Y]').astype(np.int64)
+    m1 = start.astype('datetime64[M]').astype(np.int64) % 12
+    m2 = end.astype('datetime64[M]').astype(np.int64) % 12
+    d1 = (start - start.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64) + 1
+    d2 = (end - end.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64) + 1
+    d1 = np.minimum(d1, 30)
+    d2 = np.where(d1 == 30, np.minimum(d2, 30), d2)
+    return 360 * (y2 - y1) + 30 * (m2 - m1) + (d2 - d1)
+
+
+def year_fraction(start, end, day_count='ACT/365', frequency=2, period_start=None, period_end=None):
+    """
+    Доля года между датами по конвенции расчета дней.
+
+    Args:
+        start, end: Даты начала и конца (массивы, broadcasting)
+        day_count (str, optional): 'ACT/365', 'ACT/ACT' (ICMA) или '30/360'
+        frequency (optional): Частота купонов в год (нужна для ACT/ACT)
+        period_start, period_end (optional): Границы купонного периода для ACT/ACT.
+            По умолчанию - сами start и end (доля целого периода).
+
+    Returns:
+        np.ndarray: Доли года
+    """
+    start, end = to_dates(start), to_dates(end)
+    if day_count == 'ACT/365':
+        return (end - start).astype(np.int64) / 365.0
+    if day_count == '30/360':
+        return _days_30_360(start, end) / 360.0
+    if day_count == 'ACT/ACT':
+        period_start = start if period_start is None else to_dates(period_start)
+        period_end = end if period_end is None else to_dates(period_end)
+        period_days = (period_end - period_start).astype(np.int64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (end - start).astype(np.int64) / (period_days * np.asarray(frequency, dtype=float))
+    raise ValueError(f"Неизвестная конвенция расчета дней: {day_count}. Доступны: {', '.join(DAY_COUNTS)}")
+
+
+def _coupon_period(settlement, maturity, frequency):
+    """
+    Число оставшихся купонов и границы текущего купонного периода за O(N), без матрицы дат.
+
+    Returns:
+        tuple: (n_coupons, previous_coupon, next_coupon, step) - step в месяцах
+    """
+    if not np.isin(frequency, FREQUENCIES).all():
+        raise ValueError(f"Частота купонов должна быть одной из {FREQUENCIES}")
+    step = 12 // frequency
+    months_left = (maturity.astype('datetime64[M]').astype(np.int64)
+                   - settlement.astype('datetime64[M]').astype(np.int64))
+    # Купон k шагов назад от погашения попадает в месяц не раньше месяца расчетов
+    # при k <= months_left // step; последний такой купон может быть раньше даты расчетов
+    whole = np.maximum(months_left // step, 0)
+    candidate = _add_months(maturity, -whole * step)
+    n_coupons = np.where(months_left < 0, 0, whole + (candidate > settlement))
+    previous_coupon = _add_months(maturity, -n_coupons * step)
+    next_coupon = _add_months(maturity, -np.maximum(n_coupons - 1, 0) * step)
+    return n_coupons, previous_coupon, next_coupon, step
+
+
+def _broadcast(settlement, maturity, *args):
+    """Приводит даты и параметры облигаций к общей форме (одномерные массивы)"""
+    arrays = [to_dates(settlement), to_dates(maturity)] + [np.asarray(arg) for arg in args]
+    shape = np.broadcast_shapes((1,), *(array.shape for array in arrays))
+    return tuple(np.broadcast_to(array, shape) for array in arrays)
+
+
+def coupon_schedule(settlement, maturity, frequency=2):
+    """
+    Оставшиеся купонные даты облигаций (отсчитываются назад от даты погашения).
+
+    Args:
+        settlement: Даты расчетов
+        maturity: Даты погашения
+        frequency (optional): Частота купонов в год (1, 2, 4, 12)
+
+    Returns:
+        dict: 'dates' - матрица N x K оставшихся дат купонов по возрастанию (NaT в конце строк),
+            'n_coupons' - число оставшихся купонов, 'previous_coupon' и 'next_coupon' -
+            границы текущего купонного периода
+    """
+    settlement, maturity, frequency = _broadcast(settlement, maturity, np.asarray(frequency, dtype=np.int64))
+    n_coupons, previous_coupon, next_coupon, step = _coupon_period(settlement, maturity, frequency)
+
+    # j-й по счету оставшийся купон - (n - 1 - j) шагов назад от погашения
+    j = np.arange(int(n_coupons.max(initial=0)))
+    back = n_coupons[:, None] - 1 - j[None, :]
+    dates = _add_months(maturity[:, None], -np.maximum(back, 0) * step[:, None])
+    dates = np.where(back >= 0, dates, np.datetime64('NaT'))
+    return {'dates': dates, 'n_coupons': n_coupons, 'previous_coupon': previous_coupon, 'next_coupon': next_coupon}
+
+
+def _annuity_moments(x, n):
+    """
+    Суммы A0 = sum(q^k), A1 = sum(k q^k), A2 = sum(k^2 q^k) по k = 0..n-1, q = exp(-x).
+
+    Считаются через среднее и дисперсию усеченного геометрического распределения
+    в замкнутом виде; при малых |n x| закрытые формулы теряют точность из-за
+    вычитания близких величин, и используется ряд Тейлора.
+    """
+    nx = n * x
+    small = np.abs(nx) < 1e-2
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        a0 = np.where(x == 0, n, np.expm1(-nx) / np.expm1(-x))
+        mean = 1 / np.expm1(x) - n / np.expm1(nx)
+        var = 0.25 / np.sinh(0.5 * x) ** 2 - 0.25 * n ** 2 / np.sinh(0.5 * nx) ** 2
+    n2 = n * n
+    mean = np.where(small, (n - 1) / 2 - (n2 - 1) * x / 12 + (n2 * n2 - 1) * x ** 3 / 720, mean)
+    var = np.where(small, (n2 - 1) / 12 - (n2 * n2 - 1) * x ** 2 / 240, var)
+    return a0, a0 * mean, a0 * (var + mean ** 2)
+
+
+class _CashFlows:
+    """
+    Денежные потоки облигаций: n равных купонов c через период, первый через w периодов
+    от даты расчетов, номинал face вместе с последним купоном.
+    Цена и ее моменты по срокам считаются в замкнутом виде (суммы геометрической прогрессии).
+    """
+
+    def __init__(self, settlement, maturity, coupon_rate, frequency, day_count, face):
+        settlement, maturity, coupon_rate, frequency, face = _broadcast(
+            settlement, maturity, np.asarray(coupon_rate, dtype=float), np.asarray(frequency, dtype=np.int64),
+            np.asarray(face, dtype=float)
+        )
+        n_coupons, self.previous_coupon, self.next_coupon, _ = _coupon_period(settlement, maturity, frequency)
+
+        # Доля текущего купонного периода, прошедшая к дате расчетов; при массиве
+        # конвенций расчет идет отдельно по каждой из них
+        if np.ndim(day_count) == 0:
+            accrued_fraction = year_fraction(self.previous_coupon, settlement, day_count, frequency,
+                                             period_start=self.previous_coupon, period_end=self.next_coupon) * frequency
+        else:
+            day_count = np.broadcast_to(np.asarray(day_count, dtype=object), settlement.shape)
+            accrued_fraction = np.empty(settlement.shape)
+            for convention in np.unique(day_count):
+                rows = day_count == convention
+                accrued_fraction[rows] = year_fraction(
+                    self.previous_coupon[rows], settlement[rows], convention, frequency[rows],
+                    period_start=self.previous_coupon[rows], period_end=self.next_coupon[rows]
+                ) * frequency[rows]
+        # У погашенных облигаций купонного периода нет: НКД, как и цена, не определен
+        self.valid = n_coupons > 0
+        accrued_fraction = np.where(self.valid, np.clip(accrued_fraction, 0.0, 1.0), np.nan)
+
+        self.n = np.maximum(n_coupons, 1).astype(float)
+        self.w = 1.0 - accrued_fraction
+        self.frequency = frequency.astype(float)
+        self.coupon = face * coupon_rate / frequency
+        self.face = face
+        self.n_coupons = n_coupons
+        self.accrued_interest = self.coupon * accrued_fraction
+
+    def moments(self, ytm, order=1, rows=slice(None)):
+        """
+        Грязная цена P = sum(CF_k v^t_k) и моменты M_j = sum(t_k^j CF_k v^t_k), t_k в периодах.
+
+        Returns:
+            tuple: (P, M1) или (P, M1, M2) при order=2
+        """
+        n, w, coupon, face = self.n[rows], self.w[rows], self.coupon[rows], self.face[rows]
+        x = np.log1p(ytm / self.frequency[rows])
+        a0, a1, a2 = _annuity_moments(x, n)
+        last = n - 1 + w
+        discount = np.exp(-w * x)
+        redemption = face * np.exp(-last * x)
+        price = discount * coupon * a0 + redemption
+        m1 = discount * coupon * (w * a0 + a1) + redemption * last
+        if order == 1:
+            return price, m1
+        m2 = discount * coupon * (w * w * a0 + 2 * w * a1 + a2) + redemption * last ** 2
+        return price, m1, m2
+
+
+def bond_price(settlement, maturity, coupon_rate, ytm, frequency=2, day_count='ACT/ACT', face=1.0):
+    """
+    Цена облигаций по доходности к погашению (накопленный купонный доход по конвенции day_count).
+
+    Returns:
+        dict: 'clean_price', 'dirty_price', 'accrued_interest' (в единицах face)
+    """
+    flows = _CashFlows(settlement, maturity, coupon_rate, frequency, day_count, face)
+    ytm = np.broadcast_to(np.asarray(ytm, dtype=float), flows.valid.shape)
+    dirty = np.where(flows.valid, flows.moments(ytm)[0], np.nan)
+    return {'clean_price': dirty - flows.accrued_interest, 'dirty_price': dirty,
+            'accrued_interest': flows.accrued_interest}
+
+
+def bond_analytics(settlement, maturity, coupon_rate, price, frequency=2, day_count='ACT/ACT', face=1.0,
+                   tol=1e-12, max_iter=100, ytm_bounds=(-0.5, 2.0)):
+    """
+    Доходность к погашению, дюрация и выпуклость для массива облигаций.
+
+    Цена и ее производная считаются в замкнутом виде (O(1) на облигацию), доходность
+    ищется векторным методом Ньютона с защитной вилкой: если шаг выходит за текущий
+    интервал, берется его середина (бисекция). Итерации идут только по облигациям,
+    для которых точность еще не достигнута.
+
+    Args:
+        settlement: Даты расчетов
+        maturity: Даты погашения
+        coupon_rate: Годовой купон в долях
+        price: Чистая цена (без НКД) в единицах face (0.98 при face=1 - 98% номинала)
+        frequency (optional): Частота купонов в год (1, 2, 4, 12)
+        day_count (optional): 'ACT/365', 'ACT/ACT' или '30/360' (скаляр или массив)
+        face (optional): Номинал
+        tol (float, optional): Точность по цене
+        ytm_bounds (tuple, optional): Границы поиска доходности
+
+    Returns:
+        dict: Массивы 'ytm', 'accrued_interest', 'dirty_price', 'macaulay_duration',
+            'modified_duration' (в годах), 'convexity', 'n_coupons', 'previous_coupon',
+            'next_coupon'. Для облигаций с ценой вне границ или погашенных - NaN.
+    """
+    flows = _CashFlows(settlement, maturity, coupon_rate, frequency, day_count, face)
+    shape = flows.valid.shape
+    target = np.broadcast_to(np.asarray(price, dtype=float), shape) + flows.accrued_interest
+
+    low = np.full(shape, float(ytm_bounds[0]))
+    high = np.full(shape, float(ytm_bounds[1]))
+    # Цена убывает с ростом доходности
+    valid = flows.valid & (target <= flows.moments(low)[0]) & (target >= flows.moments(high)[0])
+
+    ytm = np.full(shape, 0.05)
+    active = np.flatnonzero(valid)
+    for _ in range(max_iter):
+        if not len(active):
+            break
+        y = ytm[active]
+        dirty, m1 = flows.moments(y, rows=active)
+        diff = dirty - target[active]
+        unconverged = np.abs(diff) > tol
+        active, y, diff = active[unconverged], y[unconverged], diff[unconverged]
+        derivative = -m1[unconverged] / (1 + y / flows.frequency[active]) / flows.frequency[active]
+
+        # Сужаем вилку: цена выше целевой - доходность нужно увеличить
+        low[active] = np.where(diff > 0, y, low[active])
+        high[active] = np.where(diff < 0, y, high[active])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = y - diff / derivative
+        inside = np.isfinite(newton) & (newton > low[active]) & (newton < high[active])
+        ytm[active] = np.where(inside, newton, 0.5 * (low[active] + high[active]))
+
+    ytm = np.where(valid, ytm, np.nan)
+    frequency = flows.frequency
+    dirty, m1, m2 = flows.moments(np.where(valid, ytm, 0.0), order=2)
+    growth = 1 + ytm / frequency
+    macaulay = m1 / dirty / frequency
+    result = {
+        'ytm': ytm,
+        'accrued_interest': flows.accrued_interest,
+        'dirty_price': dirty,
+        'macaulay_duration': macaulay,
+        'modified_duration': macaulay / growth,
+        'convexity': (m2 + m1) / dirty / (frequency * growth) ** 2,
+    }
+    for field in ('accrued_interest', 'dirty_price', 'macaulay_duration', 'convexity'):
+        result[field] = np.where(valid, result[field], np.nan)
+    result.update(n_coupons=flows.n_coupons, previous_coupon=flows.previous_coupon, next_coupon=flows.next_coupon)
+    return result
@@ -0,0 +1,277 @@
+import csv
+import os
+from datetime import date
+from itertools import islice, zip_longest
+
+import numpy as np
+
+from bond_engine import RESULT_FIELDS, bond_yield
+from bond_scenarios import COLUMN_FORMATS, COLUMN_TITLES
+from excel_export import DATE_FORMAT, DECIMAL_FORMAT, INTEGER_FORMAT, MONEY_FORMAT
+
+# Поля сделки в блоттере и допустимые заголовки колонок (регистр не важен)
+BLOTTER_FIELDS = {
+    'purchase_date': ('purchase_date', 'дата покупки'),
+    'sell_date': ('sell_date', 'дата продажи'),
+    'volume': ('volume', 'сумма покупки'),
+    'purchase_price': ('purchase_price', 'цена покупки'),
+    'sell_price': ('sell_price', 'цена продажи'),
+    'coupon_rate': ('coupon_rate', 'купон'),
+}
+FIELD_TITLES = {
+    'purchase_date': 'Дата покупки',
+    'sell_date': 'Дата продажи',
+    'volume': 'Сумма покупки',
+    'purchase_price': 'Цена покупки',
+    'sell_price': 'Цена продажи',
+    'coupon_rate': 'Купон',
+}
+# Цены и купон в блоттере - в процентах, как при ручном вводе
+PERCENT_FIELDS = ('purchase_price', 'sell_price', 'coupon_rate')
+DATE_FIELDS = ('purchase_date', 'sell_date')
+
+# Колонки листа результатов
+RESULT_COLUMNS = ['Строка'] + [FIELD_TITLES[field] for field in BLOTTER_FIELDS] + \
+                 [COLUMN_TITLES[field] for field in RESULT_FIELDS]
+
+# Позиции цифр в датах 'ГГГГ-ММ-ДД' и 'ДД-ММ-ГГГГ' (разделитель '-', '.' или '/')
+_ISO_DIGITS = [0, 1, 2, 3, 5, 6, 8, 9]
+_DMY_DIGITS = [0, 1, 3, 4, 6, 7, 8, 9]
+
+
+def _text_column(values, native_types):
+    """
+    Строковый массив колонки и маска значений типов native_types (ячейки Excel с датами
+    и числами). Колонка CSV целиком состоит из строк, и проверка типов по ячейкам не нужна.
+    """
+    if set(map(type, values)) <= {str}:
+        return np.array(values, dtype=str), np.zeros(len(values), dtype=bool)
+    is_native = np.array([isinstance(value, native_types) and not isinstance(value, bool) for value in values],
+                         dtype=bool)
+    return np.array([value if isinstance(value, str) else '' for value in values], dtype=str), is_native
+
+
+def _number(codes, columns):
+    value = np.zeros(len(codes), dtype=np.int64)
+    for column in columns:
+        value = value * 10 + codes[:, column]
+    return value
+
+
+def parse_dates(values):
+    """
+    Разбирает даты всей колонки за один проход NumPy, без strptime на каждую строку.
+
+    Строки - в форматах 'ДД-ММ-ГГГГ', 'ДД.ММ.ГГГГ', 'ДД/ММ/ГГГГ' или 'ГГГГ-ММ-ДД';
+    значения date/datetime (ячейки Excel) принимаются как есть.
+
+    Returns:
+        tuple: (np.ndarray datetime64[D], маска корректных значений)
+    """
+    values = list(values)
+    text, is_native = _text_column(values, date)
+    text = np.char.strip(text)
+
+    valid = np.char.str_len(text) == 10
+    chars = np.where(valid, text, '0000-00-00').astype('U10').view('U1').reshape(-1, 10)
+    codes = chars.view(np.uint32).astype(np.int64) - ord('0')
+    digit = (codes >= 0) & (codes <= 9)
+
+    iso = (chars[:, 4] == '-') & (chars[:, 7] == '-')
+    dmy = np.isin(chars[:, 2], ['-', '.', '/']) & (chars[:, 5] == chars[:, 2])
+    valid &= (iso & digit[:, _ISO_DIGITS].all(axis=1)) | (dmy & digit[:, _DMY_DIGITS].all(axis=1))
+
+    year = np.where(iso, _number(codes, [0, 1, 2, 3]), _number(codes, [6, 7, 8, 9]))
+    month = np.where(iso, _number(codes, [5, 6]), _number(codes, [3, 4]))
+    day = np.where(iso, _number(codes, [8, 9]), _number(codes, [0, 1]))
+    valid &= (month >= 1) & (month <= 12) & (year >= 1900) & (year <= 2200)
+
+    month_start = np.where(valid, (year - 1970) * 12 + month - 1, 0).astype('datetime64[M]')
+    days_in_month = ((month_start + 1).astype('datetime64[D]') - month_start.astype('datetime64[D]')).astype(np.int64)
+    valid &= (day >= 1) & (day <= days_in_month)
+
+    dates = month_start.astype('datetime64[D]') + np.where(valid, day - 1, 0)
+    dates[~valid] = np.datetime64('NaT')
+    if is_native.any():
+        native = np.flatnonzero(is_native)
+        dates[native] = np.array([values[i] for i in native], dtype='datetime64[D]')
+        valid[native] = True
+    return dates, valid
+
+
+def _to_float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return np.nan
+
+
+def parse_decimals(values):
+    """
+    Разбирает числа колонки: десятичная запятая, пробелы-разделители тысяч и знак '%'
+    убираются строковыми операциями над всей колонкой сразу.
+
+    Returns:
+        tuple: (np.ndarray float, маска корректных значений)
+    """
+    values = list(values)
+    text, is_number = _text_column(values, (int, float))
+    for symbol in (' ', '\xa0', '%'):
+        text = np.char.replace(text, symbol, '')
+    text = np.char.replace(text, ',', '.')
+
+    try:
+        # Быстрый путь: вся колонка преобразуется разом
+        numbers = np.where(text == '', 'nan', text).astype(float)
+    except ValueError:
+        numbers = np.array([_to_float(item) for item in text.tolist()], dtype=float)
+    if is_number.any():
+        numbers[is_number] = np.array([values[i] for i in np.flatnonzero(is_number)], dtype=float)
+    return numbers, np.isfinite(numbers)
+
+
+def _field_positions(header):
+    """Позиции полей блоттера по строке заголовков"""
+    names = [str(name).strip().lower() if name is not None else '' for name in header]
+    positions = {}
+    for field, aliases in BLOTTER_FIELDS.items():
+        for alias in aliases:
+            if alias in names:
+                positions[field] = names.index(alias)
+                break
+        else:
+            raise ValueError(f"В блоттере нет колонки '{FIELD_TITLES[field]}' ({field})")
+    return positions
+
+
+def _csv_rows(path):
+    """Непустые строки CSV с номерами строк файла"""
+    with open(path, newline='', encoding='utf-8-sig') as file:
+        sample = file.read(65536)
+        file.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=';,\t')
+        except csv.Error:
+            dialect = 'excel'
+        for line, row in enumerate(csv.reader(file, dialect), start=1):
+            if any(row):
+                yield line, row
+
+
+def _xlsx_rows(path):
+    """Непустые строки первого листа XLSX с номерами строк"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for line, row in enumerate(workbook.active.iter_rows(values_only=True), start=1):
+            if any(value is not None and value != '' for value in row):
+                yield line, row
+    finally:
+        workbook.close()
+
+
+def read_blotter(path, chunk_rows=50000):
+    """
+    Потоково читает блоттер сделок из CSV или XLSX блоками по chunk_rows строк.
+
+    Разделитель CSV (';', ',' или табуляция) определяется автоматически, XLSX
+    читается в режиме openpyxl read_only. Пустые строки пропускаются.
+
+    Yields:
+        tuple: (номера строк файла, dict поле -> список сырых значений)
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        rows = _xlsx_rows(path)
+    elif extension in ('.csv', '.txt'):
+        rows = _csv_rows(path)
+    else:
+        raise ValueError(f"Неподдерживаемый формат блоттера: {extension}")
+
+    first = next(rows, None)
+    if first is None:
+        return
+    positions = _field_positions(first[1])
+    width = max(positions.values()) + 1
+
+    while True:
+        block = list(islice(rows, chunk_rows))
+        if not block:
+            break
+        lines, chunk = zip(*block)
+        # Транспонирование с дополнением коротких строк пустыми значениями
+        columns = list(zip_longest(*chunk, fillvalue=''))
+        columns += [('',) * len(chunk)] * (width - len(columns))
+        yield np.array(lines), {field: columns[position] for field, position in positions.items()}
+
+
+def evaluate_chunk(columns):
+    """
+    Разбирает блок сырых значений и считает доходность сделок.
+
+    Returns:
+        tuple: (dict поле -> массив, dict результата bond_yield, маска корректных строк,
+            dict поле -> маска корректно разобранных значений)
+    """
+    fields, parsed = {}, {}
+    for field, values in columns.items():
+        fields[field], parsed[field] = parse_dates(values) if field in DATE_FIELDS else parse_decimals(values)
+    for field in PERCENT_FIELDS:
+        fields[field] = fields[field] / 100
+
+    with np.errstate(invalid='ignore'):
+        result = bond_yield(fields['purchase_date'], fields['sell_date'], fields['volume'],
+                            fields['purchase_price'], fields['sell_price'], fields['coupon_rate'])
+    valid = np.logical_and.reduce(list(parsed.values())) & result['valid']
+    return fields, result, valid, parsed
+
+
+def _row_error(i, columns, fields, parsed):
+    """Текст ошибки для некорректной строки блока"""
+    bad = [f"{FIELD_TITLES[field]}: неверное значение {columns[field][i]!r}"
+           for field in BLOTTER_FIELDS if not parsed[field][i]]
+    if bad:
+        return '; '.join(bad)
+    if fields['sell_date'][i] <= fields['purchase_date'][i]:
+        return "Дата продажи должна быть позже даты покупки."
+    return "Сумма и цены не могут быть отрицательными, цена покупки должна быть положительной."
+
+
+def process_blotter(path, exporter, chunk_rows=50000, title='Результаты', errors_title='Ошибки'):
+    """
+    Считает доходность всех сделок блоттера и пишет результаты в книгу Excel.
+
+    Файл читается и обрабатывается блоками: корректные строки сразу уходят на лист
+    title, некорректные (неразборчивые даты и числа, продажа раньше покупки и т.п.)
+    собираются в отчет об ошибках - лист errors_title с номером строки файла и причиной.
+
+    Args:
+        path (str): Путь к CSV или XLSX с колонками BLOTTER_FIELDS
+        exporter (ExcelExporter): Книга для результатов
+        chunk_rows (int, optional): Размер блока строк
+
+    Returns:
+        dict: 'processed' - число рассчитанных сделок, 'errors' - список (строка, ошибка)
+    """
+    errors = []
+
+    def rows():
+        for lines, columns in read_blotter(path, chunk_rows):
+            fields, result, valid, parsed = evaluate_chunk(columns)
+            for i in np.flatnonzero(~valid):
+                errors.append((int(lines[i]), _row_error(i, columns, fields, parsed)))
+            values = [lines[valid]] + [fields[field][valid] for field in BLOTTER_FIELDS] + \
+                     [result[field][valid] for field in RESULT_FIELDS]
+            yield from zip(*(column.tolist() for column in values))
+
+    number_formats = {FIELD_TITLES[field]: DATE_FORMAT for field in DATE_FIELDS}
+    number_formats.update({FIELD_TITLES['volume']: MONEY_FORMAT, 'Строка': INTEGER_FORMAT})
+    number_formats.update({FIELD_TITLES[field]: DECIMAL_FORMAT for field in PERCENT_FIELDS})
+    number_formats.update({COLUMN_TITLES[field]: COLUMN_FORMATS[field]
+                           for field in RESULT_FIELDS if field in COLUMN_FORMATS})
+
+    processed = exporter.add_sheet(title, RESULT_COLUMNS, rows(), number_formats=number_formats,
+                                   column_widths={column: 20 for column in RESULT_COLUMNS})
+    exporter.add_sheet(errors_title, ['Строка', 'Ошибка'], errors, column_widths={'Ошибка': 80})
+    return {'processed': processed, 'errors': errors}
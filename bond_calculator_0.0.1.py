@@ -1,7 +1,11 @@
 import traceback
 from datetime import datetime
-from openpyxl import Workbook
 import os
+import sys
+
+from bond_blotter import process_blotter
+from bond_engine import bond_yield
+from excel_export import ExcelExporter
 
 
 def bond_yield_calculator():
@@ -44,18 +48,14 @@ def bond_yield_calculator():
         coupon_rate = parse_input("Введите размер купона (в %, например, 5 или 0 для бескупонных): ") / 100
         sell_price = parse_input("Введите цену продажи/погашения облигации (в % от номинала, например, 100): ") / 100
 
-        # Расчёты
-        holding_period_days = (sell_date - purchase_date).days
-        holding_period_years = holding_period_days / 365.0
-        nominal = 100
-
-        coupon_income = 0
-        if coupon_rate > 0:
-            coupon_income = volume * coupon_rate * holding_period_years
-
-        price_diff_income = (sell_price - purchase_price) * volume
-        total_income = coupon_income + price_diff_income
-        total_yield_percent = (total_income / (purchase_price * volume)) * 100
+        # Расчёты выполняет векторный движок bond_engine (здесь - для одной сделки)
+        result = bond_yield(purchase_date, sell_date, volume, purchase_price, sell_price, coupon_rate)
+        holding_period_days = int(result['holding_period_days'])
+        holding_period_years = float(result['holding_period_years'])
+        coupon_income = float(result['coupon_income'])
+        price_diff_income = float(result['price_income'])
+        total_income = float(result['total_income'])
+        total_yield_percent = float(result['total_yield_percent'])
 
         # Вывод результатов
         print("\n--- Результаты ---")
@@ -78,19 +78,17 @@ def bond_yield_calculator():
             else:
                 filename = os.path.join(save_path, f"{int(total_income)}.xlsx")
 
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Результаты"
-
-            ws.append(["Параметр", "Значение"])
-            ws.append(["Срок удержания (дни)", holding_period_days])
-            ws.append(["Купонный доход", round(coupon_income, 2)])
-            ws.append(["Доход от изменения цены", round(price_diff_income, 2)])
-            ws.append(["Общая доходность в деньгах", round(total_income, 2)])
-            ws.append(["Общая доходность в процентах", f"{round(total_yield_percent, 2)}%"])
+            rows = [
+                ["Срок удержания (дни)", holding_period_days],
+                ["Купонный доход", round(coupon_income, 2)],
+                ["Доход от изменения цены", round(price_diff_income, 2)],
+                ["Общая доходность в деньгах", round(total_income, 2)],
+                ["Общая доходность в процентах", f"{round(total_yield_percent, 2)}%"],
+            ]
 
             try:
-                wb.save(filename)
+                with ExcelExporter(filename) as exporter:
+                    exporter.add_sheet("Результаты", ["Параметр", "Значение"], rows, column_widths={"Параметр": 32})
                 print(f"\nРезультаты успешно сохранены в файл: {filename}")
             except Exception as e:
                 print(f"Ошибка при сохранении файла: {e}")
@@ -104,5 +102,31 @@ def bond_yield_calculator():
         print("Произошла ошибка. Подробности смотрите в error_log.txt.")
 
 
+def bond_blotter_calculator(source, target=None):
+    """
+    Пакетный режим: расчет всех сделок из CSV/XLSX-блоттера без диалога.
+    Результаты и отчет об ошибках сохраняются в одну книгу Excel.
+    """
+    if not target:
+        target = os.path.splitext(source)[0] + "_результаты.xlsx"
+    try:
+        with ExcelExporter(target) as exporter:
+            report = process_blotter(source, exporter)
+        print(f"Рассчитано сделок: {report['processed']}, строк с ошибками: {len(report['errors'])}")
+        for line, error in report['errors'][:10]:
+            print(f"  строка {line}: {error}")
+        if len(report['errors']) > 10:
+            print("  ... полный список - на листе 'Ошибки'")
+        print(f"Результаты сохранены в файл: {target}")
+    except Exception as e:
+        with open("error_log.txt", "w") as f:
+            f.write(traceback.format_exc())
+        print(f"Ошибка пакетного расчета: {e}. Подробности смотрите в error_log.txt.")
+
+
 if __name__ == "__main__":
-    bond_yield_calculator()
+    # python bond_calculator_0.0.1.py блоттер.csv [результаты.xlsx] - пакетный режим
+    if len(sys.argv) > 1:
+        bond_blotter_calculator(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        bond_yield_calculator()
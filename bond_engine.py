@@ -0,0 +1,67 @@
+import numpy as np
+
+DAYS_IN_YEAR = 365.0
+
+# Поля результата в порядке вывода
+RESULT_FIELDS = ('holding_period_days', 'holding_period_years', 'coupon_income', 'price_income',
+                 'total_income', 'total_yield_percent')
+
+
+def to_dates(values):
+    """Приводит даты (datetime, строки 'YYYY-MM-DD', datetime64) к массиву datetime64[D]"""
+    return np.asarray(values, dtype='datetime64[D]')
+
+
+def bond_yield(purchase_date, sell_date, volume, purchase_price, sell_price, coupon_rate,
+               days_in_year=DAYS_IN_YEAR):
+    """
+    Доходность облигаций за период владения для массивов сделок за один проход NumPy.
+
+    Купонный доход начисляется как простой процент на сумму покупки за срок
+    владения (дни / days_in_year), доход от цены - разница цен продажи и покупки
+    на сумму покупки. Все аргументы - скаляры или массивы, совместимые по broadcasting.
+
+    Args:
+        purchase_date: Даты покупки
+        sell_date: Даты продажи/погашения
+        volume: Сумма покупки
+        purchase_price: Цена покупки в долях номинала (0.98 = 98%)
+        sell_price: Цена продажи/погашения в долях номинала
+        coupon_rate: Годовой купон в долях (0.05 = 5%)
+        days_in_year (float, optional): Число дней в году для пересчета срока
+
+    Returns:
+        dict: Массивы 'holding_period_days', 'holding_period_years', 'coupon_income',
+            'price_income', 'total_income', 'total_yield_percent' и 'valid' - признак
+            корректной сделки (продажа позже покупки, неотрицательные суммы и цены,
+            положительная цена покупки). Для некорректных сделок результаты - NaN.
+    """
+    days = (to_dates(sell_date) - to_dates(purchase_date)).astype(np.int64)
+    volume, purchase_price, sell_price, coupon_rate = (
+        np.asarray(x, dtype=float) for x in (volume, purchase_price, sell_price, coupon_rate)
+    )
+    days, volume, purchase_price, sell_price, coupon_rate = np.broadcast_arrays(
+        days, volume, purchase_price, sell_price, coupon_rate
+    )
+
+    valid = (days > 0) & (volume >= 0) & (purchase_price > 0) & (sell_price >= 0) & (coupon_rate >= 0)
+    years = days / days_in_year
+    coupon_income = volume * coupon_rate * years
+    price_income = (sell_price - purchase_price) * volume
+    total_income = coupon_income + price_income
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total_yield_percent = total_income / (purchase_price * volume) * 100
+
+    result = {
+        'holding_period_days': days,
+        'holding_period_years': years,
+        'coupon_income': coupon_income,
+        'price_income': price_income,
+        'total_income': total_income,
+        'total_yield_percent': total_yield_percent,
+    }
+    if not valid.all():
+        for field in RESULT_FIELDS[1:]:
+            result[field] = np.where(valid, result[field], np.nan)
+    result['valid'] = valid
+    return result
@@ -0,0 +1,171 @@
+import numpy as np
+
+from bond_analytics import bond_analytics, bond_price
+from bond_engine import RESULT_FIELDS, bond_yield, to_dates
+from excel_export import DATE_FORMAT, DECIMAL_FORMAT, MONEY_FORMAT
+
+# Ограничение памяти на один блок сценариев по умолчанию
+DEFAULT_MEMORY_LIMIT = 256 * 2 ** 20
+
+# Заголовки и форматы колонок при выгрузке в Excel
+COLUMN_TITLES = {
+    'sell_date': 'Дата продажи',
+    'sell_price': 'Цена продажи',
+    'coupon_rate': 'Купон',
+    'yield_shift': 'Сдвиг доходности',
+    'exit_yield': 'Доходность при продаже',
+    'holding_period_days': 'Срок удержания, дней',
+    'holding_period_years': 'Срок удержания, лет',
+    'coupon_income': 'Купонный доход',
+    'price_income': 'Доход от цены',
+    'total_income': 'Общий доход',
+    'total_yield_percent': 'Доходность, %',
+}
+COLUMN_FORMATS = {
+    'sell_date': DATE_FORMAT,
+    'sell_price': DECIMAL_FORMAT,
+    'coupon_rate': DECIMAL_FORMAT,
+    'yield_shift': DECIMAL_FORMAT,
+    'exit_yield': DECIMAL_FORMAT,
+    'holding_period_years': DECIMAL_FORMAT,
+    'coupon_income': MONEY_FORMAT,
+    'price_income': MONEY_FORMAT,
+    'total_income': MONEY_FORMAT,
+    'total_yield_percent': DECIMAL_FORMAT,
+}
+
+
+def _scenario_axes(sell_dates, sell_prices, coupon_rates, yield_shifts):
+    """Оси сетки сценариев: список (имя, одномерный массив значений)"""
+    if (sell_prices is None) == (yield_shifts is None):
+        raise ValueError("Нужно задать либо sell_prices, либо yield_shifts")
+    axes = [('sell_date', np.atleast_1d(to_dates(sell_dates)))]
+    if sell_prices is not None:
+        axes.append(('sell_price', np.atleast_1d(np.asarray(sell_prices, dtype=float))))
+    else:
+        axes.append(('yield_shift', np.atleast_1d(np.asarray(yield_shifts, dtype=float))))
+    axes.append(('coupon_rate', np.atleast_1d(np.asarray(coupon_rates, dtype=float))))
+    for name, values in axes:
+        if values.ndim != 1 or not len(values):
+            raise ValueError(f"Ось {name} должна быть непустым одномерным набором значений")
+    return axes
+
+
+def iter_scenarios(purchase_date, volume, purchase_price, sell_dates, coupon_rates, sell_prices=None,
+                   yield_shifts=None, maturity=None, frequency=2, day_count='ACT/ACT', base_yield=None,
+                   memory_limit=DEFAULT_MEMORY_LIMIT):
+    """
+    Перебирает все сочетания параметров сценариев (декартово произведение осей) блоками.
+
+    Оси: даты продажи x (цены продажи | сдвиги доходности) x ставки купона. Значения
+    осей - любые одномерные наборы: списки, np.linspace(0.9, 1.1, 1000),
+    np.arange(np.datetime64('2025-01-01'), np.datetime64('2026-01-01')) и т.п.
+    Внутри блока оси раскладываются по отдельным измерениям массива, и расчет идет
+    одним вызовом bond_yield через broadcasting. Сетка режется по первой оси на
+    блоки так, чтобы промежуточные массивы блока укладывались в memory_limit байт.
+
+    Со сдвигами доходности цена продажи не задается, а рассчитывается: облигация с
+    погашением maturity оценивается на дату продажи по доходности base_yield + сдвиг.
+    По умолчанию base_yield - доходность к погашению при покупке по purchase_price
+    (своя для каждой ставки купона).
+
+    Args:
+        purchase_date: Дата покупки
+        volume (float): Сумма покупки
+        purchase_price (float): Цена покупки в долях номинала
+        sell_dates: Даты продажи
+        coupon_rates: Годовые ставки купона в долях
+        sell_prices (optional): Цены продажи в долях номинала
+        yield_shifts (optional): Сдвиги доходности в долях (0.01 = +100 б.п.)
+        maturity (optional): Дата погашения (обязательна со сдвигами доходности)
+        frequency, day_count (optional): Параметры купонов для расчета цены по доходности
+        base_yield (float, optional): Базовая доходность для сдвигов
+        memory_limit (int, optional): Ограничение памяти на блок, байт
+
+    Yields:
+        dict: Блок таблицы сценариев - одномерные массивы одинаковой длины, по строке
+            на сценарий: параметры сценария и поля RESULT_FIELDS из bond_engine
+    """
+    axes = _scenario_axes(sell_dates, sell_prices, coupon_rates, yield_shifts)
+    names = [name for name, _ in axes]
+    shape = tuple(len(values) for _, values in axes)
+
+    if yield_shifts is not None:
+        if maturity is None:
+            raise ValueError("Для сдвигов доходности нужна дата погашения maturity")
+        coupons = axes[2][1]
+        if base_yield is None:
+            base_yield = bond_analytics(purchase_date, maturity, coupons, purchase_price, frequency, day_count)['ytm']
+        base_yield = np.broadcast_to(np.asarray(base_yield, dtype=float), coupons.shape)
+        names += ['exit_yield', 'sell_price']
+
+    # Оценка памяти на сценарий: колонки результата и временные массивы расчета
+    bytes_per_scenario = 8 * (2 * len(names) + len(RESULT_FIELDS) + 8)
+    inner = int(np.prod(shape[1:]))
+    block = max(1, memory_limit // (bytes_per_scenario * inner))
+
+    for start in range(0, shape[0], block):
+        block_axes = [(name, values[start:start + block] if i == 0 else values)
+                      for i, (name, values) in enumerate(axes)]
+        # Ось i становится i-м измерением массива: (даты, 1, 1), (1, цены, 1), (1, 1, купоны)
+        grid = {name: values.reshape([-1 if j == i else 1 for j in range(len(axes))])
+                for i, (name, values) in enumerate(block_axes)}
+        block_shape = (len(block_axes[0][1]),) + shape[1:]
+
+        if yield_shifts is not None:
+            exit_yield = base_yield.reshape(grid['coupon_rate'].shape) + grid['yield_shift']
+            dates, coupons, exit_yield = np.broadcast_arrays(grid['sell_date'], grid['coupon_rate'], exit_yield)
+            grid['exit_yield'] = exit_yield
+            grid['sell_price'] = bond_price(dates.ravel(), maturity, coupons.ravel(), exit_yield.ravel(),
+                                            frequency, day_count)['clean_price'].reshape(block_shape)
+
+        result = bond_yield(purchase_date, grid['sell_date'], volume, purchase_price, grid['sell_price'],
+                            grid['coupon_rate'])
+        table = {name: np.broadcast_to(grid[name], block_shape).ravel() for name in names}
+        table.update((field, np.broadcast_to(result[field], block_shape).ravel()) for field in RESULT_FIELDS)
+        yield table
+
+
+def scenario_table(*args, **kwargs):
+    """
+    Таблица сценариев целиком (аргументы - как у iter_scenarios).
+
+    Returns:
+        dict: Колонка -> одномерный массив
+    """
+    blocks = list(iter_scenarios(*args, **kwargs))
+    return {name: np.concatenate([block[name] for block in blocks]) for name in blocks[0]}
+
+
+def table_rows(table):
+    """Строки таблицы сценариев (значения Python) для ExcelExporter.add_sheet"""
+    return zip(*(values.tolist() for values in table.values()))
+
+
+def write_scenarios(exporter, blocks, title='Сценарии'):
+    """
+    Записывает блоки сценариев (iter_scenarios) на лист Excel потоком, блок за блоком.
+
+    Args:
+        exporter (ExcelExporter): Открытая книга
+        blocks (iterable): Блоки таблицы сценариев (или одна таблица в списке)
+        title (str, optional): Название листа
+
+    Returns:
+        int: Число записанных сценариев
+    """
+    blocks = iter(blocks)
+    first = next(blocks)
+    columns = list(first)
+
+    def rows():
+        yield from table_rows(first)
+        for block in blocks:
+            yield from table_rows(block)
+
+    return exporter.add_sheet(
+        title, [COLUMN_TITLES.get(column, column) for column in columns], rows(),
+        number_formats={COLUMN_TITLES[column]: COLUMN_FORMATS[column]
+                        for column in columns if column in COLUMN_FORMATS},
+        column_widths={COLUMN_TITLES.get(column, column): 22 for column in columns},
+    )
@@ -0,0 +1,115 @@
+import math
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+# Форматы чисел, общие для отчетов по портфелю и облигациям
+MONEY_FORMAT = '#,##0.00'
+PERCENT_FORMAT = '0.00%'
+DECIMAL_FORMAT = '0.0000'
+INTEGER_FORMAT = '0'
+DATE_FORMAT = 'DD.MM.YYYY'
+
+
+class ExcelExporter:
+    """
+    Потоковая запись xlsx-файла в режиме openpyxl write_only.
+
+    Строки сериализуются сразу при добавлении, поэтому память не зависит от числа строк.
+    Формат чисел задается для колонки: на колонку создается одна ячейка-шаблон
+    со стилем, через которую записываются все ее значения.
+
+    Args:
+        target: Путь к файлу или двоичный поток (например, из ArtifactSink.open(name, 'wb'))
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self._workbook = Workbook(write_only=True)
+        self._saved = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.save()
+
+    def add_sheet(self, title, columns, rows, number_formats=None, column_widths=None):
+        """
+        Добавляет лист и записывает в него строки потоком.
+
+        Args:
+            title (str): Название листа
+            columns (list): Заголовки колонок
+            rows (iterable): Строки (последовательности значений); может быть генератором
+            number_formats (dict, optional): Заголовок колонки -> формат чисел Excel
+            column_widths (dict, optional): Заголовок колонки -> ширина
+
+        Returns:
+            int: Число записанных строк (без заголовка)
+        """
+        sheet = self._workbook.create_sheet(title)
+        columns = list(columns)
+        positions = {column: i for i, column in enumerate(columns)}
+
+        # Ширины колонок задаются до записи первой строки
+        for column, width in (column_widths or {}).items():
+            sheet.column_dimensions[get_column_letter(positions[column] + 1)].width = width
+
+        header = []
+        for column in columns:
+            cell = WriteOnlyCell(sheet, value=str(column))
+            cell.font = Font(bold=True)
+            header.append(cell)
+        sheet.append(header)
+
+        templates = []
+        for column, number_format in (number_formats or {}).items():
+            cell = WriteOnlyCell(sheet)
+            cell.number_format = number_format
+            templates.append((positions[column], cell))
+
+        count = 0
+        for row in rows:
+            row = [None if isinstance(value, float) and math.isnan(value) else value for value in row]
+            for i, cell in templates:
+                if row[i] is not None:
+                    cell.value = row[i]
+                    row[i] = cell
+            sheet.append(row)
+            count += 1
+        return count
+
+    def add_frame(self, title, frame, number_formats=None, index=True, column_widths=None, chunk_rows=10000):
+        """
+        Добавляет лист из DataFrame, читая его блоками по chunk_rows строк.
+
+        Args:
+            frame (pd.DataFrame): Таблица
+            number_formats (dict, optional): Колонка -> формат чисел Excel
+            index (bool, optional): Записывать ли индекс первой колонкой
+        """
+        columns = ([frame.index.name or ''] if index else []) + [str(column) for column in frame.columns]
+        number_formats = {str(column): number_format for column, number_format in (number_formats or {}).items()}
+        column_widths = {str(column): width for column, width in (column_widths or {}).items()}
+
+        def rows():
+            for start in range(0, len(frame), chunk_rows):
+                chunk = frame.iloc[start:start + chunk_rows]
+                values = chunk.astype(object).where(chunk.notna(), None).values.tolist()
+                if index:
+                    for label, row in zip(chunk.index.tolist(), values):
+                        yield [label] + row
+                else:
+                    yield from values
+
+        return self.add_sheet(title, columns, rows(), number_formats, column_widths)
+
+    def save(self):
+        """Сохраняет книгу; повторный вызов ничего не делает"""
+        if not self._saved:
+            self._workbook.save(self.target)
+            self._saved = True
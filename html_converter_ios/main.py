@@ -1,20 +1,34 @@
-folder_name = input("Enter the folder or file path with HTML: ")
-if folder_name.strip().strip("/") == "":
-    folder_name = "html"
-
+import argparse
 import os
 import sys
 import logging
-from s3 import S3Client
+from s3 import COMPRESSION_LEVELS, DEFAULT_MAX_WORKERS, S3Client
+from sync import MANIFEST_NAME, sync_files
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def main():
+# Filter for HTML files only
+def is_html_file(file_path):
+    return file_path.lower().endswith(('.html', '.htm'))
+
+def main(folder_name, workers=DEFAULT_MAX_WORKERS, s3_client=None, sync=False, delete_orphans=False,
+         manifest_path=None, compression=None, cache_control=None):
     """
     Main function to upload HTML files to S3.
+
+    Args:
+        folder_name: Folder or single HTML file to upload
+        workers: Number of concurrent uploads
+        s3_client: Optional pre-configured S3Client (e.g. connected to a local S3 stand-in)
+        sync: Upload only new or changed files (see sync.sync_files)
+        delete_orphans: In sync mode, delete remote HTML files under the folder prefix
+            that no longer exist locally
+        manifest_path: Sync manifest location; defaults to MANIFEST_NAME next to the files
+        compression: Optional Content-Encoding for uploaded HTML ('gzip' or 'br')
+        cache_control: Optional Cache-Control header for uploaded files
     """
     # Check if path exists
     if not os.path.exists(folder_name):
@@ -22,9 +36,18 @@ def main():
         print(f"Error: Path '{folder_name}' not found.")
         return False
     
+    # Brotli is optional: fail before uploading anything if it is requested but missing
+    if compression == "br":
+        try:
+            import brotli  # noqa: F401
+        except ImportError:
+            print("Error: --compress br requires the 'brotli' package (pip install brotli).")
+            return False
+    
     # Initialize S3 client
     try:
-        s3_client = S3Client()
+        if s3_client is None:
+            s3_client = S3Client(max_pool_connections=workers)
     except Exception as e:
         logger.error(f"Failed to initialize S3 client: {str(e)}")
         print(f"Error: Failed to connect to S3 storage. Please check your credentials and network connection.")
@@ -32,20 +55,22 @@ def main():
     
     # Handle both single files and directories
     if os.path.isfile(folder_name):
-        if not folder_name.lower().endswith(('.html', '.htm')):
+        if not is_html_file(folder_name):
             logger.error(f"File '{folder_name}' is not an HTML file.")
             print(f"Error: File '{folder_name}' is not an HTML file.")
             return False
         files_to_process = [(folder_name, os.path.basename(folder_name))]
         html_files_count = 1
+        # Only this object is compared; orphans are never deleted for a single file
+        sync_prefix = os.path.basename(folder_name)
+        manifest_dir = os.path.dirname(folder_name)
+        delete_orphans = False
     else:
         # Directory processing logic
         prefix = os.path.basename(os.path.normpath(folder_name))
         logger.info(f"Starting upload of HTML files from '{folder_name}' with prefix '{prefix}'")
-        
-        # Filter for HTML files only
-        def is_html_file(file_path):
-            return file_path.lower().endswith(('.html', '.htm'))
+        sync_prefix = prefix + "/"
+        manifest_dir = folder_name
         
         # Collect all HTML files with their relative paths
         files_to_process = []
@@ -67,27 +92,46 @@ def main():
     logger.info(f"Found {html_files_count} HTML files to upload")
     print(f"Found {html_files_count} HTML files to upload.")
     
-    # Upload files
-    uploaded_files = []
-    failed_files = []
-    
-    for file_path, s3_key in files_to_process:
-        print(f"Uploading {file_path} to {s3_key}... ", end="", flush=True)
-        success, message = s3_client.upload_file(file_path, s3_key)
-        
-        if success:
-            print("✓")
-            uploaded_files.append({
-                "file": file_path,
-                "url": message
-            })
-        else:
-            print("✗")
-            failed_files.append({
-                "file": file_path,
-                "error": message
-            })
-    
+    # Upload files concurrently; each result is printed as soon as its upload finishes
+    # (in sync mode the number of changed files is not known in advance)
+    completed = 0
+    progress_total = "" if sync else f"/{html_files_count}"
+    deletions_ok = True
+
+    def report(result):
+        nonlocal completed
+        completed += 1
+        mark = "✓" if result["success"] else "✗"
+        print(f"[{completed}{progress_total}] {mark} {result['file']} -> {result['s3_key']}", flush=True)
+
+    if sync:
+        summary = sync_files(
+            s3_client, files_to_process, sync_prefix,
+            manifest_path or os.path.join(manifest_dir, MANIFEST_NAME),
+            delete_orphans=delete_orphans, orphan_filter=is_html_file,
+            max_workers=workers, on_result=report, compression=compression, cache_control=cache_control
+        )
+        results = summary["uploaded"] + summary["failed"]
+        order = {s3_key: index for index, (_, s3_key) in enumerate(files_to_process)}
+        results.sort(key=lambda item: order[item["s3_key"]])
+
+        print(f"\nSync: {len(results)} new or changed, {len(summary['unchanged'])} unchanged, "
+              f"{len(summary['deleted'])} orphans deleted.")
+        for item in summary["delete_failed"]:
+            print(f"  - failed to delete {item['s3_key']}: {item['message']}")
+        deletions_ok = not summary["delete_failed"]
+        if not results:
+            print("Nothing to upload.")
+            return deletions_ok
+        html_files_count = len(results)
+    else:
+        results = s3_client.upload_files(files_to_process, max_workers=workers, on_result=report,
+                                         compression=compression, cache_control=cache_control)
+
+    # The summary keeps the original file order
+    uploaded_files = [{"file": item["file"], "url": item["message"]} for item in results if item["success"]]
+    failed_files = [{"file": item["file"], "error": item["message"]} for item in results if not item["success"]]
+
     logger.info(f"Upload complete. Successfully uploaded {len(uploaded_files)} of {html_files_count} HTML files.")
     print(f"\nUpload complete. Successfully uploaded {len(uploaded_files)} of {html_files_count} HTML files.")
     
@@ -102,9 +146,31 @@ def main():
             print(f"  - {item['file']}: {item['error']}")
         return False
     
-    return True
+    return deletions_ok
 
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description="Upload HTML files to S3.")
+    parser.add_argument("path", nargs="?", help="Folder or HTML file to upload (prompted if omitted)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help=f"Number of concurrent uploads (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument("--sync", action="store_true",
+                        help="Upload only new or changed files, tracked in a local manifest")
+    parser.add_argument("--delete-orphans", action="store_true",
+                        help="With --sync, delete remote HTML files that no longer exist locally")
+    parser.add_argument("--manifest", help=f"Sync manifest path (default: {MANIFEST_NAME} in the folder)")
+    parser.add_argument("--compress", choices=sorted(COMPRESSION_LEVELS),
+                        help="Pre-compress HTML and upload it with Content-Encoding (br needs the brotli package)")
+    parser.add_argument("--cache-control", help='Cache-Control header, e.g. "public, max-age=3600"')
+    args = parser.parse_args()
+    if args.delete_orphans and not args.sync:
+        parser.error("--delete-orphans requires --sync")
+
+    folder_name = args.path if args.path is not None else input("Enter the folder or file path with HTML: ")
+    if folder_name.strip().strip("/") == "":
+        folder_name = "html"
+
+    success = main(folder_name, workers=max(1, args.workers), sync=args.sync,
+                   delete_orphans=args.delete_orphans, manifest_path=args.manifest,
+                   compression=args.compress, cache_control=args.cache_control)
     sys.exit(0 if success else 1)
 
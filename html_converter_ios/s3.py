@@ -1,37 +1,105 @@
 from constants import S3_URL, S3_BUCKET_NAME, S3_ACCESS_KEY, S3_SECRET_ACCESS_KEY
 import boto3
+import gzip
 import os
 from botocore.exceptions import ClientError
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Callable, Dict, Any, Optional, List, Tuple
 import logging
 from botocore.client import Config
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Default number of concurrent uploads
+DEFAULT_MAX_WORKERS = 8
+
+# Files smaller than this are sent with a single put_object (their ETag is the MD5 of the content)
+PUT_OBJECT_MAX_SIZE = 5 * 1024 * 1024
+
+CONTENT_TYPES = {
+    '.html': 'text/html',
+    '.htm': 'text/html',
+    '.css': 'text/css',
+    '.js': 'application/javascript',
+    '.json': 'application/json',
+    '.svg': 'image/svg+xml',
+    '.txt': 'text/plain',
+}
+
+# Content types worth compressing (text formats; images and archives are already compressed)
+COMPRESSIBLE_TYPES = {'text/html', 'text/css', 'application/javascript', 'application/json',
+                      'image/svg+xml', 'text/plain'}
+
+# Supported Content-Encoding values and their compression levels
+COMPRESSION_LEVELS = {'gzip': 6, 'br': 9}
+
+# Files below this size, or compressing to more than this ratio, are uploaded as is
+MIN_COMPRESS_SIZE = 1024
+MAX_COMPRESSED_RATIO = 0.9
+
+
+def guess_content_type(file_path: str) -> Optional[str]:
+    """Content-Type by file extension, or None for unknown extensions."""
+    return CONTENT_TYPES.get(os.path.splitext(file_path)[1].lower())
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """
+    Compress data for the given Content-Encoding ('gzip' or 'br').
+
+    The gzip header carries no timestamp, so equal content always gives equal bytes (and ETag).
+    Brotli needs the optional 'brotli' package.
+    """
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=COMPRESSION_LEVELS['gzip'], mtime=0)
+    if encoding == 'br':
+        try:
+            import brotli
+        except ImportError:
+            raise RuntimeError("Brotli compression requires the 'brotli' package (pip install brotli)")
+        return brotli.compress(data, quality=COMPRESSION_LEVELS['br'])
+    raise ValueError(f"Unsupported compression: {encoding}")
+
 
 class S3Client:
     """Client for interacting with S3 storage."""
 
-    def __init__(self):
-        """Initialize S3 client with credentials from constants."""
-        # Configure S3 client with specific parameters for Timeweb S3
-        s3_config = Config(
-            signature_version='s3',  # Use older signature version
-            s3={'addressing_style': 'path'},  # Use path-style addressing
-            retries={'max_attempts': 3, 'mode': 'standard'}
-        )
-
-        self.s3_client = boto3.client(
-            's3',
-            endpoint_url=S3_URL,
-            aws_access_key_id=S3_ACCESS_KEY,
-            aws_secret_access_key=S3_SECRET_ACCESS_KEY,
-            config=s3_config,
-            # No region required for Timeweb S3
-        )
-        self.bucket_name = S3_BUCKET_NAME
+    def __init__(self, max_pool_connections: int = DEFAULT_MAX_WORKERS, s3_client: Any = None,
+                 bucket_name: Optional[str] = None):
+        """
+        Initialize S3 client with credentials from constants.
+
+        The boto3 client is thread-safe, so one instance (and its connection pool) is
+        shared by all upload workers.
+
+        Args:
+            max_pool_connections: Size of the HTTP connection pool; should be at least
+                the number of concurrent upload workers
+            s3_client: Pre-configured boto3 S3 client (e.g. for a local S3-compatible
+                server); by default one is created from constants
+            bucket_name: Bucket to use instead of S3_BUCKET_NAME
+        """
+        if s3_client is None:
+            # Configure S3 client with specific parameters for Timeweb S3
+            s3_config = Config(
+                signature_version='s3',  # Use older signature version
+                s3={'addressing_style': 'path'},  # Use path-style addressing
+                retries={'max_attempts': 3, 'mode': 'standard'},
+                max_pool_connections=max_pool_connections
+            )
+
+            s3_client = boto3.client(
+                's3',
+                endpoint_url=S3_URL,
+                aws_access_key_id=S3_ACCESS_KEY,
+                aws_secret_access_key=S3_SECRET_ACCESS_KEY,
+                config=s3_config,
+                # No region required for Timeweb S3
+            )
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name or S3_BUCKET_NAME
 
         # Ensure the bucket exists and is accessible
         try:
@@ -40,17 +108,34 @@ class S3Client:
         except ClientError as e:
             logger.error(f"Error accessing bucket {self.bucket_name}: {str(e)}")
 
-    def upload_file(self, file_path: str, object_name: Optional[str] = None) -> Tuple[bool, str]:
+    def upload_file(self, file_path: str, object_name: Optional[str] = None, compression: Optional[str] = None,
+                    cache_control: Optional[str] = None) -> Tuple[bool, str]:
         """
         Upload a file to an S3 bucket.
 
         Args:
             file_path: Path to the file to upload
             object_name: S3 object name. If not specified, file_name from file_path is used
+            compression: Optional Content-Encoding ('gzip' or 'br') for compressible types
+            cache_control: Optional Cache-Control header value
 
         Returns:
             Tuple of (success: bool, message: str)
         """
+        success, message, _ = self._upload_file(file_path, object_name, compression, cache_control)
+        return success, message
+
+    def _upload_file(self, file_path: str, object_name: Optional[str] = None, compression: Optional[str] = None,
+                     cache_control: Optional[str] = None) -> Tuple[bool, str, Optional[str]]:
+        """
+        Upload a file and return the ETag of the stored object when it is known.
+
+        Compressible files are compressed in memory and stored with Content-Encoding,
+        unless compression saves less than 1 - MAX_COMPRESSED_RATIO of the size.
+
+        Returns:
+            Tuple of (success: bool, url or error message: str, etag: Optional[str])
+        """
         # If S3 object_name was not specified, use file_name from file_path
         if object_name is None:
             object_name = os.path.basename(file_path)
@@ -59,33 +144,47 @@ class S3Client:
             logger.info(f"Uploading {file_path} to {self.bucket_name}/{object_name}")
 
             # Determine content type based on file extension
-            content_type = None
-            if file_path.lower().endswith('.html'):
-                content_type = 'text/html'
-            elif file_path.lower().endswith('.css'):
-                content_type = 'text/css'
-            elif file_path.lower().endswith('.js'):
-                content_type = 'application/javascript'
+            content_type = guess_content_type(file_path)
+            extra_args = {}
+            if content_type:
+                extra_args['ContentType'] = content_type
+            if cache_control:
+                extra_args['CacheControl'] = cache_control
 
-            # For small files, use put_object instead of upload_file
-            if os.path.getsize(file_path) < 5 * 1024 * 1024:  # Less than 5MB
+            size = os.path.getsize(file_path)
+            body = None
+            if compression and content_type in COMPRESSIBLE_TYPES and size >= MIN_COMPRESS_SIZE:
                 with open(file_path, 'rb') as file_data:
-                    extra_args = {}
-                    if content_type:
-                        extra_args['ContentType'] = content_type
+                    data = file_data.read()
+                compressed = compress(data, compression)
+                if len(compressed) <= len(data) * MAX_COMPRESSED_RATIO:
+                    logger.info(f"Compressed {file_path} with {compression}: {len(data)} -> {len(compressed)} bytes")
+                    body = compressed
+                    extra_args['ContentEncoding'] = compression
+                else:
+                    body = data
 
-                    self.s3_client.put_object(
+            etag = None
+            if body is not None:
+                response = self.s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=object_name,
+                    Body=body,
+                    **extra_args
+                )
+                etag = response.get('ETag', '').strip('"') or None
+            # For small files, use put_object instead of upload_file
+            elif size < PUT_OBJECT_MAX_SIZE:  # Less than 5MB
+                with open(file_path, 'rb') as file_data:
+                    response = self.s3_client.put_object(
                         Bucket=self.bucket_name,
                         Key=object_name,
                         Body=file_data,
                         **extra_args
                     )
+                etag = response.get('ETag', '').strip('"') or None
             else:
                 # For larger files, use the transfer utility
-                extra_args = {}
-                if content_type:
-                    extra_args['ContentType'] = content_type
-
                 self.s3_client.upload_file(
                     file_path,
                     self.bucket_name,
@@ -94,53 +193,186 @@ class S3Client:
                 )
 
             file_url = f"{S3_URL}/{self.bucket_name}/{object_name}"
-            return True, file_url
+            return True, file_url, etag
         except FileNotFoundError:
             message = f"File {file_path} not found"
             logger.error(message)
-            return False, message
+            return False, message, None
         except ClientError as e:
             message = f"Error uploading to S3: {str(e)}"
             logger.error(message)
-            return False, message
+            return False, message, None
         except Exception as e:
             message = f"Unexpected error uploading file: {str(e)}"
             logger.error(message)
+            return False, message, None
+
+    def upload_bytes(self, data: bytes, object_name: str, content_type: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        Upload in-memory content to an S3 bucket without writing a local file.
+
+        Args:
+            data: Object content
+            object_name: S3 object name
+            content_type: Optional Content-Type of the object
+
+        Returns:
+            Tuple of (success: bool, url or error message: str)
+        """
+        try:
+            logger.info(f"Uploading {len(data)} bytes to {self.bucket_name}/{object_name}")
+            extra_args = {}
+            if content_type:
+                extra_args['ContentType'] = content_type
+
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=object_name,
+                Body=data,
+                **extra_args
+            )
+            return True, f"{S3_URL}/{self.bucket_name}/{object_name}"
+        except ClientError as e:
+            message = f"Error uploading to S3: {str(e)}"
+            logger.error(message)
             return False, message
+        except Exception as e:
+            message = f"Unexpected error uploading data: {str(e)}"
+            logger.error(message)
+            return False, message
+
+    def upload_files(self, files: List[Tuple[str, str]], max_workers: int = DEFAULT_MAX_WORKERS,
+                     on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                     compression: Optional[str] = None, cache_control: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Upload files concurrently with a bounded pool of worker threads.
+
+        All workers share this client, so requests reuse its connection pool instead of
+        waiting on one round-trip at a time. Compression runs in the same workers, so
+        compressing one file overlaps with other files' uploads (zlib releases the GIL
+        while compressing).
+
+        Args:
+            files: List of (local file path, S3 object key) pairs
+            max_workers: Maximum number of concurrent uploads; 1 uploads serially
+            on_result: Optional callback invoked with each result as soon as its upload finishes
+            compression: Optional Content-Encoding ('gzip' or 'br') for compressible types
+            cache_control: Optional Cache-Control header value
+
+        Returns:
+            List of dicts with upload results, in the same order as files; "etag" is the
+            ETag of the stored object when known
+        """
+        def upload(file_path: str, s3_key: str) -> Dict[str, Any]:
+            success, message, etag = self._upload_file(file_path, s3_key, compression, cache_control)
+            return {
+                "file": file_path,
+                "s3_key": s3_key,
+                "success": success,
+                "message": message,
+                "etag": etag
+            }
+
+        results: List[Dict[str, Any]] = [{}] * len(files)
+        if max_workers <= 1:
+            for index, (file_path, s3_key) in enumerate(files):
+                results[index] = upload(file_path, s3_key)
+                if on_result:
+                    on_result(results[index])
+            return results
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(upload, file_path, s3_key): index
+                for index, (file_path, s3_key) in enumerate(files)
+            }
+            for future in as_completed(futures):
+                result = future.result()
+                results[futures[future]] = result
+                if on_result:
+                    on_result(result)
+
+        return results
 
-    def upload_directory(self, directory_path: str, prefix: str = "") -> List[Dict[str, Any]]:
+    def upload_directory(self, directory_path: str, prefix: str = "", max_workers: int = DEFAULT_MAX_WORKERS,
+                         compression: Optional[str] = None,
+                         cache_control: Optional[str] = None) -> List[Dict[str, Any]]:
         """
         Upload all files in a directory to S3 bucket.
 
         Args:
             directory_path: Local directory containing files to upload
             prefix: Prefix to add to S3 object keys
+            max_workers: Maximum number of concurrent uploads
+            compression: Optional Content-Encoding ('gzip' or 'br') for compressible types
+            cache_control: Optional Cache-Control header value
 
         Returns:
             List of dicts with upload results
         """
-        results = []
-
         if not os.path.isdir(directory_path):
             logger.error(f"Directory {directory_path} not found")
-            return results
+            return []
 
-        for root, _, files in os.walk(directory_path):
-            for file in files:
+        files = []
+        for root, _, names in os.walk(directory_path):
+            for file in names:
                 local_path = os.path.join(root, file)
 
                 # Create S3 object key with prefix
                 relative_path = os.path.relpath(local_path, directory_path)
                 s3_key = os.path.join(prefix, relative_path).replace("\\", "/")
+                files.append((local_path, s3_key))
+
+        return self.upload_files(files, max_workers=max_workers, compression=compression,
+                                 cache_control=cache_control)
 
-                success, message = self.upload_file(local_path, s3_key)
+    def list_objects(self, prefix: str = "") -> Dict[str, Dict[str, Any]]:
+        """
+        List all objects under a prefix with a single paginated listing.
+
+        Args:
+            prefix: Key prefix to list
+
+        Returns:
+            Dict mapping object key to {"etag": str, "size": int}; ETag quotes are stripped
+        """
+        objects = {}
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for item in page.get('Contents', []):
+                objects[item['Key']] = {"etag": item['ETag'].strip('"'), "size": item['Size']}
+        return objects
+
+    def delete_objects(self, object_names: List[str]) -> List[Dict[str, Any]]:
+        """
+        Delete objects in batches of up to 1000 keys per request.
+
+        Args:
+            object_names: S3 object names to delete
+
+        Returns:
+            List of dicts with deletion results
+        """
+        results = []
+        for start in range(0, len(object_names), 1000):
+            batch = object_names[start:start + 1000]
+            try:
+                response = self.s3_client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                )
+                errors = {item['Key']: item.get('Message', 'Unknown error') for item in response.get('Errors', [])}
+            except ClientError as e:
+                message = f"Error deleting from S3: {str(e)}"
+                logger.error(message)
+                errors = {key: message for key in batch}
+            for key in batch:
                 results.append({
-                    "file": local_path,
-                    "s3_key": s3_key,
-                    "success": success,
-                    "message": message
+                    "s3_key": key,
+                    "success": key not in errors,
+                    "message": errors.get(key, "deleted")
                 })
-
         return results
 
     def generate_presigned_url(self, object_name: str, expiration: int = 3600) -> Tuple[bool, str]:
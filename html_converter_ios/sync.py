@@ -0,0 +1,186 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from s3 import DEFAULT_MAX_WORKERS, S3Client
+
+logger = logging.getLogger(__name__)
+
+# Default manifest file name, stored in the uploaded folder
+MANIFEST_NAME = ".s3_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_md5(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the MD5 hex digest of a file (the ETag S3 assigns to a single-part upload).
+
+    Args:
+        file_path: Path to the file
+        chunk_size: Read block size in bytes
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.md5()
+    with open(file_path, 'rb') as file_data:
+        for block in iter(lambda: file_data.read(chunk_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _read_manifest(manifest_path: str) -> Dict[str, Any]:
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest {manifest_path}: {str(e)}")
+        return {}
+    return manifest if isinstance(manifest, dict) and manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def load_manifest(manifest_path: str, bucket: str, prefix: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Load manifest entries for a bucket and prefix.
+
+    One manifest file holds a section per bucket and prefix. A missing or unreadable
+    manifest, or one without this section, yields no entries, so the sync falls back
+    to comparing content hashes with remote ETags.
+
+    Returns:
+        Dict mapping S3 key to {"path", "size", "mtime", "md5", "etag", "compression", "cache_control"}
+    """
+    manifest = _read_manifest(manifest_path)
+    return manifest.get("buckets", {}).get(bucket, {}).get(prefix, {})
+
+
+def save_manifest(manifest_path: str, bucket: str, prefix: str, entries: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Replace the section for a bucket and prefix and atomically rewrite the manifest
+    (temporary file in the same folder, then os.replace).
+    """
+    manifest = _read_manifest(manifest_path) or {"version": MANIFEST_VERSION}
+    manifest.setdefault("buckets", {}).setdefault(bucket, {})[prefix] = entries
+    directory = os.path.dirname(os.path.abspath(manifest_path))
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=directory, suffix='.tmp', delete=False) as tmp:
+        json.dump(manifest, tmp, indent=1, sort_keys=True)
+    os.replace(tmp.name, manifest_path)
+
+
+def _is_unchanged(entry: Optional[Dict[str, Any]], md5: str, remote: Optional[Dict[str, Any]],
+                  compression: Optional[str], cache_control: Optional[str]) -> bool:
+    """Whether the remote object already holds the local content, stored with the current upload settings."""
+    if remote is None:
+        return False
+    if entry is None:
+        # Without a manifest entry the stored headers are unknown: only a plain upload
+        # of the same content can be skipped
+        return remote["etag"] == md5 and compression is None and cache_control is None
+    # Entries written before settings were recorded count as a plain upload
+    if (entry.get("compression"), entry.get("cache_control")) != (compression, cache_control):
+        return False
+    if remote["etag"] == md5:
+        return True
+    # Compressed and multipart uploads have an ETag that is not the content MD5: trust
+    # the manifest when it recorded this ETag (or no ETag yet) for the same content
+    return entry["md5"] == md5 and entry.get("etag") in (remote["etag"], None)
+
+
+def sync_files(s3_client: S3Client, files: List[Tuple[str, str]], prefix: str, manifest_path: str,
+               delete_orphans: bool = False, orphan_filter: Optional[Callable[[str], bool]] = None,
+               max_workers: int = DEFAULT_MAX_WORKERS,
+               on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+               compression: Optional[str] = None, cache_control: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Upload only new or changed files, comparing a local manifest with one remote listing.
+
+    The manifest keeps path, size, mtime and MD5 of every synced file, so files whose
+    size and mtime did not change are not re-read. Other files are hashed in a pool of
+    worker threads. A file is skipped when the remote object under its key has the same
+    content hash (ETag) and was uploaded with the same compression and cache_control;
+    everything else is uploaded concurrently via S3Client.upload_files.
+
+    Args:
+        s3_client: Client for the target bucket
+        files: List of (local file path, S3 object key) pairs; keys should start with prefix
+        prefix: Remote prefix that is listed and compared (e.g. "reports/")
+        manifest_path: Path of the local manifest file
+        delete_orphans: Delete remote objects under prefix that have no local file
+        orphan_filter: Optional predicate on keys; only matching keys are considered orphans
+        max_workers: Maximum number of concurrent hash and upload workers
+        on_result: Optional callback invoked with each upload result as soon as it finishes
+        compression, cache_control: Passed to S3Client.upload_files
+
+    Returns:
+        Dict with "uploaded" and "failed" (upload result dicts in file order),
+        "unchanged" (keys), "deleted" and "delete_failed" (deletion result dicts)
+    """
+    bucket = s3_client.bucket_name
+    manifest = load_manifest(manifest_path, bucket, prefix)
+    remote = s3_client.list_objects(prefix)
+    logger.info(f"Remote prefix '{prefix}' holds {len(remote)} objects, manifest has {len(manifest)} entries")
+
+    # Reuse the stored hash when size and mtime match, hash the rest concurrently
+    stats = [os.stat(file_path) for file_path, _ in files]
+    md5s: List[Optional[str]] = []
+    to_hash = []
+    for index, ((file_path, s3_key), stat) in enumerate(zip(files, stats)):
+        entry = manifest.get(s3_key)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            md5s.append(entry["md5"])
+        else:
+            md5s.append(None)
+            to_hash.append(index)
+    if to_hash:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            for index, md5 in zip(to_hash, executor.map(file_md5, [files[i][0] for i in to_hash])):
+                md5s[index] = md5
+
+    entries: Dict[str, Dict[str, Any]] = {}
+    changed = []
+    unchanged = []
+    for (file_path, s3_key), stat, md5 in zip(files, stats, md5s):
+        entry = {"path": file_path, "size": stat.st_size, "mtime": stat.st_mtime_ns, "md5": md5,
+                 "compression": compression, "cache_control": cache_control}
+        remote_object = remote.get(s3_key)
+        if _is_unchanged(manifest.get(s3_key), md5, remote_object, compression, cache_control):
+            entry["etag"] = remote_object["etag"]
+            entries[s3_key] = entry
+            unchanged.append(s3_key)
+        else:
+            changed.append((file_path, s3_key, entry))
+    logger.info(f"{len(changed)} new or changed files, {len(unchanged)} unchanged")
+
+    results = s3_client.upload_files([(file_path, s3_key) for file_path, s3_key, _ in changed],
+                                     max_workers=max_workers, on_result=on_result,
+                                     compression=compression, cache_control=cache_control)
+    for (_, s3_key, entry), result in zip(changed, results):
+        if result["success"]:
+            # ETag of the stored object (of the compressed body for compressed uploads);
+            # unknown for multipart uploads, then it is taken from the listing on the next sync
+            entry["etag"] = result.get("etag")
+            entries[s3_key] = entry
+
+    deletions = []
+    if delete_orphans:
+        local_keys = {s3_key for _, s3_key in files}
+        orphans = sorted(key for key in remote
+                         if key not in local_keys and (orphan_filter is None or orphan_filter(key)))
+        if orphans:
+            logger.info(f"Deleting {len(orphans)} orphaned objects under '{prefix}'")
+            deletions = s3_client.delete_objects(orphans)
+
+    save_manifest(manifest_path, bucket, prefix, entries)
+    return {
+        "uploaded": [result for result in results if result["success"]],
+        "failed": [result for result in results if not result["success"]],
+        "unchanged": unchanged,
+        "deleted": [item for item in deletions if item["success"]],
+        "delete_failed": [item for item in deletions if not item["success"]],
+    }
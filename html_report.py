@@ -0,0 +1,161 @@
+import html
+from itertools import islice
+
+# Стили встраиваются в документ, чтобы отчет открывался без доступа к CDN
+REPORT_CSS = """
+body { padding: 20px; font-family: Arial, sans-serif; background-color: #fafafa; }
+.container { max-width: 1400px; margin: 0 auto; }
+h1, h2 { text-align: center; margin: 30px 0; color: #333; }
+.section { margin-bottom: 50px; background-color: white; padding: 20px; border-radius: 8px;
+           box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+.table { margin-top: 20px; width: 100%; border-collapse: collapse; }
+.table th { background-color: #f8f9fa; text-align: center; vertical-align: middle; font-weight: bold;
+            padding: 12px; border-bottom: 2px solid #dee2e6; }
+.table td { text-align: center; vertical-align: middle; padding: 10px; border-top: 1px solid #dee2e6; }
+.table tbody tr:nth-of-type(odd) { background-color: rgba(0,0,0,0.03); }
+.table tbody tr:hover { background-color: #f5f5f5; }
+"""
+
+_HEAD_TEMPLATE = """<!DOCTYPE html>
+<html lang="ru">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>{css}</style>
+</head>
+<body>
+<div class="container">
+"""
+
+_FOOT_TEMPLATE = """</div>
+</body>
+</html>
+"""
+
+
+def format_column(values, spec=None):
+    """
+    Форматирует колонку целиком одной строкой формата, без разбора типа в каждой ячейке.
+
+    Args:
+        values (pd.Series | np.ndarray): Значения колонки
+        spec (str | callable, optional): Строка формата вида '${:,.2f}' или функция,
+            возвращающая список строк для всей колонки. По умолчанию - str() с экранированием HTML.
+
+    Returns:
+        list: Строки для ячеек
+    """
+    values = values.tolist() if hasattr(values, 'tolist') else list(values)
+    if spec is None:
+        return [html.escape(str(value)) for value in values]
+    if callable(spec):
+        return list(spec(values))
+    return list(map(spec.format, values))
+
+
+class HtmlReport:
+    """
+    Потоковая запись HTML-отчета: заголовок документа пишется при создании,
+    каждая таблица и график - сразу в поток, поэтому память не зависит от размера отчета.
+
+    Документ самодостаточный: стили встроены, plotly.js встраивается один раз
+    перед первым графиком (отчет без графиков его не содержит).
+
+    Args:
+        stream: Текстовый поток для записи (файл, io.StringIO и т.п.)
+        title (str): Заголовок документа
+        chunk_rows (int, optional): Число строк таблицы, записываемых за один вызов write
+    """
+
+    def __init__(self, stream, title, chunk_rows=5000):
+        self._stream = stream
+        self._owns_stream = False
+        self._plotlyjs_written = False
+        self._section_open = False
+        self.chunk_rows = chunk_rows
+        self._stream.write(_HEAD_TEMPLATE.format(title=html.escape(title), css=REPORT_CSS))
+
+    @classmethod
+    def open(cls, path, title, **kwargs):
+        """Создает отчет, записываемый в файл path"""
+        report = cls(open(path, 'w', encoding='utf-8'), title, **kwargs)
+        report._owns_stream = True
+        return report
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+    def heading(self, text, level=2):
+        self._stream.write(f"<h{level}>{html.escape(text)}</h{level}>\n")
+
+    def section(self, title=None, level=2):
+        """Начинает новый блок отчета (предыдущий закрывается)"""
+        self._close_section()
+        self._stream.write('<div class="section">\n')
+        self._section_open = True
+        if title:
+            self.heading(title, level)
+
+    def _close_section(self):
+        if self._section_open:
+            self._stream.write('</div>\n')
+            self._section_open = False
+
+    def table(self, frame, formats=None, index=True, classes='table'):
+        """
+        Записывает DataFrame как HTML-таблицу.
+
+        Каждая колонка форматируется целиком (см. format_column), строки таблицы
+        собираются и пишутся в поток блоками по chunk_rows.
+
+        Args:
+            frame (pd.DataFrame): Таблица
+            formats (dict, optional): Колонка -> строка формата или функция форматирования
+            index (bool, optional): Выводить ли индекс первой колонкой
+            classes (str, optional): CSS-классы таблицы
+        """
+        formats = formats or {}
+        headers = list(frame.columns)
+        cells = [format_column(frame[column], formats.get(column)) for column in frame.columns]
+        if index:
+            headers = [frame.index.name or ''] + headers
+            cells = [format_column(frame.index, formats.get(frame.index.name))] + cells
+
+        write = self._stream.write
+        write(f'<table class="{classes}">\n<thead><tr>')
+        write(''.join(f'<th>{html.escape(str(header))}</th>' for header in headers))
+        write('</tr></thead>\n<tbody>\n')
+        rows = zip(*cells)
+        while True:
+            chunk = list(islice(rows, self.chunk_rows))
+            if not chunk:
+                break
+            write(''.join('<tr><td>' + '</td><td>'.join(row) + '</td></tr>\n' for row in chunk))
+        write('</tbody>\n</table>\n')
+
+    def figure(self, fig):
+        """Записывает график Plotly; plotly.js встраивается в документ только один раз"""
+        import plotly.io as pio
+
+        if not self._plotlyjs_written:
+            from plotly.offline import get_plotlyjs
+
+            self._stream.write('<script type="text/javascript">')
+            self._stream.write(get_plotlyjs())
+            self._stream.write('</script>\n')
+            self._plotlyjs_written = True
+        self._stream.write(pio.to_html(fig, full_html=False, include_plotlyjs=False))
+        self._stream.write('\n')
+
+    def close(self):
+        """Закрывает документ (и файл, если отчет открыт через open)"""
+        if self._stream is None:
+            return
+        self._close_section()
+        self._stream.write(_FOOT_TEMPLATE)
+        if self._owns_stream:
+            self._stream.close()
+        self._stream = None
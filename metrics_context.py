@@ -0,0 +1,104 @@
+from functools import cached_property
+
+import numpy as np
+
+from risk_kernels import sorted_quantile, tail_statistics
+
+TRADING_DAYS = 252
+
+
+class SeriesMetrics:
+    """
+    Промежуточные величины одного ряда доходности для отчетов и метрик риска.
+
+    Каждая величина (среднее, стандартное отклонение, кривая накопленной доходности,
+    просадки, отсортированные значения, хвостовые статистики) считается один раз
+    при первом обращении и затем берется из объекта.
+
+    Args:
+        returns (pd.Series): Дневные доходности
+        periods_per_year (int, optional): Число периодов в году
+    """
+
+    def __init__(self, returns, periods_per_year=TRADING_DAYS):
+        self.returns = returns
+        self.periods_per_year = periods_per_year
+
+    @cached_property
+    def values(self):
+        return np.asarray(self.returns, dtype=float)
+
+    @cached_property
+    def mean(self):
+        return self.returns.mean()
+
+    @cached_property
+    def std(self):
+        """Дневное стандартное отклонение (ddof=1)"""
+        return self.returns.std()
+
+    @cached_property
+    def annual_volatility(self):
+        return self.std * np.sqrt(self.periods_per_year)
+
+    @cached_property
+    def cumulative(self):
+        """Накопленная доходность (1 + r).cumprod()"""
+        return (1 + self.returns).cumprod()
+
+    @cached_property
+    def drawdowns(self):
+        """Просадки от исторического максимума накопленной доходности"""
+        return self.cumulative / self.cumulative.cummax() - 1
+
+    @cached_property
+    def max_drawdown(self):
+        return self.drawdowns.min()
+
+    @cached_property
+    def annual_return(self):
+        """Годовая доходность по накопленной за период"""
+        return self.cumulative.iloc[-1] ** (self.periods_per_year / len(self.returns)) - 1
+
+    @cached_property
+    def sorted_values(self):
+        """Отсортированные доходности: по ним считаются все квантили без повторной сортировки"""
+        return np.sort(self.values)
+
+    @cached_property
+    def tail(self):
+        """Квантильные и хвостовые статистики ряда (см. risk_kernels.tail_statistics)"""
+        return tail_statistics(self.values[:, None], sorted_values=self.sorted_values).iloc[0]
+
+    def quantile(self, q):
+        """Квантиль с линейной интерполяцией (как np.percentile и Series.quantile)"""
+        return sorted_quantile(self.sorted_values, q)
+
+
+class MetricsContext:
+    """
+    Общие промежуточные величины для всех отчетов по портфелю: ряды доходности
+    портфеля и бенчмарка с их производными и разница доходностей для ошибки слежения.
+
+    Контекст создается анализатором один раз и живет до изменения данных или весов,
+    поэтому генерация нескольких отчетов не пересчитывает одни и те же ряды.
+
+    Args:
+        portfolio_returns (pd.Series): Дневная доходность портфеля
+        benchmark_returns (pd.Series): Дневная доходность бенчмарка
+        periods_per_year (int, optional): Число периодов в году
+    """
+
+    def __init__(self, portfolio_returns, benchmark_returns, periods_per_year=TRADING_DAYS):
+        self.periods_per_year = periods_per_year
+        self.portfolio = SeriesMetrics(portfolio_returns, periods_per_year)
+        self.benchmark = SeriesMetrics(benchmark_returns, periods_per_year)
+
+    @cached_property
+    def active_returns(self):
+        """Разница доходностей портфеля и бенчмарка"""
+        return self.portfolio.returns - self.benchmark.returns
+
+    @cached_property
+    def tracking_error(self):
+        return self.active_returns.std() * np.sqrt(self.periods_per_year)
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+# Минимальный срок до экспирации (в годах), чтобы избежать деления на ноль
+_MIN_TIME = 1e-6
+_SQRT_2PI = np.sqrt(2 * np.pi)
+
+
+def _norm_pdf(x):
+    return np.exp(-0.5 * x * x) / _SQRT_2PI
+
+
+def _is_call(option_type):
+    """Булев массив: True для CALL, False для PUT"""
+    return np.char.upper(np.asarray(option_type, dtype=str)) == 'CALL'
+
+
+def black_scholes(spot, strike, time_to_expiry, volatility, rate=0.0, option_type='CALL', dividend_yield=0.0):
+    """
+    Цена и греки европейских опционов по модели Блэка-Шоулза для массивов контрактов.
+
+    Все аргументы - скаляры или массивы, совместимые по broadcasting. Для истекших
+    опционов (срок <= 0) цена равна внутренней стоимости, дельта - 0/±1, остальные греки - 0.
+
+    Args:
+        spot: Цена базового актива
+        strike: Страйк
+        time_to_expiry: Срок до экспирации в годах
+        volatility: Годовая волатильность
+        rate (optional): Безрисковая ставка (непрерывная)
+        option_type (optional): 'CALL' / 'PUT' или массив таких значений
+        dividend_yield (optional): Дивидендная доходность
+
+    Returns:
+        dict: 'price', 'delta', 'gamma', 'vega' (на 1.00 волатильности), 'theta' (в год)
+    """
+    # scipy загружается при первой оценке, а не при импорте модуля
+    from scipy.special import ndtr
+
+    spot, strike, time_to_expiry, volatility = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (spot, strike, time_to_expiry, volatility))
+    )
+    is_call = np.broadcast_to(_is_call(option_type), spot.shape)
+    sign = np.where(is_call, 1.0, -1.0)
+
+    expired = time_to_expiry <= 0
+    t = np.maximum(time_to_expiry, _MIN_TIME)
+    vol = np.maximum(volatility, _MIN_TIME)
+    sqrt_t = np.sqrt(t)
+    discount = np.exp(-rate * t)
+    carry = np.exp(-dividend_yield * t)
+
+    d1 = (np.log(spot / strike) + (rate - dividend_yield + 0.5 * vol ** 2) * t) / (vol * sqrt_t)
+    d2 = d1 - vol * sqrt_t
+    pdf_d1 = _norm_pdf(d1)
+    cdf_d1 = ndtr(sign * d1)
+    cdf_d2 = ndtr(sign * d2)
+
+    price = sign * (spot * carry * cdf_d1 - strike * discount * cdf_d2)
+    delta = sign * carry * cdf_d1
+    gamma = carry * pdf_d1 / (spot * vol * sqrt_t)
+    vega = spot * carry * pdf_d1 * sqrt_t
+    theta = (-spot * carry * pdf_d1 * vol / (2 * sqrt_t)
+             - sign * rate * strike * discount * cdf_d2
+             + sign * dividend_yield * spot * carry * cdf_d1)
+
+    if expired.any():
+        intrinsic = np.maximum(sign * (spot - strike), 0.0)
+        price = np.where(expired, intrinsic, price)
+        delta = np.where(expired, np.where(intrinsic > 0, sign, 0.0), delta)
+        gamma = np.where(expired, 0.0, gamma)
+        vega = np.where(expired, 0.0, vega)
+        theta = np.where(expired, 0.0, theta)
+
+    return {'price': price, 'delta': delta, 'gamma': gamma, 'vega': vega, 'theta': theta}
+
+
+def implied_volatility(price, spot, strike, time_to_expiry, rate=0.0, option_type='CALL', dividend_yield=0.0,
+                       tol=1e-8, max_iter=100, vol_bounds=(1e-4, 5.0)):
+    """
+    Подразумеваемая волатильность для массива опционов.
+
+    Векторный метод Ньютона по веге с защитной вилкой: если шаг Ньютона выходит
+    за текущий интервал, берется его середина (бисекция). Для цен вне
+    арбитражных границ и истекших опционов возвращается NaN.
+
+    Returns:
+        np.ndarray: Подразумеваемая волатильность
+    """
+    price, spot, strike, time_to_expiry = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (price, spot, strike, time_to_expiry))
+    )
+    is_call = np.broadcast_to(_is_call(option_type), price.shape)
+    option_type = np.where(is_call, 'CALL', 'PUT')
+
+    low = np.full(price.shape, vol_bounds[0])
+    high = np.full(price.shape, vol_bounds[1])
+    price_low = black_scholes(spot, strike, time_to_expiry, low, rate, option_type, dividend_yield)['price']
+    price_high = black_scholes(spot, strike, time_to_expiry, high, rate, option_type, dividend_yield)['price']
+    valid = (time_to_expiry > 0) & (price >= price_low) & (price <= price_high)
+
+    vol = np.full(price.shape, 0.3)
+    active = valid.copy()
+    for _ in range(max_iter):
+        if not active.any():
+            break
+        greeks = black_scholes(spot, strike, time_to_expiry, vol, rate, option_type, dividend_yield)
+        diff = greeks['price'] - price
+        active &= np.abs(diff) > tol
+
+        # Сужаем вилку: цена растет с волатильностью
+        high = np.where(active & (diff > 0), vol, high)
+        low = np.where(active & (diff < 0), vol, low)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = vol - diff / greeks['vega']
+        bisection = 0.5 * (low + high)
+        step = np.where(np.isfinite(newton) & (newton > low) & (newton < high), newton, bisection)
+        vol = np.where(active, step, vol)
+
+    return np.where(valid, vol, np.nan)
+
+
+def year_fraction(expiry, valuation_dates):
+    """
+    Срок до экспирации в годах (ACT/365) для каждой пары дата оценки x экспирация.
+
+    Args:
+        expiry: Даты экспирации (K)
+        valuation_dates: Даты оценки (T)
+
+    Returns:
+        np.ndarray: Матрица T x K (NaN для нераспознанных дат экспирации)
+    """
+    expiry = pd.to_datetime(pd.Series(expiry), format='%Y-%m-%d', errors='coerce').values.astype('datetime64[D]')
+    valuation_dates = pd.DatetimeIndex(valuation_dates).values.astype('datetime64[D]')
+    days = (expiry[None, :] - valuation_dates[:, None]).astype(float)
+    days[:, np.isnat(expiry)] = np.nan
+    return days / 365.0
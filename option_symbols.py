@@ -0,0 +1,131 @@
+import re
+import warnings
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+_MONTHS = {
+    'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
+    'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12
+}
+
+# Брокерский формат: AMZN Jun20'25 180 PUT
+_BROKER_OPTION_PATTERN = (
+    r"^\s*(?P<underlying>[A-Za-z][A-Za-z0-9.\-]*)\s+(?P<month>[A-Za-z]{3})(?P<day>\d{1,2})'(?P<year>\d{2})"
+    r"\s+(?P<strike>\d+(?:\.\d+)?)\s+(?P<option_type>PUT|CALL)\s*$"
+)
+# Формат OSI: AMZN  250620P00180000 (страйк * 1000, 8 цифр)
+_OSI_OPTION_PATTERN = (
+    r"^\s*(?P<underlying>[A-Za-z][A-Za-z0-9.]{0,5})\s*(?P<year>\d{2})(?P<month>\d{2})(?P<day>\d{2})"
+    r"(?P<option_type>[CP])(?P<strike>\d{8})\s*$"
+)
+_BROKER_OPTION_RE = re.compile(_BROKER_OPTION_PATTERN)
+_OSI_OPTION_RE = re.compile(_OSI_OPTION_PATTERN)
+
+
+@lru_cache(maxsize=65536)
+def _parse_option_symbol(symbol):
+    """
+    Разбирает символ опциона в брокерском формате или формате OSI.
+    
+    Returns:
+        tuple | None: (underlying, expiry 'YYYY-MM-DD', strike, option_type) или None, если символ некорректен
+    """
+    match = _BROKER_OPTION_RE.match(symbol)
+    if match:
+        month = _MONTHS.get(match['month'].upper())
+        strike = float(match['strike'])
+        option_type = match['option_type']
+    else:
+        match = _OSI_OPTION_RE.match(symbol)
+        if not match:
+            return None
+        month = int(match['month'])
+        strike = int(match['strike']) / 1000
+        option_type = 'CALL' if match['option_type'] == 'C' else 'PUT'
+    
+    if month is None:
+        return None
+    try:
+        # Год в формате '25' -> 2025
+        expiry = datetime(2000 + int(match['year']), month, int(match['day']))
+    except ValueError:
+        return None
+    return match['underlying'].upper(), expiry.strftime('%Y-%m-%d'), strike, option_type
+
+
+def parse_option_ticker(ticker):
+    """
+    Парсит строку с тикером опциона, извлекая базовый актив, дату истечения и страйк
+    Пример: 'AMZN Jun20'25 180 PUT' -> {'underlying': 'AMZN', 'expiry': '2025-06-20', 'strike': 180, 'option_type': 'PUT'}
+    Поддерживается и формат OSI: 'AMZN  250620P00180000'. Результаты кэшируются для повторяющихся символов.
+    """
+    parsed = _parse_option_symbol(ticker)
+    if parsed is not None:
+        underlying, expiry_date, strike, option_type = parsed
+        return {
+            'underlying': underlying,
+            'expiry': expiry_date,
+            'strike': strike,
+            'option_type': option_type
+        }
+    
+    # Если не удалось распарсить, возвращаем базовый актив как первое слово
+    warnings.warn(f"Error parsing option ticker '{ticker}'", stacklevel=2)
+    underlying = ticker.split()[0]
+    return {'underlying': underlying}
+
+
+def parse_option_tickers(tickers):
+    """
+    Пакетный разбор колонки или списка символов опционов за один векторный проход.
+    
+    Повторяющиеся символы разбираются один раз. Некорректные строки не заменяются
+    догадками, а помечаются valid=False (остальные поля - пустые).
+    
+    Args:
+        tickers (list | pd.Series): Символы в брокерском формате или формате OSI
+    
+    Returns:
+        pd.DataFrame: Колонки 'ticker', 'underlying', 'expiry' (datetime64), 'strike' (float),
+            'option_type' ('CALL'/'PUT'), 'valid' (bool); индекс совпадает с индексом входной серии
+    """
+    tickers = tickers if isinstance(tickers, pd.Series) else pd.Series(list(tickers), dtype=object)
+    codes, uniques = pd.factorize(tickers)
+    symbols = pd.Series(uniques, dtype='string')
+    
+    broker = symbols.str.extract(_BROKER_OPTION_PATTERN)
+    osi = symbols.str.extract(_OSI_OPTION_PATTERN)
+    is_broker = broker['underlying'].notna()
+    
+    underlying = broker['underlying'].fillna(osi['underlying']).str.upper()
+    year = 2000 + pd.to_numeric(broker['year'].fillna(osi['year'])).astype(float)
+    month = broker['month'].str.upper().map(_MONTHS).astype(float).where(is_broker, pd.to_numeric(osi['month']).astype(float))
+    day = pd.to_numeric(broker['day'].fillna(osi['day'])).astype(float)
+    # Несуществующие даты (например, 30 февраля) превращаются в NaT
+    expiry = pd.to_datetime(year * 10000 + month * 100 + day, format='%Y%m%d', errors='coerce')
+    strike = pd.to_numeric(broker['strike']).astype(float).where(is_broker, pd.to_numeric(osi['strike']).astype(float) / 1000)
+    option_type = broker['option_type'].where(is_broker, osi['option_type'].map({'C': 'CALL', 'P': 'PUT'}))
+    
+    parsed = pd.DataFrame({
+        'underlying': underlying.astype(object),
+        'expiry': expiry,
+        'strike': strike.astype(float),
+        'option_type': option_type.astype(object),
+    })
+    valid = parsed['underlying'].notna() & parsed['expiry'].notna()
+    parsed = parsed.where(valid, axis=0)
+    parsed['valid'] = valid
+    
+    # Пустые значения во входных данных (код -1) ссылаются на дополнительную пустую строку
+    parsed = parsed.reindex(range(len(parsed) + 1))
+    parsed['valid'] = parsed['valid'].fillna(False)
+    codes = np.where(codes < 0, len(parsed) - 1, codes)
+    
+    result = parsed.iloc[codes].reset_index(drop=True)
+    result.index = tickers.index
+    result.insert(0, 'ticker', tickers)
+    result['valid'] = result['valid'].astype(bool)
+    return result
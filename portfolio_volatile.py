@@ -1,35 +1,85 @@
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import yfinance as yf
-from scipy import stats
 from datetime import datetime, timedelta
-import re
-import os
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.subplots import make_subplots
+import warnings
+from statistics import NormalDist
+# plotly, openpyxl и yfinance импортируются лениво - только при построении
+# отчетов и загрузке котировок, чтобы расчетное ядро импортировалось быстро
+from price_store import PriceStore, YFinanceSource
+from risk_kernels import regress_on_benchmark, tail_statistics
+from risk_model import RiskModel, monte_carlo_var
+from option_pricing import black_scholes, implied_volatility, year_fraction
+from rolling_analytics import RollingAnalytics
+from position_book import PositionBook
+from option_symbols import parse_option_ticker, parse_option_tickers
+from metrics_context import MetricsContext, SeriesMetrics
+from html_report import HtmlReport
+from artifact_sink import ArtifactSink, LocalSink
+
+class _GrowableFrame:
+    """
+    Таблица с предвыделенным буфером по строкам: добавление дня - амортизированно O(N)
+    без concat и копирования всей истории. to_pandas() возвращает представление
+    заполненной части без копирования.
+    """
+    
+    def __init__(self, frame):
+        self.is_series = isinstance(frame, pd.Series)
+        self.columns = pd.Index([frame.name]) if self.is_series else frame.columns
+        values = np.asarray(frame.values, dtype=float).reshape(len(frame), len(self.columns))
+        self.length = len(values)
+        capacity = max(2 * self.length, 64)
+        self._values = np.empty((capacity, len(self.columns)))
+        self._values[:self.length] = values
+        self._index = np.empty(capacity, dtype=frame.index.values.dtype)
+        self._index[:self.length] = frame.index.values
+    
+    def append(self, date, row):
+        if self.length == len(self._values):
+            # Удваиваем буфер
+            self._values = np.concatenate([self._values, np.empty_like(self._values)])
+            self._index = np.concatenate([self._index, np.empty_like(self._index)])
+        self._values[self.length] = row
+        self._index[self.length] = np.datetime64(pd.Timestamp(date))
+        self.length += 1
+    
+    @property
+    def values(self):
+        return self._values[:self.length]
+    
+    def to_pandas(self):
+        index = pd.DatetimeIndex(self._index[:self.length])
+        if self.is_series:
+            return pd.Series(self.values[:, 0], index=index, name=self.columns[0], copy=False)
+        return pd.DataFrame(self.values, index=index, columns=self.columns, copy=False)
+
 
 class PortfolioVolatilityAnalyzer:
-    def __init__(self, portfolio_data, benchmark_ticker='^IXIC', start_date=None, end_date=None, risk_free_rate=0.04):
+    def __init__(self, portfolio_data, benchmark_ticker='^IXIC', start_date=None, end_date=None, risk_free_rate=0.04,
+                 price_source=None, output=None):
         """
         Инициализация анализатора волатильности портфеля
         
         Args:
-            portfolio_data (list): Список словарей с данными о позициях в портфеле.
+            portfolio_data (list | PositionBook): Список словарей с данными о позициях в портфеле
+                или готовая колоночная книга позиций.
                 Каждый словарь должен содержать 'ticker', 'position', 'price' и опционально 'type', 'expiry', 'strike'
             benchmark_ticker (str, optional): Тикер бенчмарка. По умолчанию - индекс NASDAQ (^IXIC).
             start_date (str, optional): Начальная дата для анализа в формате 'YYYY-MM-DD'
             end_date (str, optional): Конечная дата для анализа в формате 'YYYY-MM-DD'
             risk_free_rate (float, optional): Безрисковая ставка для расчета коэффициента Шарпа. По умолчанию - 4%.
+            price_source (PriceSource, optional): Источник исторических котировок.
+                По умолчанию - локальный кэш PriceStore с догрузкой из Yahoo Finance.
+            output (str | ArtifactSink, optional): Куда сохранять отчеты: путь к папке или хранилище
+                артефактов (LocalSink, MemorySink, S3Sink). По умолчанию - папка DEFAULT_OUTPUT_DIR.
         """
         self.portfolio_data = portfolio_data
+        # Позиции хранятся в колоночном виде, веса и стоимости считаются векторно
+        self.book = portfolio_data if isinstance(portfolio_data, PositionBook) else PositionBook.from_records(portfolio_data)
         self.benchmark_ticker = benchmark_ticker
         self.risk_free_rate = risk_free_rate
-        self.output_dir = r"C:\Users\Main\Pitonio\market"
-        
-        # Обновляем цены закрытия для всех инструментов
-        self._update_current_prices()
+        self.price_source = price_source if price_source is not None else PriceStore(source=YFinanceSource())
+        self.output = output
         
         # Если даты не указаны, используем период с начала года
         if end_date is None:
@@ -42,182 +92,503 @@ class PortfolioVolatilityAnalyzer:
         else:
             self.start_date = datetime.strptime(start_date, '%Y-%m-%d')
         
-        # Извлекаем тикеры и рассчитываем веса
+        # Кэш производных величин: _cache зависит от весов и данных (вектор экспозиций,
+        # доходность портфеля), _data_cache - только от данных (регрессии, модели риска)
+        self._cache = {}
+        self._data_cache = {}
+        
+        # Извлекаем тикеры
         self.stock_tickers = self._extract_stock_tickers()
+        # Ряды цен для доходностей: акции и базовые активы опционов (в том числе не купленные как акции)
+        self.asset_tickers = list(dict.fromkeys(self.stock_tickers + self.book.underlying_tickers()))
         self.option_data = self._extract_option_data()
-        self.portfolio_weights = self._calculate_weights()
         
         # Загружаем данные
         self.data = None
         self.returns = None
         self.benchmark_returns = None
         self.load_data()
+        
+        # Обновляем цены закрытия для всех инструментов по загруженным данным и рассчитываем веса
+        self.stale_price_tickers = []
+        self._update_current_prices()
+        self._price_options()
+        self.portfolio_weights = self._calculate_weights()
+    
+    @property
+    def output(self):
+        """Хранилище артефактов, в которое пишутся отчеты"""
+        return self._output
+    
+    @output.setter
+    def output(self, output):
+        self._output = output if isinstance(output, ArtifactSink) else LocalSink(output)
+    
+    @property
+    def output_dir(self):
+        """Папка отчетов для локального хранилища (None для остальных)"""
+        return self._output.location if isinstance(self._output, LocalSink) else None
+    
+    @output_dir.setter
+    def output_dir(self, output_dir):
+        self.output = LocalSink(output_dir)
     
     def _update_current_prices(self):
-        """Обновляет текущие цены для всех инструментов"""
-        for item in self.portfolio_data:
-            ticker = item['ticker']
-            if 'type' not in item or item['type'] == 'stock':
-                try:
-                    stock = yf.Ticker(ticker)
-                    current_price = stock.history(period='1d')['Close'].iloc[-1]
-                    item['current_price'] = current_price
-                except:
-                    item['current_price'] = item['price']
-            else:
-                # Для опционов пока оставляем указанную цену
-                item['current_price'] = item['price']
+        """
+        Обновляет текущие цены для всех инструментов.
+        
+        Цены акций берутся одной операцией из последней строки уже загруженных
+        цен закрытия, без отдельного запроса на каждый тикер. Тикеры без котировок
+        остаются с указанной ценой 'price' и перечисляются в self.stale_price_tickers.
+        """
+        last_close = self.data.ffill().iloc[-1] if self.data is not None and not self.data.empty else pd.Series(dtype=float)
+        # Цены на дату оценки: по ним считаются веса и дельта-эквиваленты опционов
+        self.current_prices = last_close
+        
+        self.stale_price_tickers = self.book.set_current_prices(last_close)
+        if self.stale_price_tickers:
+            warnings.warn(f"Нет актуальных котировок, используется исходная цена: {', '.join(self.stale_price_tickers)}",
+                          stacklevel=2)
+        return self.stale_price_tickers
     
     def _extract_stock_tickers(self):
         """Извлекает список уникальных тикеров акций (без опционов)"""
-        tickers = []
-        for item in self.portfolio_data:
-            if 'type' not in item or item['type'] == 'stock':
-                tickers.append(item['ticker'])
-        return list(set(tickers))
+        return self.book.stock_tickers()
     
     def _extract_option_data(self):
         """Извлекает данные об опционах в портфеле"""
-        options = []
-        for item in self.portfolio_data:
-            if 'type' in item and item['type'] == 'option':
-                options.append(item)
-        return options
+        return self.book.option_records()
     
     def _calculate_weights(self):
-        """Расчет весов активов в портфеле на основе их позиций и цен"""
-        total_value = 0
-        weights = {}
-        
-        # Сначала рассчитываем общую стоимость портфеля
-        for item in self.portfolio_data:
-            position = item['position']
-            price = item['current_price']
-            value = abs(position) * price  # Берем абсолютное значение позиции
-            total_value += value
-        
-        # Затем вычисляем вес каждого актива
-        for item in self.portfolio_data:
-            ticker = item['ticker']
-            position = item['position']
-            price = item['current_price']
-            value = abs(position) * price
-            
-            if ticker not in weights:
-                weights[ticker] = 0
-            
-            # Для опционов учитываем направление (PUT/CALL)
-            if 'type' in item and item['type'] == 'option':
-                option_type = item.get('option_type', '')
-                # Для PUT опционов с короткой позицией или CALL с длинной - положительная бета
-                # Для PUT опционов с длинной позицией или CALL с короткой - отрицательная бета
-                sign = 1
-                if (option_type == 'PUT' and position > 0) or (option_type == 'CALL' and position < 0):
-                    sign = -1
-                weights[ticker] += sign * (value / total_value)
-            else:
-                # Для акций учитываем знак позиции
-                sign = 1 if position > 0 else -1
-                weights[ticker] += sign * (value / total_value)
-        
-        return weights
+        """
+        Расчет весов активов в портфеле на основе их позиций и цен.
+        
+        Вес - стоимость позиции по модулю в доле от общей стоимости, со знаком направления:
+        для акций - знак позиции, для опционов минус у длинных PUT и коротких CALL.
+        """
+        return self.book.weights()
     
     def load_data(self):
         """Загрузка исторических данных о ценах"""
-        tickers = self.stock_tickers + [self.benchmark_ticker]
+        tickers = list(dict.fromkeys(self.asset_tickers + [self.benchmark_ticker]))
         start_date_str = self.start_date.strftime('%Y-%m-%d')
         end_date_str = self.end_date.strftime('%Y-%m-%d')
         
-        # Загружаем данные и получаем цены закрытия
-        raw_data = yf.download(tickers, start=start_date_str, end=end_date_str)
+        # Загружаем данные (недостающие диапазоны догружаются в кэш) и получаем цены закрытия
+        raw_data = self.price_source.get_history(tickers, start_date_str, end_date_str)
         self.data = raw_data['Close']  # Используем 'Close' вместо 'Adj Close'
         
-        # Расчет дневных доходностей
-        self.returns = self.data[self.stock_tickers].pct_change().dropna()
+        # Расчет дневных доходностей. Тикеры без котировок (сбой загрузки, неизвестный
+        # символ) в доходности не входят: их пустые колонки удалили бы dropna() все строки
+        asset_prices = self.data.reindex(columns=self.asset_tickers)
+        self.returns = asset_prices.loc[:, asset_prices.notna().any()].pct_change().dropna()
         self.benchmark_returns = self.data[self.benchmark_ticker].pct_change().dropna()
+        
+        # Буферы для дозаписи новых дней (append_bar)
+        self._data_store = _GrowableFrame(self.data)
+        self._returns_store = _GrowableFrame(self.returns)
+        self._benchmark_store = _GrowableFrame(self.benchmark_returns)
+        self._invalidate_cache(data_changed=True)
+    
+    @property
+    def portfolio_weights(self):
+        """Веса инструментов в портфеле (тикер -> вес)"""
+        return self._portfolio_weights
+    
+    @portfolio_weights.setter
+    def portfolio_weights(self, weights):
+        self._portfolio_weights = weights
+        self._invalidate_cache()
+    
+    def _invalidate_cache(self, data_changed=False):
+        """
+        Сбрасывает закэшированные величины. Вызывается автоматически при загрузке
+        данных и присваивании весов; при изменении словаря весов на месте нужно вызвать вручную.
+        
+        Args:
+            data_changed (bool): Изменились ли данные (тогда сбрасываются и величины, не зависящие от весов)
+        """
+        self._cache = {}
+        if data_changed:
+            self._data_cache = {}
     
     def _get_ticker_weight(self, ticker):
         """Получает вес указанного тикера в портфеле"""
         return self.portfolio_weights.get(ticker, 0)
     
-    def calculate_portfolio_returns(self):
-        """Расчет доходности портфеля на основе весов"""
-        portfolio_returns = pd.Series(0, index=self.returns.index)
+    def _price_options(self):
+        """
+        Оценивает опционы по модели Блэка-Шоулза на последнюю дату загруженных данных.
+        
+        Подразумеваемая волатильность находится по цене позиции, затем для всех
+        контрактов сразу рассчитываются цена и греки (delta, gamma, vega, theta),
+        а также дневная история дельт по ценам базового актива. Если волатильность
+        найти нельзя (истекший опцион, цена вне границ), берется историческая волатильность
+        базового актива. Для опционов без распознанных параметров дельта в истории постоянна.
+        Опционы, оставшиеся без модельной оценки, перечисляются в предупреждении.
+        """
+        # Опционные ноги, для базового актива которых есть котировки
+        quoted = set(self.data.columns[self.data.notna().any()])
+        self._option_legs = [
+            option for option in self.option_data
+            if option.get('underlying', option['ticker'].split()[0]) in quoted
+        ]
+        if len(self._option_legs) < len(self.option_data):
+            missing = [option['ticker'] for option in self.option_data if option not in self._option_legs]
+            warnings.warn(f"Нет котировок базового актива, опционы не учтены в риске: {', '.join(missing)}",
+                          stacklevel=2)
+        delta_history = np.empty((len(self.data), len(self._option_legs)))
+        self._option_pricing = None
+        
+        pricable = [
+            i for i, option in enumerate(self._option_legs)
+            if {'expiry', 'strike', 'option_type'} <= option.keys()
+        ]
+        if pricable:
+            # Оцениваем только контракты с корректной датой экспирации
+            time_history = year_fraction([self._option_legs[i]['expiry'] for i in pricable], self.data.index)
+            valid = ~np.isnan(time_history[-1]) if len(time_history) else np.zeros(len(pricable), dtype=bool)
+            pricable = [i for i, is_valid in zip(pricable, valid) if is_valid]
+            time_history = time_history[:, valid]
+        
+        if pricable:
+            priced = [self._option_legs[i] for i in pricable]
+            underlyings = [option['underlying'] for option in priced]
+            strikes = np.array([option['strike'] for option in priced], dtype=float)
+            option_types = np.array([option['option_type'] for option in priced])
+            option_prices = np.array([option['current_price'] for option in priced], dtype=float)
+            
+            spot_history = self.data[underlyings].ffill().values
+            
+            implied_vol = implied_volatility(option_prices, spot_history[-1], strikes, time_history[-1],
+                                             self.risk_free_rate, option_types)
+            historical_vol = self.data[underlyings].pct_change().std().values * np.sqrt(252)
+            implied_vol = np.where(np.isnan(implied_vol), historical_vol, implied_vol)
+            
+            greeks = black_scholes(spot_history[-1], strikes, time_history[-1], implied_vol,
+                                   self.risk_free_rate, option_types)
+            for i, option in enumerate(priced):
+                option['implied_vol'] = implied_vol[i]
+                option['model_price'] = greeks['price'][i]
+                for greek in ('delta', 'gamma', 'vega', 'theta'):
+                    option[greek] = greeks[greek][i]
+            
+            # Дельты на каждую дату истории (по цене базового актива и сроку на эту дату)
+            delta_history[:, pricable] = black_scholes(spot_history, strikes, time_history, implied_vol,
+                                                       self.risk_free_rate, option_types)['delta']
+            self._option_pricing = {
+                'legs': np.array(pricable, dtype=int),
+                'underlyings': underlyings,
+                'strikes': strikes,
+                'option_types': option_types,
+                'expiry': [option['expiry'] for option in priced],
+                'implied_vol': implied_vol
+            }
         
-        for ticker in self.stock_tickers:
-            weight = self._get_ticker_weight(ticker)
-            if weight != 0 and ticker in self.returns.columns:
-                portfolio_returns += self.returns[ticker] * weight
+        unpriced = [i for i in range(len(self._option_legs)) if i not in set(pricable)]
+        for i in unpriced:
+            delta_history[:, i] = self._option_delta(self._option_legs[i])
+        if unpriced:
+            warnings.warn("Нет параметров контракта для оценки, используется постоянная дельта: "
+                          f"{', '.join(self._option_legs[i]['ticker'] for i in unpriced)}", stacklevel=2)
         
-        # Учитываем влияние опционов (упрощенно через дельту)
-        for option in self.option_data:
+        self._delta_store = _GrowableFrame(pd.DataFrame(
+            delta_history, index=self.data.index, columns=[option['ticker'] for option in self._option_legs]
+        ))
+        self.option_delta_history = self._delta_store.to_pandas()
+        self._invalidate_cache(data_changed=True)
+    
+    def _option_deltas_on(self, date, spot):
+        """Строка дельт всех опционных ног на дату date при ценах базовых активов spot (Series)"""
+        deltas = np.array([self._option_delta(option) for option in self._option_legs], dtype=float)
+        pricing = self._option_pricing
+        if pricing is not None:
+            time_to_expiry = year_fraction(pricing['expiry'], [date])[0]
+            deltas[pricing['legs']] = black_scholes(
+                spot[pricing['underlyings']].values, pricing['strikes'], time_to_expiry,
+                pricing['implied_vol'], self.risk_free_rate, pricing['option_types']
+            )['delta']
+        return deltas
+    
+    @staticmethod
+    def _option_delta(option):
+        """Дельта опциона; если модельная не рассчитана - примерно ±0.5 в зависимости от типа"""
+        if 'delta' in option:
+            return option['delta']
+        return -0.5 if option.get('option_type') == 'PUT' else 0.5
+    
+    def _option_leg_exposure(self):
+        """
+        Параметры дельта-эквивалентов опционов: экспозиция ноги k в день t равна
+        scale_k * delta_k, где scale = position * S / стоимость портфеля (S - цена на дату оценки).
+        
+        Returns:
+            tuple: (индексы колонок базовых активов в self.returns, масштабы scale)
+        """
+        if 'option_legs' in self._cache:
+            return self._cache['option_legs']
+        
+        total_value = self._total_position_value()
+        columns, scales = [], []
+        for option in self._option_legs:
             underlying = option.get('underlying', option['ticker'].split()[0])
-            delta = option.get('delta', 0.5)  # Если дельта не указана, берем примерно 0.5
-            weight = self._get_ticker_weight(option['ticker'])
+            in_returns = underlying in self.returns.columns and bool(total_value)
+            columns.append(self.returns.columns.get_loc(underlying) if in_returns else -1)
+            scales.append(option['position'] * self.current_prices.get(underlying, np.nan) / total_value
+                          if in_returns else 0.0)
+        
+        self._cache['option_legs'] = (np.array(columns, dtype=int), np.array(scales, dtype=float))
+        return self._cache['option_legs']
+    
+    def _option_returns(self, asset_returns, previous_deltas):
+        """Вклад опционов в доходность портфеля по дельтам на закрытие предыдущего дня"""
+        columns, scales = self._option_leg_exposure()
+        active = columns >= 0
+        if not active.any():
+            return np.zeros(len(asset_returns))
+        contributions = asset_returns[:, columns[active]] * previous_deltas[:, active] * scales[active]
+        return contributions.sum(axis=1)
+    
+    def _compile_exposure_vector(self, include_options=True):
+        """
+        Собирает вектор экспозиций по колонкам self.returns: веса акций плюс
+        текущие дельта-эквиваленты опционов, отнесенные на их базовые активы
+        """
+        key = ('exposure', include_options)
+        if key in self._cache:
+            return self._cache[key]
+        
+        exposure = np.zeros(len(self.returns.columns))
+        for ticker in self.stock_tickers:
+            if ticker in self.returns.columns:
+                exposure[self.returns.columns.get_loc(ticker)] += self._get_ticker_weight(ticker)
+        
+        if include_options and self._option_legs:
+            # Опционы: дельта-эквивалент по дельте на последнюю дату
+            columns, scales = self._option_leg_exposure()
+            active = columns >= 0
+            np.add.at(exposure, columns[active], (scales * self._delta_store.values[-1])[active])
+        
+        self._cache[key] = pd.Series(exposure, index=self.returns.columns)
+        return self._cache[key]
+    
+    def calculate_portfolio_returns(self):
+        """
+        Расчет доходности портфеля на основе весов.
+        
+        Доходность акций считается одним матричным произведением returns @ w, опционов -
+        через дельта-эквиваленты, меняющиеся по дням. Результат кэшируется до изменения
+        данных или весов; возвращаемую серию не следует изменять на месте.
+        """
+        if 'portfolio_returns' not in self._cache:
+            exposure = self._compile_exposure_vector(include_options=False)
+            active = exposure.values != 0
+            portfolio_values = self.returns.values[:, active] @ exposure.values[active]
             
-            if weight != 0 and underlying in self.returns.columns:
-                # Для опционов влияние пропорционально дельте
-                portfolio_returns += self.returns[underlying] * weight * delta
+            # Влияние опционов через дельту на каждую дату (дельта предыдущего дня)
+            if self._option_legs:
+                previous_rows = self.data.index.get_indexer(self.returns.index) - 1
+                portfolio_values = portfolio_values + self._option_returns(
+                    self.returns.values, self._delta_store.values[previous_rows]
+                )
+            
+            self._cache['portfolio_returns'] = _GrowableFrame(pd.Series(portfolio_values, index=self.returns.index))
+        return self._cache['portfolio_returns'].to_pandas()
+    
+    def metrics_context(self):
+        """
+        Общие промежуточные величины для метрик и отчетов (доходности портфеля и бенчмарка,
+        накопленная доходность, просадки, отсортированные доходности). Создается один раз
+        и сбрасывается вместе с кэшем при изменении данных или весов.
+        """
+        if 'metrics_context' not in self._cache:
+            self._cache['metrics_context'] = MetricsContext(self.calculate_portfolio_returns(), self.benchmark_returns)
+        return self._cache['metrics_context']
+    
+    def append_bar(self, date, prices):
+        """
+        Добавляет цены закрытия за новый день без пересчета истории.
         
-        return portfolio_returns
+        Данные, доходности и бенчмарк дописываются в предвыделенные буферы,
+        доходность портфеля и скользящие метрики обновляются за O(N) на день.
+        Полновыборочные величины (регрессии, модели риска) сбрасываются и будут
+        пересчитаны при следующем обращении. Веса и цены на дату оценки не меняются.
+        
+        Args:
+            date: Дата нового дня (позже последней даты в данных)
+            prices (dict | pd.Series): Цены закрытия тикер -> цена. Отсутствующие цены
+                заменяются ценой предыдущего дня.
+        """
+        date = pd.Timestamp(date)
+        if date <= self.data.index[-1]:
+            raise ValueError(f"Дата {date:%Y-%m-%d} не позже последней даты в данных ({self.data.index[-1]:%Y-%m-%d})")
+        
+        previous = self._data_store.values[-1]
+        row = pd.Series(prices, dtype=float).reindex(self.data.columns).values
+        row = np.where(np.isnan(row), previous, row)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            day_returns = row / previous - 1
+        
+        self._data_store.append(date, row)
+        self.data = self._data_store.to_pandas()
+        
+        asset_returns = day_returns[self.data.columns.get_indexer(self.returns.columns)]
+        benchmark_return = day_returns[self.data.columns.get_loc(self.benchmark_ticker)]
+        self._returns_store.append(date, asset_returns)
+        self._benchmark_store.append(date, benchmark_return)
+        self.returns = self._returns_store.to_pandas()
+        self.benchmark_returns = self._benchmark_store.to_pandas()
+        
+        # Дельты опционов: для доходности дня нужна дельта предыдущего дня, затем добавляется новая
+        previous_deltas = self._delta_store.values[-1]
+        if self._option_legs:
+            self._delta_store.append(date, self._option_deltas_on(date, pd.Series(row, index=self.data.columns)))
+            self.option_delta_history = self._delta_store.to_pandas()
+        
+        # Инкрементально обновляем закэшированные величины, остальные сбрасываем
+        kept = {}
+        if 'portfolio_returns' in self._cache:
+            exposure = self._compile_exposure_vector(include_options=False).values
+            portfolio_return = asset_returns @ exposure
+            if self._option_legs:
+                portfolio_return += self._option_returns(asset_returns[None, :], previous_deltas[None, :])[0]
+            self._cache['portfolio_returns'].append(date, portfolio_return)
+            kept['portfolio_returns'] = self._cache['portfolio_returns']
+            
+            for key, cached in self._cache.items():
+                if isinstance(key, tuple) and key[0] == 'rolling':
+                    engine, history = cached
+                    values = np.concatenate([[portfolio_return, benchmark_return], asset_returns])
+                    for metric, metric_values in engine.update(values, benchmark_return).items():
+                        history[metric].append(date, metric_values)
+                    kept[key] = (engine, history)
+        
+        for key in ('option_legs', ('exposure', False)):
+            if key in self._cache:
+                kept[key] = self._cache[key]
+        self._cache = kept
+        self._data_cache = {}
+        self.end_date = date.to_pydatetime()
+    
+    def update(self, end_date=None):
+        """
+        Догружает из источника котировок дни после последней даты в данных
+        и добавляет их через append_bar.
+        
+        Args:
+            end_date (str, optional): Конечная дата 'YYYY-MM-DD' (не включается). По умолчанию - сегодня.
+        
+        Returns:
+            int: Количество добавленных дней
+        """
+        last_date = self.data.index[-1]
+        end = datetime.now() if end_date is None else datetime.strptime(end_date, '%Y-%m-%d')
+        raw_data = self.price_source.get_history(
+            list(self.data.columns), (last_date + timedelta(days=1)).strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+        )
+        new_bars = raw_data['Close']
+        new_bars = new_bars[new_bars.index > last_date]
+        for date, prices in new_bars.iterrows():
+            self.append_bar(date, prices)
+        return len(new_bars)
+    
+    def _asset_regression(self):
+        """
+        Регрессия доходностей всех активов на бенчмарк одним проходом
+        (бета, альфа, корреляция, R², стандартная ошибка). Результат кэшируется.
+        """
+        if 'asset_regression' not in self._data_cache:
+            self._data_cache['asset_regression'] = regress_on_benchmark(self.returns, self.benchmark_returns)
+        return self._data_cache['asset_regression']
+    
+    def _portfolio_regression(self):
+        """Регрессия доходности портфеля на бенчмарк (кэшируется)"""
+        if 'portfolio_regression' not in self._cache:
+            portfolio_returns = self.calculate_portfolio_returns()
+            self._cache['portfolio_regression'] = regress_on_benchmark(portfolio_returns, self.benchmark_returns).iloc[0]
+        return self._cache['portfolio_regression']
     
     def calculate_beta(self):
         """Расчет бета-коэффициента портфеля относительно бенчмарка"""
-        portfolio_returns = self.calculate_portfolio_returns()
-        
-        # Расчет бета для всего портфеля
-        slope, _, _, _, _ = stats.linregress(self.benchmark_returns, portfolio_returns)
+        regression = self._asset_regression()
         
         # Расчет бета для отдельных активов
         asset_betas = {}
         for ticker in self.stock_tickers:
             weight = self._get_ticker_weight(ticker)
-            if abs(weight) > 0 and ticker in self.returns.columns:
-                asset_slope, _, _, _, _ = stats.linregress(self.benchmark_returns, self.returns[ticker])
-                asset_betas[ticker] = asset_slope
+            if abs(weight) > 0 and ticker in regression.index:
+                asset_betas[ticker] = regression.at[ticker, 'beta']
         
-        # Бета для опционов (упрощенно)
+        # Бета для опционов (упрощенно): бета базового актива берется из той же регрессии
         for option in self.option_data:
             ticker = option['ticker']
             underlying = option.get('underlying', ticker.split()[0])
-            delta = option.get('delta', 0.5)
+            delta = self._option_delta(option)
             
-            if underlying in self.returns.columns:
-                underlying_beta, _, _, _, _ = stats.linregress(self.benchmark_returns, self.returns[underlying])
+            if underlying in regression.index:
                 # Бета опциона примерно равна бета базового актива * дельта
-                asset_betas[ticker] = underlying_beta * delta
+                asset_betas[ticker] = regression.at[underlying, 'beta'] * delta
         
         return {
-            'portfolio_beta': slope,
+            'portfolio_beta': self._portfolio_regression()['beta'],
             'asset_betas': asset_betas
         }
     
-    def calculate_volatility(self):
-        """Расчет волатильности (стандартного отклонения) портфеля и бенчмарка"""
-        portfolio_returns = self.calculate_portfolio_returns()
+    def get_risk_model(self, method='sample', decay=0.94):
+        """
+        Возвращает ковариационную модель риска по self.returns (строится один раз на набор данных).
+        
+        Args:
+            method (str, optional): 'sample', 'ledoit_wolf' или 'ewma'
+            decay (float, optional): Коэффициент затухания для 'ewma'
+        """
+        key = ('risk_model', method, decay)
+        if key not in self._data_cache:
+            self._data_cache[key] = RiskModel(self.returns, method=method, decay=decay)
+        return self._data_cache[key]
+    
+    def _option_elasticity(self, option):
+        """
+        Эластичность опциона: дельта * S / V, т.е. во сколько раз процентное
+        изменение цены опциона больше изменения цены базового актива
+        """
+        underlying = option.get('underlying', option['ticker'].split()[0])
+        delta = self._option_delta(option)
+        option_price = option.get('current_price', option['price'])
+        underlying_price = self.current_prices.get(underlying, np.nan)
+        if pd.isna(underlying_price) or not option_price:
+            # Нет цены базового актива - считаем без рычага
+            return delta
+        return delta * underlying_price / option_price
+    
+    def calculate_volatility(self, method='sample'):
+        """
+        Расчет волатильности (стандартного отклонения) портфеля и бенчмарка
+        
+        Args:
+            method (str, optional): Метод оценки ковариации для модели риска ('sample', 'ledoit_wolf', 'ewma')
+        """
+        risk_model = self.get_risk_model(method)
         
         # Волатильность портфеля и бенчмарка (годовая)
-        portfolio_volatility = portfolio_returns.std() * np.sqrt(252)
+        portfolio_volatility = float(risk_model.portfolio_volatility(self._compile_exposure_vector()))
         benchmark_volatility = self.benchmark_returns.std() * np.sqrt(252)
         
-        # Волатильность отдельных активов (годовая)
+        # Волатильность отдельных активов (годовая) - диагональ ковариационной матрицы
+        model_volatility = risk_model.asset_volatility
         asset_volatility = {}
         for ticker in self.stock_tickers:
             weight = self._get_ticker_weight(ticker)
-            if abs(weight) > 0 and ticker in self.returns.columns:
-                asset_volatility[ticker] = self.returns[ticker].std() * np.sqrt(252)
+            if abs(weight) > 0 and ticker in model_volatility.index:
+                asset_volatility[ticker] = model_volatility[ticker]
         
-        # Волатильность опционов (упрощенно)
+        # Волатильность опционов: волатильность базового актива с учетом рычага (эластичности)
         for option in self.option_data:
             ticker = option['ticker']
             underlying = option.get('underlying', ticker.split()[0])
-            delta = option.get('delta', 0.5)
             
-            if underlying in self.returns.columns:
-                # Для опционов волатильность выше из-за левериджа
-                underlying_vol = self.returns[underlying].std() * np.sqrt(252)
-                # Упрощенная формула - для более точного расчета нужно использовать модель ценообразования опционов
-                asset_volatility[ticker] = underlying_vol * abs(delta) * 2
+            if underlying in model_volatility.index:
+                asset_volatility[ticker] = model_volatility[underlying] * abs(self._option_elasticity(option))
         
         return {
             'portfolio_volatility': portfolio_volatility,
@@ -226,58 +597,123 @@ class PortfolioVolatilityAnalyzer:
             'relative_volatility': portfolio_volatility / benchmark_volatility
         }
     
+    def calculate_risk_decomposition(self, method='sample', weights=None):
+        """
+        Разложение годовой волатильности портфеля на предельные и компонентные вклады позиций
+        
+        Args:
+            method (str, optional): Метод оценки ковариации ('sample', 'ledoit_wolf', 'ewma')
+            weights (dict | pd.Series, optional): Альтернативные веса для сценария "что если".
+                По умолчанию - текущий вектор экспозиций портфеля.
+        
+        Returns:
+            pd.DataFrame: 'weight', 'marginal_risk', 'component_risk', 'risk_share' по каждому активу
+        """
+        if weights is None:
+            weights = self._compile_exposure_vector()
+        return self.get_risk_model(method).decompose(weights)
+    
     def calculate_correlation(self):
         """Расчет корреляции между портфелем и бенчмарком"""
-        portfolio_returns = self.calculate_portfolio_returns()
-        corr = np.corrcoef(portfolio_returns, self.benchmark_returns)[0, 1]
+        regression = self._asset_regression()
         
         # Корреляция отдельных активов с бенчмарком
         asset_correlations = {}
         for ticker in self.stock_tickers:
             weight = self._get_ticker_weight(ticker)
-            if abs(weight) > 0 and ticker in self.returns.columns:
-                asset_correlations[ticker] = np.corrcoef(self.returns[ticker], self.benchmark_returns)[0, 1]
+            if abs(weight) > 0 and ticker in regression.index:
+                asset_correlations[ticker] = regression.at[ticker, 'correlation']
         
         # Корреляция опционов с бенчмарком (упрощенно через базовый актив)
         for option in self.option_data:
             ticker = option['ticker']
             underlying = option.get('underlying', ticker.split()[0])
             
-            if underlying in self.returns.columns:
-                asset_correlations[ticker] = np.corrcoef(self.returns[underlying], self.benchmark_returns)[0, 1]
+            if underlying in regression.index:
+                asset_correlations[ticker] = regression.at[underlying, 'correlation']
         
         return {
-            'portfolio_correlation': corr,
+            'portfolio_correlation': self._portfolio_regression()['correlation'],
             'asset_correlations': asset_correlations
         }
     
     def calculate_var(self, confidence_level=0.95):
         """Расчет Value-at-Risk (VaR) портфеля"""
-        portfolio_returns = self.calculate_portfolio_returns()
+        portfolio = self.metrics_context().portfolio
         
         # Исторический VaR
-        hist_var = np.percentile(portfolio_returns, 100 * (1 - confidence_level))
+        hist_var = portfolio.quantile(1 - confidence_level)
         
         # Параметрический VaR (предполагается нормальное распределение)
-        z_score = stats.norm.ppf(1 - confidence_level)
-        param_var = portfolio_returns.mean() + z_score * portfolio_returns.std()
+        z_score = NormalDist().inv_cdf(1 - confidence_level)
+        param_var = portfolio.mean + z_score * portfolio.std
         
         return {
             'historical_var': hist_var,
             'parametric_var': param_var
         }
     
+    def _total_position_value(self):
+        """Суммарная стоимость позиций (по модулю), как в расчете весов"""
+        return self.book.total_value()
+    
+    def calculate_monte_carlo_var(self, confidence_levels=(0.95, 0.99), n_paths=100_000, horizon_days=1,
+                                  seed=None, method='sample', max_chunk_bytes=64 * 1024 ** 2, n_jobs=1):
+        """
+        Монте-Карло VaR/CVaR портфеля: коррелированные доходности активов через
+        разложение Холецкого ковариационной матрицы, опционы переоцениваются по дельте и гамме
+        
+        Args:
+            confidence_levels (tuple, optional): Уровни доверия
+            n_paths (int, optional): Число симуляций
+            horizon_days (int, optional): Горизонт в торговых днях
+            seed (int, optional): Зерно генератора для воспроизводимости
+            method (str, optional): Метод оценки ковариации ('sample', 'ledoit_wolf', 'ewma')
+            max_chunk_bytes (int, optional): Ограничение памяти на один блок симуляции
+            n_jobs (int, optional): Число процессов для расчета блоков
+        
+        Returns:
+            pd.DataFrame: Индекс - уровни доверия, колонки 'var' и 'cvar'
+        """
+        risk_model = self.get_risk_model(method)
+        exposure = self._compile_exposure_vector().reindex(risk_model.tickers, fill_value=0.0)
+        
+        # Гамма-поправка опционов, для которых известна гамма
+        gamma_index, gamma_exposure = [], []
+        total_value = self._total_position_value()
+        for option in self.option_data:
+            underlying = option.get('underlying', option['ticker'].split()[0])
+            gamma = option.get('gamma')
+            if not gamma or underlying not in risk_model.tickers or not total_value:
+                continue
+            underlying_price = self.current_prices[underlying]
+            gamma_index.append(risk_model.tickers.get_loc(underlying))
+            gamma_exposure.append(0.5 * gamma * underlying_price ** 2 * option['position'] / total_value)
+        
+        return monte_carlo_var(
+            risk_model.cov * horizon_days,
+            exposure.values,
+            mean=self.returns.mean().reindex(risk_model.tickers).values * horizon_days,
+            gamma_index=gamma_index,
+            gamma_exposure=gamma_exposure,
+            confidence_levels=confidence_levels,
+            n_paths=n_paths,
+            seed=seed,
+            max_chunk_bytes=max_chunk_bytes,
+            n_jobs=n_jobs
+        )
+    
     def calculate_sharpe_ratio(self):
         """Расчет коэффициента Шарпа для портфеля и бенчмарка"""
-        portfolio_returns = self.calculate_portfolio_returns()
+        context = self.metrics_context()
         
         # Годовая доходность
-        annual_portfolio_return = portfolio_returns.mean() * 252
-        annual_benchmark_return = self.benchmark_returns.mean() * 252
+        annual_portfolio_return = context.portfolio.mean * 252
+        annual_benchmark_return = context.benchmark.mean * 252
         
         # Годовая волатильность
-        annual_portfolio_volatility = portfolio_returns.std() * np.sqrt(252)
-        annual_benchmark_volatility = self.benchmark_returns.std() * np.sqrt(252)
+        annual_portfolio_volatility = context.portfolio.annual_volatility
+        annual_benchmark_volatility = context.benchmark.annual_volatility
         
         # Коэффициент Шарпа
         portfolio_sharpe = (annual_portfolio_return - self.risk_free_rate) / annual_portfolio_volatility
@@ -291,118 +727,122 @@ class PortfolioVolatilityAnalyzer:
     
     def calculate_tracking_error(self):
         """Расчет ошибки слежения (tracking error) портфеля относительно бенчмарка"""
-        portfolio_returns = self.calculate_portfolio_returns()
-        tracking_diff = portfolio_returns - self.benchmark_returns
-        tracking_error = tracking_diff.std() * np.sqrt(252)
-        
-        return tracking_error
+        return self.metrics_context().tracking_error
     
     def calculate_risk_metrics(self, returns_series, name=""):
-        """Расчет расширенных метрик риска"""
-        daily_std = returns_series.std()
-        daily_returns = returns_series
+        """
+        Расчет расширенных метрик риска
+        
+        Args:
+            returns_series (pd.Series | SeriesMetrics): Доходности или их промежуточные величины
+                из metrics_context() - тогда уже посчитанные ряды и квантили не пересчитываются
+            name (str, optional): Префикс названий метрик
+        """
+        series = returns_series if isinstance(returns_series, SeriesMetrics) else SeriesMetrics(returns_series)
+        # Квантили, хвосты и подвыборки убыточных/прибыльных дней - за одну сортировку
+        tail = series.tail
+        daily_std = tail['std']
         
         # Базовые метрики
         metrics = {
             f'{name} Daily Std Dev': daily_std,
-            f'{name} Annual Std Dev': daily_std * np.sqrt(252),
-            f'{name} Average Daily Return': daily_returns[daily_returns > 0].mean(),
-            f'{name} Average Daily Loss': daily_returns[daily_returns < 0].mean(),
+            f'{name} Annual Std Dev': series.annual_volatility,
+            f'{name} Average Daily Return': tail['average_gain'],
+            f'{name} Average Daily Loss': tail['average_loss'],
         }
         
         # Расчет просадки
-        cumulative_returns = (1 + daily_returns).cumprod()
-        rolling_max = cumulative_returns.cummax()
-        drawdowns = cumulative_returns / rolling_max - 1
-        metrics[f'{name} Max Drawdown'] = drawdowns.min()
+        metrics[f'{name} Max Drawdown'] = series.max_drawdown
         
         # Расчет VaR и CVaR
-        confidence_level = 0.01  # 1%
-        var_1 = np.percentile(daily_returns, confidence_level * 100)
-        cvar_1 = daily_returns[daily_returns <= var_1].mean()
-        metrics[f'{name} VaR (1%)'] = var_1
-        metrics[f'{name} CVaR (1%)'] = cvar_1
+        metrics[f'{name} VaR (1%)'] = tail['var_0.01']
+        metrics[f'{name} CVaR (1%)'] = tail['cvar_0.01']
         
         # Коэффициенты
-        excess_returns = daily_returns - self.risk_free_rate / 252
-        downside_returns = daily_returns[daily_returns < 0]
+        excess_mean = series.mean - self.risk_free_rate / 252
         
         # Sharpe Ratio
-        metrics[f'{name} Sharpe Ratio'] = excess_returns.mean() / daily_returns.std() * np.sqrt(252)
+        metrics[f'{name} Sharpe Ratio'] = excess_mean / daily_std * np.sqrt(252)
         
         # Sortino Ratio
-        metrics[f'{name} Sortino Ratio'] = excess_returns.mean() / downside_returns.std() * np.sqrt(252)
+        metrics[f'{name} Sortino Ratio'] = excess_mean / tail['downside_std'] * np.sqrt(252)
         
         # Calmar Ratio
-        annual_return = (1 + daily_returns).prod() ** (252/len(daily_returns)) - 1
-        metrics[f'{name} Calmar Ratio'] = annual_return / abs(metrics[f'{name} Max Drawdown'])
+        metrics[f'{name} Calmar Ratio'] = series.annual_return / abs(series.max_drawdown)
         
-        # Omega Ratio
-        threshold_return = 0
-        gain_returns = daily_returns[daily_returns > threshold_return] - threshold_return
-        loss_returns = threshold_return - daily_returns[daily_returns < threshold_return]
-        metrics[f'{name} Omega Ratio'] = gain_returns.sum() / loss_returns.sum() if loss_returns.sum() != 0 else np.inf
+        # Omega Ratio (порог 0)
+        metrics[f'{name} Omega Ratio'] = tail['omega']
         
         # Kaplan Ratio
-        metrics[f'{name} Kaplan Ratio'] = daily_returns.mean() / downside_returns.std() * np.sqrt(252)
+        metrics[f'{name} Kaplan Ratio'] = series.mean / tail['downside_std'] * np.sqrt(252)
         
-        # Rainy Day Ratio
-        extreme_movements = daily_returns[(daily_returns < daily_returns.quantile(0.01)) |
-                                       (daily_returns > daily_returns.quantile(0.99))]
-        metrics[f'{name} Rainy Ratio'] = extreme_movements.std() / daily_returns.std()
+        # Rainy Day Ratio (экстремальные дни за 1%-м и 99%-м квантилями)
+        metrics[f'{name} Rainy Ratio'] = tail['rainy_ratio']
         
         return metrics
 
+    def calculate_tail_metrics(self, levels=(0.01, 0.05)):
+        """
+        Хвостовые метрики (VaR/CVaR по уровням, Омега, нижнее отклонение, асимметрия,
+        эксцесс и т.д.) для портфеля, бенчмарка и каждого актива одним вызовом
+        матричного ядра tail_statistics. Кэшируется до изменения данных или весов.
+        
+        Returns:
+            pd.DataFrame: Строки - 'portfolio', 'benchmark' и тикеры, колонки - метрики
+        """
+        key = ('tail', tuple(levels))
+        if key not in self._cache:
+            returns = pd.concat([
+                self.calculate_portfolio_returns().rename('portfolio'),
+                self.benchmark_returns.rename('benchmark'),
+                self.returns
+            ], axis=1, join='inner')
+            self._cache[key] = tail_statistics(returns, levels=levels)
+        return self._cache[key]
+
     def _calculate_portfolio_statistics(self):
         """Рассчитывает статистику по портфелю и бенчмарку"""
-        portfolio_returns = self.calculate_portfolio_returns()
-        
-        stats = {
-            'Портфель': {
-                'Средняя дневная доходность': portfolio_returns.mean() * 100,
-                'Медианная дневная доходность': portfolio_returns.median() * 100,
-                'Максимальная дневная доходность': portfolio_returns.max() * 100,
-                'Минимальная дневная доходность': portfolio_returns.min() * 100,
-                'Стандартное отклонение (дневное)': portfolio_returns.std() * 100,
-                'Годовая волатильность': portfolio_returns.std() * np.sqrt(252) * 100,
-                'Годовая доходность': ((1 + portfolio_returns).prod() ** (252/len(portfolio_returns)) - 1) * 100,
-                'Количество положительных дней': len(portfolio_returns[portfolio_returns > 0]),
-                'Количество отрицательных дней': len(portfolio_returns[portfolio_returns < 0]),
-                'Коэффициент асимметрии': stats.skew(portfolio_returns),
-                'Коэффициент эксцесса': stats.kurtosis(portfolio_returns)
-            },
-            'Бенчмарк': {
-                'Средняя дневная доходность': self.benchmark_returns.mean() * 100,
-                'Медианная дневная доходность': self.benchmark_returns.median() * 100,
-                'Максимальная дневная доходность': self.benchmark_returns.max() * 100,
-                'Минимальная дневная доходность': self.benchmark_returns.min() * 100,
-                'Стандартное отклонение (дневное)': self.benchmark_returns.std() * 100,
-                'Годовая волатильность': self.benchmark_returns.std() * np.sqrt(252) * 100,
-                'Годовая доходность': ((1 + self.benchmark_returns).prod() ** (252/len(self.benchmark_returns)) - 1) * 100,
-                'Количество положительных дней': len(self.benchmark_returns[self.benchmark_returns > 0]),
-                'Количество отрицательных дней': len(self.benchmark_returns[self.benchmark_returns < 0]),
-                'Коэффициент асимметрии': stats.skew(self.benchmark_returns),
-                'Коэффициент эксцесса': stats.kurtosis(self.benchmark_returns)
+        def series_statistics(series):
+            tail = series.tail
+            return {
+                'Средняя дневная доходность': series.mean * 100,
+                'Медианная дневная доходность': tail['median'] * 100,
+                'Максимальная дневная доходность': tail['max'] * 100,
+                'Минимальная дневная доходность': tail['min'] * 100,
+                'Стандартное отклонение (дневное)': series.std * 100,
+                'Годовая волатильность': series.annual_volatility * 100,
+                'Годовая доходность': series.annual_return * 100,
+                'Количество положительных дней': int(tail['positive_days']),
+                'Количество отрицательных дней': int(tail['negative_days']),
+                'Коэффициент асимметрии': tail['skew'],
+                'Коэффициент эксцесса': tail['kurtosis']
             }
+
+        context = self.metrics_context()
+        stats = {
+            'Портфель': series_statistics(context.portfolio),
+            'Бенчмарк': series_statistics(context.benchmark)
         }
         
         # Создаем DataFrame
         stats_df = pd.DataFrame(stats)
         
-        # Форматируем числовые значения
+        # Форматируем числовые значения: формат выбирается для группы строк, а не для каждой ячейки
+        percent_rows = stats_df.index.str.contains('доходность|волатильность', case=False)
+        count_rows = stats_df.index.str.startswith('Количество')
+        row_formats = [(percent_rows, '{:,.2f}%'), (count_rows, '{:,.0f}'), (~percent_rows & ~count_rows, '{:,.2f}')]
+        formatted = pd.DataFrame(index=stats_df.index, columns=stats_df.columns, dtype=object)
         for col in stats_df.columns:
-            stats_df[col] = stats_df[col].apply(lambda x: f"{x:,.2f}%" if "доходность" in x.lower() or "волатильность" in x.lower()
-                                               else f"{x:,.2f}" if isinstance(x, (float, np.float64))
-                                               else x)
+            for rows, spec in row_formats:
+                formatted.loc[rows, col] = list(map(spec.format, stats_df.loc[rows, col].tolist()))
         
-        return stats_df
+        return formatted
 
-    def generate_portfolio_html_report(self):
-        """Генерирует HTML отчет с интерактивными графиками Plotly"""
+    def _write_portfolio_sections(self, report):
+        """Записывает в отчет структуру портфеля и статистику портфеля и бенчмарка"""
         position_df = self._calculate_position_values()
-        stats_df = self._calculate_portfolio_statistics()
         
-        # Переименовываем столбцы на русский язык
+        # Переименовываем столбцы и значения на русский язык
         position_df = position_df.rename(columns={
             'ticker': 'Тикер',
             'type': 'Тип',
@@ -412,101 +852,38 @@ class PortfolioVolatilityAnalyzer:
             'direction': 'Направление',
             'percentage': 'Доля (%)'
         })
-        
-        # Заменяем английские значения на русские
-        position_df['Тип'] = position_df['Тип'].replace({
-            'stock': 'акция',
-            'option': 'опцион'
-        })
-        position_df['Направление'] = position_df['Направление'].replace({
-            'Long': 'Длинная',
-            'Short': 'Короткая'
+        position_df['Тип'] = position_df['Тип'].map({'stock': 'акция', 'option': 'опцион'}).fillna(position_df['Тип'])
+        position_df['Направление'] = position_df['Направление'].map({'Long': 'Длинная', 'Short': 'Короткая'})
+        
+        report.section('Структура портфеля', level=1)
+        report.table(position_df, index=False, formats={
+            'Цена': '${:,.2f}',
+            'Стоимость': '${:,.2f}',
+            'Доля (%)': '{:.2f}%'
         })
         
-        # Форматируем числовые столбцы
-        position_df['Цена'] = position_df['Цена'].apply(lambda x: f"${x:,.2f}")
-        position_df['Стоимость'] = position_df['Стоимость'].apply(lambda x: f"${x:,.2f}")
-        position_df['Доля (%)'] = position_df['Доля (%)'].apply(lambda x: f"{x:.2f}%")
-        
-        # Создаем HTML с улучшенным форматированием
-        html_template = f"""
-        <html>
-        <head>
-            <title>Анализ портфеля</title>
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
-            <style>
-                body {{ 
-                    padding: 20px; 
-                    font-family: Arial, sans-serif;
-                }}
-                .table {{ 
-                    margin-top: 20px;
-                    width: 100%;
-                    border-collapse: collapse;
-                }}
-                .table th {{
-                    background-color: #f8f9fa;
-                    text-align: center;
-                    vertical-align: middle;
-                    font-weight: bold;
-                    padding: 12px;
-                }}
-                .table td {{
-                    text-align: center;
-                    vertical-align: middle;
-                    padding: 10px;
-                }}
-                .table-hover tbody tr:hover {{
-                    background-color: #f5f5f5;
-                }}
-                .container {{
-                    max-width: 1400px;
-                    margin: 0 auto;
-                }}
-                h1, h2 {{
-                    text-align: center;
-                    margin: 30px 0;
-                    color: #333;
-                }}
-                .stats-table {{
-                    margin-top: 40px;
-                }}
-                .section {{
-                    margin-bottom: 50px;
-                    background-color: white;
-                    padding: 20px;
-                    border-radius: 8px;
-                    box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="section">
-                    <h1>Структура портфеля</h1>
-                    {position_df.to_html(classes='table table-striped table-hover', index=False, escape=False)}
-                </div>
-                
-                <div class="section">
-                    <h2>Статистика портфеля и бенчмарка</h2>
-                    {stats_df.to_html(classes='table table-striped table-hover stats-table', escape=False)}
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        # Сохраняем HTML
-        with open(os.path.join(self.output_dir, 'portfolio_positions.html'), 'w', encoding='utf-8') as f:
-            f.write(html_template)
+        report.section('Статистика портфеля и бенчмарка')
+        report.table(self._calculate_portfolio_statistics())
+
+    def generate_portfolio_html_report(self):
+        """Генерирует HTML отчет со структурой портфеля и статистикой (portfolio_positions.html)"""
+        with self.output.open('portfolio_positions.html') as stream, HtmlReport(stream, 'Анализ портфеля') as report:
+            self._write_portfolio_sections(report)
 
     def generate_extended_report(self):
-        """Генерация расширенного отчета с дополнительными метриками риска"""
-        portfolio_returns = self.calculate_portfolio_returns()
+        """
+        Генерация расширенного отчета с дополнительными метриками риска.
+        
+        Все части отчета (метрики, статистика, графики) берут ряды и их производные
+        из общего metrics_context(), поэтому они считаются один раз на отчет.
+        """
+        from excel_export import DECIMAL_FORMAT, MONEY_FORMAT, ExcelExporter
+
+        context = self.metrics_context()
         
         # Рассчитываем метрики для портфеля и бенчмарка
-        portfolio_metrics = self.calculate_risk_metrics(portfolio_returns, "Portfolio")
-        benchmark_metrics = self.calculate_risk_metrics(self.benchmark_returns, "Benchmark")
+        portfolio_metrics = self.calculate_risk_metrics(context.portfolio, "Portfolio")
+        benchmark_metrics = self.calculate_risk_metrics(context.benchmark, "Benchmark")
         
         # Создаем DataFrame с разделением на столбцы A/B для портфеля и C/D для бенчмарка
         portfolio_df = pd.DataFrame.from_dict(portfolio_metrics, orient='index')
@@ -521,54 +898,35 @@ class PortfolioVolatilityAnalyzer:
         metrics_df = pd.concat([portfolio_df, benchmark_df], axis=1)
         metrics_df = metrics_df.round(4)
         
-        # Сохраняем в HTML и Excel
-        html_path = os.path.join(self.output_dir, 'risk_metrics_report.html')
-        excel_path = os.path.join(self.output_dir, 'risk_metrics_report.xlsx')
-        
-        # Создаем HTML с улучшенным форматированием
-        html_template = f"""
-        <html>
-        <head>
-            <title>Метрики риска</title>
-            <link href="https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist/css/bootstrap.min.css" rel="stylesheet">
-            <style>
-                body {{ padding: 20px; }}
-                .table {{ margin-top: 20px; }}
-                .positive {{ color: green; }}
-                .negative {{ color: red; }}
-            </style>
-        </head>
-        <body>
-            <h1>Метрики риска портфеля и бенчмарка</h1>
-            <div class="row">
-                <div class="col-12">
-                    {metrics_df.to_html(classes='table table-striped')}
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        
-        with open(html_path, 'w', encoding='utf-8') as f:
-            f.write(html_template)
-        
-        metrics_df.to_excel(excel_path)
-        
-        # Генерируем отчет по структуре портфеля
-        self.generate_portfolio_html_report()
-        
-        # Генерируем графики
-        self._generate_plotly_charts()
+        # Один самодостаточный документ: метрики, структура портфеля, статистика и графики.
+        # Отчеты пишутся сразу в хранилище артефактов (self.output)
+        with self.output.open('portfolio_report.html') as stream, HtmlReport(stream, 'Анализ портфеля') as report:
+            report.section('Метрики риска портфеля и бенчмарка', level=1)
+            report.table(metrics_df, formats={column: '{:,.4f}' for column in metrics_df.columns})
+            self._write_portfolio_sections(report)
+            report.section('Графики')
+            for fig in self._build_plotly_charts():
+                report.figure(fig)
+        
+        # Excel: метрики и позиции на отдельных листах, запись потоком
+        with self.output.open('risk_metrics_report.xlsx', 'wb') as stream, ExcelExporter(stream) as exporter:
+            exporter.add_frame('Метрики риска', metrics_df, column_widths={'': 36},
+                               number_formats={column: DECIMAL_FORMAT for column in metrics_df.columns})
+            exporter.add_frame('Позиции', self._calculate_position_values(), index=False, number_formats={
+                'price': MONEY_FORMAT, 'value': MONEY_FORMAT, 'percentage': '0.00'
+            })
         
         return metrics_df
 
-    def _generate_plotly_charts(self):
-        """Генерирует интерактивные графики с помощью Plotly"""
-        portfolio_returns = self.calculate_portfolio_returns()
+    def _build_plotly_charts(self):
+        """Строит интерактивные графики Plotly (кумулятивная доходность и скользящая волатильность)"""
+        import plotly.graph_objects as go
+
+        context = self.metrics_context()
         
         # Кумулятивная доходность
-        cumulative_portfolio = (1 + portfolio_returns).cumprod()
-        cumulative_benchmark = (1 + self.benchmark_returns).cumprod()
+        cumulative_portfolio = context.portfolio.cumulative
+        cumulative_benchmark = context.benchmark.cumulative
         
         # График кумулятивной доходности
         fig_returns = go.Figure()
@@ -592,8 +950,6 @@ class PortfolioVolatilityAnalyzer:
             template='plotly_white'
         )
         
-        fig_returns.write_html(os.path.join(self.output_dir, 'cumulative_returns.html'))
-        
         # График волатильности
         rolling_vol = self._calculate_rolling_volatility()
         fig_vol = go.Figure()
@@ -618,98 +974,59 @@ class PortfolioVolatilityAnalyzer:
             template='plotly_white'
         )
         
-        fig_vol.write_html(os.path.join(self.output_dir, 'volatility_comparison.html'))
+        return [fig_returns, fig_vol]
 
-    def _calculate_rolling_volatility(self, window=30):
-        """Рассчитывает скользящую волатильность"""
-        portfolio_returns = self.calculate_portfolio_returns()
+    def _rolling_engine(self, window=30, confidence_level=0.95):
+        """
+        Накопители скользящих метрик для портфеля, бенчмарка и всех активов
+        вместе с историей метрик (кэшируются до изменения данных или весов)
+        """
+        key = ('rolling', window, confidence_level)
+        if key not in self._cache:
+            series = pd.concat([
+                self.calculate_portfolio_returns().rename('portfolio'),
+                self.benchmark_returns.rename('benchmark'),
+                self.returns
+            ], axis=1, join='inner')
+            engine, history = RollingAnalytics.from_history(
+                series, self.benchmark_returns, window=window,
+                risk_free_rate=self.risk_free_rate, confidence_level=confidence_level
+            )
+            # История хранится в буферах, чтобы append_bar дописывал новые дни
+            self._cache[key] = (engine, {metric: _GrowableFrame(frame) for metric, frame in history.items()})
+        return self._cache[key]
+    
+    def calculate_rolling_metrics(self, window=30, confidence_level=0.95):
+        """
+        Скользящие метрики портфеля, бенчмарка и каждого актива: волатильность, бета,
+        корреляция, коэффициент Шарпа, просадка и параметрический VaR
         
-        rolling_portfolio_vol = portfolio_returns.rolling(window=window).std() * np.sqrt(252)
-        rolling_benchmark_vol = self.benchmark_returns.rolling(window=window).std() * np.sqrt(252)
+        Args:
+            window (int, optional): Размер окна в торговых днях
+            confidence_level (float, optional): Уровень доверия для VaR
         
-        return pd.DataFrame({
-            'portfolio': rolling_portfolio_vol,
-            'benchmark': rolling_benchmark_vol
-        })
+        Returns:
+            dict: Метрика -> pd.DataFrame (даты x ['portfolio', 'benchmark', тикеры...])
+        """
+        history = self._rolling_engine(window, confidence_level)[1]
+        return {metric: frame.to_pandas() for metric, frame in history.items()}
+    
+    def _calculate_rolling_volatility(self, window=30):
+        """Рассчитывает скользящую волатильность"""
+        return self.calculate_rolling_metrics(window)['volatility'][['portfolio', 'benchmark']]
 
     def _calculate_position_values(self):
         """Рассчитывает стоимость и процентное распределение позиций"""
-        position_values = []
-        total_value = 0
-        
-        # Сначала рассчитываем общую стоимость портфеля
-        for item in self.portfolio_data:
-            position = item['position']
-            price = item['current_price']
-            value = abs(position * price)  # Используем абсолютное значение
-            total_value += value
-        
-        # Затем рассчитываем значения для каждой позиции
-        for item in self.portfolio_data:
-            position = item['position']
-            price = item['current_price']
-            value = abs(position * price)
-            percentage = (value / total_value) * 100 if total_value > 0 else 0
-            
-            position_values.append({
-                'ticker': item['ticker'],
-                'type': item.get('type', 'stock'),
-                'position': position,
-                'price': price,
-                'value': value,
-                'direction': 'Long' if position > 0 else 'Short',
-                'percentage': percentage
-            })
-        
-        return pd.DataFrame(position_values)
+        return self.book.position_values()
 
     def _calculate_instrument_type_distribution(self):
         """Рассчитывает распределение по типам инструментов"""
-        position_df = self._calculate_position_values()
-        return position_df.groupby('type')['value'].sum()
+        return self.book.value_by_type()
 
     def _calculate_long_short_distribution(self):
         """Рассчитывает распределение по Long/Short"""
-        position_df = self._calculate_position_values()
-        return position_df.groupby('direction')['value'].sum()
+        return self.book.value_by_direction()
 
-def parse_option_ticker(ticker):
-    """
-    Парсит строку с тикером опциона, извлекая базовый актив, дату истечения и страйк
-    Пример: 'AMZN Jun20'25 180 PUT' -> {'underlying': 'AMZN', 'expiry': '2025-06-20', 'strike': 180, 'option_type': 'PUT'}
-    """
-    try:
-        # Используем регулярные выражения для извлечения информации
-        pattern = r'(\w+)\s+(\w+)(\d+)\'(\d+)\s+(\d+(?:\.\d+)?)\s+(PUT|CALL)'
-        match = re.match(pattern, ticker)
-        
-        if match:
-            underlying, month, day, year, strike, option_type = match.groups()
-            
-            # Преобразуем месяц в числовой формат
-            month_map = {
-                'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04', 'May': '05', 'Jun': '06',
-                'Jul': '07', 'Aug': '08', 'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12'
-            }
-            month_num = month_map.get(month, '01')
-            
-            # Форматируем дату истечения
-            year = '20' + year  # Предполагаем, что год в формате '25' -> '2025'
-            expiry_date = f"{year}-{month_num}-{day.zfill(2)}"
-            
-            return {
-                'underlying': underlying,
-                'expiry': expiry_date,
-                'strike': float(strike),
-                'option_type': option_type
-            }
-        
-    except Exception as e:
-        print(f"Error parsing option ticker '{ticker}': {e}")
-    
-    # Если не удалось распарсить, возвращаем базовый актив как первое слово
-    underlying = ticker.split()[0]
-    return {'underlying': underlying}
 
 def extract_portfolio_from_screenshots(screenshots_data):
     """
@@ -781,12 +1098,7 @@ def extract_portfolio_from_screenshots(screenshots_data):
         for key, value in option_info.items():
             option[key] = value
         
-        # Добавляем примерную дельту для опционов
-        # В реальном сценарии нужно было бы получить эти данные из рыночных данных
-        if option['option_type'] == 'PUT':
-            option['delta'] = -0.5 if option['position'] > 0 else 0.5
-        else:  # CALL
-            option['delta'] = 0.5 if option['position'] > 0 else -0.5
+        # Дельта и остальные греки рассчитываются анализатором по модели Блэка-Шоулза
         
         portfolio.append(option)
     
@@ -807,4 +1119,4 @@ if __name__ == "__main__":
     
     # Генерируем расширенный отчет с метриками риска
     metrics_df = analyzer.generate_extended_report()
-    print("Анализ портфеля завершен. Отчеты и графики сохранены в директории:", analyzer.output_dir)
+    print("Анализ портфеля завершен. Отчеты сохранены:", analyzer.output.flush())
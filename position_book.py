@@ -0,0 +1,191 @@
+import numpy as np
+import pandas as pd
+
+from option_symbols import parse_option_tickers
+
+
+class PositionBook:
+    """
+    Колоночная книга позиций: тикеры, типы, количества, цены и параметры опционов
+    хранятся в типизированных массивах NumPy, а веса, стоимости и группировки
+    считаются векторными операциями без обхода списка словарей.
+
+    Args:
+        ticker (array-like): Тикеры инструментов
+        position (array-like): Количество (отрицательное - короткая позиция)
+        price (array-like): Цена из исходных данных
+        instrument_type (array-like, optional): 'stock' или 'option'. По умолчанию - все 'stock'.
+        underlying, expiry, strike, option_type, delta (array-like, optional): Параметры опционов
+    """
+
+    def __init__(self, ticker, position, price, instrument_type=None, underlying=None, expiry=None,
+                 strike=None, option_type=None, delta=None):
+        n = len(ticker)
+        self.ticker = np.asarray(ticker, dtype=object)
+        self.position = np.asarray(position)
+        if self.position.dtype.kind not in 'iuf':
+            self.position = self.position.astype(float)
+        self.price = np.asarray(price, dtype=float)
+        self.current_price = self.price.copy()
+        self.type = np.asarray(['stock'] * n if instrument_type is None else instrument_type, dtype=object)
+        self.is_option = self.type == 'option'
+
+        # Для акций базовый актив - сам тикер, для опционов без указания - первое слово тикера
+        if underlying is None:
+            underlying = [t.split()[0] if is_option else t for t, is_option in zip(self.ticker, self.is_option)]
+        self.underlying = np.asarray(underlying, dtype=object)
+        self.expiry = pd.to_datetime(pd.Series(expiry if expiry is not None else [None] * n),
+                                     errors='coerce').values.astype('datetime64[D]')
+        self.strike = np.asarray(strike if strike is not None else np.full(n, np.nan), dtype=float)
+        self.option_type = np.asarray(option_type if option_type is not None else [None] * n, dtype=object)
+        self.delta = np.asarray(delta if delta is not None else np.full(n, np.nan), dtype=float)
+
+        # Индекс тикеров: код строки -> позиция в ticker_index
+        self.ticker_codes, self.ticker_index = pd.factorize(self.ticker)
+
+    @classmethod
+    def from_frame(cls, frame, parse_options=True):
+        """
+        Создает книгу из DataFrame (например, выгрузки брокера).
+
+        Обязательные колонки - 'ticker', 'position', 'price'; необязательные - 'type'
+        и поля опционов. Недостающие поля опционов разбираются из тикера пакетным парсером.
+        """
+        frame = frame.reset_index(drop=True)
+        is_option = (frame['type'] == 'option').values if 'type' in frame.columns else np.zeros(len(frame), dtype=bool)
+
+        if parse_options and is_option.any():
+            needs_parse = is_option & (frame['expiry'].isna().values if 'expiry' in frame.columns else True)
+            if needs_parse.any():
+                parsed = parse_option_tickers(frame['ticker'][needs_parse])
+                parsed = parsed[parsed['valid']]
+                frame = frame.copy()
+                for name in ('underlying', 'expiry', 'strike', 'option_type'):
+                    frame[name] = parsed[name].combine_first(frame[name]) if name in frame.columns else parsed[name]
+
+        def column(name):
+            return frame[name].values if name in frame.columns else None
+
+        instrument_type = column('type')
+        if instrument_type is not None:
+            instrument_type = np.where(pd.isna(instrument_type), 'stock', instrument_type)
+
+        underlying = column('underlying')
+        if underlying is not None:
+            # Нераспознанные опционы: базовый актив - первое слово тикера
+            fallback = [t.split()[0] if option else t for t, option in zip(frame['ticker'].values, is_option)]
+            underlying = np.where(pd.isna(underlying), fallback, underlying)
+
+        return cls(
+            frame['ticker'].values, frame['position'].values, frame['price'].values,
+            instrument_type=instrument_type, underlying=underlying, expiry=column('expiry'),
+            strike=column('strike'), option_type=column('option_type'), delta=column('delta')
+        )
+
+    @classmethod
+    def from_records(cls, records, parse_options=True):
+        """Создает книгу из списка словарей (формат portfolio_data анализатора)"""
+        return cls.from_frame(pd.DataFrame.from_records(list(records)), parse_options=parse_options)
+
+    def __len__(self):
+        return len(self.ticker)
+
+    @property
+    def stock_mask(self):
+        return ~self.is_option
+
+    def stock_tickers(self):
+        """Уникальные тикеры акций"""
+        return list(pd.unique(self.ticker[self.stock_mask]))
+
+    def underlying_tickers(self):
+        """Уникальные тикеры акций и базовых активов опционов - все ряды цен, нужные для оценки"""
+        return list(pd.unique(self.underlying))
+
+    def set_current_prices(self, last_close):
+        """
+        Проставляет текущие цены акций из серии тикер -> цена одной операцией.
+        Для опционов и тикеров без котировок остается исходная цена.
+
+        Returns:
+            list: Тикеры акций, для которых котировка не найдена
+        """
+        mapped = pd.Series(last_close, dtype=float).reindex(self.ticker).values
+        stale = self.stock_mask & np.isnan(mapped)
+        self.current_price = np.where(self.stock_mask & ~stale, mapped, self.price)
+        return sorted(set(self.ticker[stale]))
+
+    def values(self):
+        """Стоимость позиций по модулю"""
+        return np.abs(self.position) * self.current_price
+
+    def total_value(self):
+        return self.values().sum()
+
+    def direction_sign(self):
+        """
+        Знак экспозиции: для акций - знак позиции, для опционов -1 у длинных PUT
+        и коротких CALL, иначе +1
+        """
+        stock_sign = np.where(self.position > 0, 1.0, -1.0)
+        negative_option = ((self.option_type == 'PUT') & (self.position > 0)) | \
+                          ((self.option_type == 'CALL') & (self.position < 0))
+        option_sign = np.where(negative_option, -1.0, 1.0)
+        return np.where(self.is_option, option_sign, stock_sign)
+
+    def weights(self):
+        """Веса инструментов (со знаком направления), сгруппированные по тикеру"""
+        total_value = self.total_value()
+        signed = self.direction_sign() * self.values() / total_value if total_value else np.zeros(len(self))
+        sums = np.bincount(self.ticker_codes, weights=signed, minlength=len(self.ticker_index))
+        return dict(zip(self.ticker_index, sums))
+
+    def position_values(self):
+        """Стоимость и процентное распределение позиций"""
+        values = self.values()
+        total_value = values.sum()
+        percentage = values / total_value * 100 if total_value > 0 else np.zeros(len(self))
+        return pd.DataFrame({
+            'ticker': self.ticker,
+            'type': self.type,
+            'position': self.position,
+            'price': self.current_price,
+            'value': values,
+            'direction': np.where(self.position > 0, 'Long', 'Short'),
+            'percentage': percentage
+        })
+
+    def _sum_by(self, labels):
+        codes, uniques = pd.factorize(labels, sort=True)
+        return pd.Series(np.bincount(codes, weights=self.values(), minlength=len(uniques)), index=uniques)
+
+    def value_by_type(self):
+        """Стоимость по типам инструментов"""
+        return self._sum_by(self.type)
+
+    def value_by_direction(self):
+        """Стоимость длинных и коротких позиций"""
+        return self._sum_by(np.where(self.position > 0, 'Long', 'Short'))
+
+    def option_records(self):
+        """Опционные позиции в виде словарей (для оценки опционов); пустые поля не включаются"""
+        records = []
+        for i in np.flatnonzero(self.is_option):
+            record = {
+                'ticker': self.ticker[i],
+                'type': 'option',
+                'position': self.position[i].item(),
+                'price': self.price[i].item(),
+                'current_price': self.current_price[i].item(),
+                'underlying': self.underlying[i],
+            }
+            if not np.isnat(self.expiry[i]):
+                record['expiry'] = str(self.expiry[i])
+            if not np.isnan(self.strike[i]):
+                record['strike'] = self.strike[i].item()
+            if self.option_type[i] is not None and not pd.isna(self.option_type[i]):
+                record['option_type'] = self.option_type[i]
+            if not np.isnan(self.delta[i]):
+                record['delta'] = self.delta[i].item()
+            records.append(record)
+        return records
@@ -0,0 +1,292 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+# Поля дневного бара в том же порядке, что и в yf.download
+OHLCV_FIELDS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Путь к локальному кэшу котировок по умолчанию
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'markets', 'prices.sqlite')
+
+# Ограничение на количество параметров в одном SQL-запросе
+_SQL_CHUNK = 500
+
+
+def _to_timestamp(value):
+    """Приводит дату (str / datetime / Timestamp) к Timestamp без времени"""
+    return pd.Timestamp(value).normalize()
+
+
+def _empty_history(tickers):
+    """Пустой фрейм истории с колонками (поле, тикер)"""
+    columns = pd.MultiIndex.from_product([OHLCV_FIELDS, list(tickers)])
+    return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='Date'), dtype=float)
+
+
+def _split_history(frame, tickers):
+    """
+    Разбивает фрейм в формате yf.download (колонки поле x тикер) на словарь
+    тикер -> DataFrame с колонками OHLCV
+    """
+    result = {}
+    if frame is None or frame.empty:
+        return result
+
+    if not isinstance(frame.columns, pd.MultiIndex):
+        # Один тикер без второго уровня колонок
+        frame = pd.concat({tickers[0]: frame}, axis=1).swaplevel(axis=1)
+
+    available = set(frame.columns.get_level_values(1))
+    for ticker in tickers:
+        if ticker not in available:
+            continue
+        bars = frame.xs(ticker, axis=1, level=1).reindex(columns=OHLCV_FIELDS)
+        bars = bars.dropna(how='all')
+        if not bars.empty:
+            result[ticker] = bars
+    return result
+
+
+class PriceSource:
+    """
+    Интерфейс источника дневных котировок.
+
+    Метод get_history возвращает DataFrame в формате yf.download:
+    индекс - даты, колонки - MultiIndex (поле, тикер), поля - OHLCV_FIELDS.
+    Дата end не включается.
+    """
+
+    def get_history(self, tickers, start, end):
+        raise NotImplementedError
+
+
+class YFinanceSource(PriceSource):
+    """Источник котировок Yahoo Finance (сетевой)"""
+
+    def get_history(self, tickers, start, end):
+        import yfinance as yf
+
+        tickers = list(tickers)
+        raw_data = yf.download(
+            tickers,
+            start=_to_timestamp(start).strftime('%Y-%m-%d'),
+            end=_to_timestamp(end).strftime('%Y-%m-%d'),
+            progress=False
+        )
+        bars = _split_history(raw_data, tickers)
+        if not bars:
+            return _empty_history(tickers)
+        return pd.concat(bars, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+
+class FramePriceSource(PriceSource):
+    """
+    Офлайн-источник котировок из готовых данных (фикстуры для тестов, выгрузки).
+
+    Args:
+        frames (dict): Словарь тикер -> DataFrame с колонками OHLCV (или хотя бы 'Close')
+            и индексом из дат
+    """
+
+    def __init__(self, frames):
+        self.frames = {}
+        for ticker, frame in frames.items():
+            frame = frame.copy()
+            frame.index = pd.DatetimeIndex(frame.index).normalize()
+            self.frames[ticker] = frame.reindex(columns=OHLCV_FIELDS)
+
+    @classmethod
+    def from_close(cls, close_df):
+        """Создает источник из широкой таблицы цен закрытия (даты x тикеры)"""
+        return cls({ticker: close_df[[ticker]].rename(columns={ticker: 'Close'})
+                    for ticker in close_df.columns})
+
+    def get_history(self, tickers, start, end):
+        tickers = list(tickers)
+        start, end = _to_timestamp(start), _to_timestamp(end)
+        bars = {}
+        for ticker in tickers:
+            frame = self.frames.get(ticker)
+            if frame is None:
+                continue
+            frame = frame[(frame.index >= start) & (frame.index < end)]
+            if not frame.empty:
+                bars[ticker] = frame
+        if not bars:
+            return _empty_history(tickers)
+        return pd.concat(bars, axis=1).swaplevel(axis=1).sort_index(axis=1)
+
+
+class ClosePanelSource(PriceSource):
+    """
+    Офлайн-источник из уже загруженной широкой таблицы цен закрытия (даты x тикеры).
+    Возвращает срезы без копирования по тикерам, только поле 'Close'.
+
+    Args:
+        close_df (pd.DataFrame): Цены закрытия
+    """
+
+    def __init__(self, close_df):
+        self.close_df = close_df
+
+    def get_history(self, tickers, start, end):
+        tickers = list(tickers)
+        start, end = _to_timestamp(start), _to_timestamp(end)
+        index = self.close_df.index
+        rows = slice(index.searchsorted(start), index.searchsorted(end))
+        close = self.close_df.iloc[rows].reindex(columns=tickers)
+        return pd.concat({'Close': close}, axis=1)
+
+
+class PriceStore(PriceSource):
+    """
+    Постоянный локальный кэш дневных котировок OHLCV в SQLite.
+
+    Хранит бары по ключу (тикер, дата) и диапазон дат, уже запрошенный
+    для каждого тикера. При запросе догружает из source только недостающие
+    диапазоны, поэтому повторные запуски не обращаются к сети.
+
+    Args:
+        path (str, optional): Путь к файлу базы. ':memory:' - кэш в памяти.
+        source (PriceSource, optional): Источник для догрузки недостающих данных.
+            Если None - кэш работает полностью офлайн.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, source=None):
+        self.path = path
+        self.source = source
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS prices (
+                ticker TEXT NOT NULL,
+                date TEXT NOT NULL,
+                open REAL, high REAL, low REAL, close REAL, volume REAL,
+                PRIMARY KEY (ticker, date)
+            );
+            CREATE TABLE IF NOT EXISTS coverage (
+                ticker TEXT PRIMARY KEY,
+                start TEXT NOT NULL,
+                end TEXT NOT NULL
+            );
+        """)
+
+    def close(self):
+        self.conn.close()
+
+    def _coverage(self, tickers):
+        """Возвращает уже загруженные диапазоны дат: тикер -> (start, end)"""
+        coverage = {}
+        for i in range(0, len(tickers), _SQL_CHUNK):
+            chunk = tickers[i:i + _SQL_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT ticker, start, end FROM coverage WHERE ticker IN ({placeholders})", chunk
+            ).fetchall()
+            for ticker, start, end in rows:
+                coverage[ticker] = (pd.Timestamp(start), pd.Timestamp(end))
+        return coverage
+
+    def missing_ranges(self, tickers, start, end):
+        """
+        Рассчитывает недостающие диапазоны дат.
+
+        Returns:
+            dict: (start, end) -> список тикеров, которым нужен этот диапазон
+        """
+        tickers = list(tickers)
+        start, end = _to_timestamp(start), _to_timestamp(end)
+        # Бар за сегодняшний день может быть неполным - не считаем его загруженным
+        end = min(end, _to_timestamp(datetime.now()) + pd.Timedelta(days=1))
+        coverage = self._coverage(tickers)
+
+        ranges = {}
+        for ticker in tickers:
+            if ticker not in coverage:
+                gaps = [(start, end)]
+            else:
+                covered_start, covered_end = coverage[ticker]
+                gaps = []
+                if start < covered_start:
+                    gaps.append((start, covered_start))
+                if end > covered_end:
+                    gaps.append((covered_end, end))
+            for gap in gaps:
+                if gap[0] < gap[1]:
+                    ranges.setdefault(gap, []).append(ticker)
+        return ranges
+
+    def _store(self, bars, gap):
+        """
+        Сохраняет бары и расширяет покрытие на диапазон gap только для тикеров,
+        по которым источник вернул данные. Пустой ответ (ошибка сети, лимит запросов,
+        неизвестный тикер) покрытие не меняет, и диапазон будет запрошен повторно.
+        """
+        gap_start, gap_end = gap
+        today = _to_timestamp(datetime.now())
+        rows = []
+        for ticker, frame in bars.items():
+            values = frame.reindex(columns=OHLCV_FIELDS).astype(float)
+            values = values.where(values.notna(), None)
+            dates = frame.index.strftime('%Y-%m-%d')
+            rows.extend((ticker, date, *row) for date, row in zip(dates, values.itertuples(index=False)))
+
+        received = list(bars)
+        coverage = self._coverage(received)
+        # Сегодняшний бар будет перезапрошен при следующем запуске
+        gap_end = min(gap_end, today)
+        cov_rows = []
+        for ticker in received:
+            new_start, new_end = gap_start, gap_end
+            if ticker in coverage:
+                new_start = min(new_start, coverage[ticker][0])
+                new_end = max(new_end, coverage[ticker][1])
+            if new_start < new_end:
+                cov_rows.append((ticker, new_start.strftime('%Y-%m-%d'), new_end.strftime('%Y-%m-%d')))
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO prices VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?)", cov_rows
+            )
+
+    def refresh(self, tickers, start, end):
+        """Догружает из источника только отсутствующие в кэше диапазоны"""
+        if self.source is None:
+            return
+        # Тикеры с одинаковым недостающим диапазоном загружаются одним запросом
+        for gap, gap_tickers in self.missing_ranges(tickers, start, end).items():
+            frame = self.source.get_history(gap_tickers, gap[0], gap[1])
+            self._store(_split_history(frame, gap_tickers), gap)
+
+    def get_history(self, tickers, start, end):
+        tickers = list(tickers)
+        start, end = _to_timestamp(start), _to_timestamp(end)
+        self.refresh(tickers, start, end)
+
+        frames = []
+        for i in range(0, len(tickers), _SQL_CHUNK):
+            chunk = tickers[i:i + _SQL_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            frames.append(pd.read_sql_query(
+                f"SELECT * FROM prices WHERE ticker IN ({placeholders}) AND date >= ? AND date < ?",
+                self.conn,
+                params=[*chunk, start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')]
+            ))
+        long_df = pd.concat(frames, ignore_index=True)
+        if long_df.empty:
+            return _empty_history(tickers)
+
+        long_df['date'] = pd.to_datetime(long_df['date'])
+        long_df = long_df.rename(columns={
+            'date': 'Date', 'open': 'Open', 'high': 'High', 'low': 'Low',
+            'close': 'Close', 'volume': 'Volume'
+        })
+        wide = long_df.pivot(index='Date', columns='ticker', values=OHLCV_FIELDS)
+        wide.columns.names = [None, None]
+        return wide.reindex(columns=pd.MultiIndex.from_product([OHLCV_FIELDS, tickers])).sort_index()
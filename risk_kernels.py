@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+
+
+def regress_on_benchmark(returns, benchmark):
+    """
+    Однопроходная МНК-регрессия всех колонок доходностей на доходность бенчмарка.
+
+    Среднее и дисперсия бенчмарка считаются один раз, ковариации всех колонок -
+    одним матричным произведением, поэтому сложность O(N*T) вместо N вызовов linregress.
+    Результаты совпадают с scipy.stats.linregress(benchmark, column).
+
+    Args:
+        returns (pd.DataFrame | pd.Series | np.ndarray): Доходности активов (T x N), без пропусков
+        benchmark (pd.Series | np.ndarray): Доходность бенчмарка (T)
+
+    Returns:
+        pd.DataFrame: По строке на колонку: 'beta', 'alpha', 'correlation', 'r_squared', 'stderr'
+            (стандартная ошибка беты)
+    """
+    if isinstance(returns, pd.Series):
+        returns = returns.to_frame()
+    if isinstance(returns, pd.DataFrame) and isinstance(benchmark, pd.Series):
+        # Выравниваем по общим датам
+        returns, benchmark = returns.align(benchmark, join='inner', axis=0)
+
+    labels = returns.columns if isinstance(returns, pd.DataFrame) else pd.RangeIndex(np.shape(returns)[1])
+    y = np.asarray(returns, dtype=float)
+    x = np.asarray(benchmark, dtype=float)
+    n = x.shape[0]
+
+    x_mean = x.mean()
+    x_dev = x - x_mean
+    ssxm = x_dev @ x_dev / n
+
+    y_mean = y.mean(axis=0)
+    y_dev = y - y_mean
+    ssym = np.einsum('ij,ij->j', y_dev, y_dev) / n
+    ssxym = x_dev @ y_dev / n
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = ssxym / ssxm
+        alpha = y_mean - beta * x_mean
+        correlation = np.clip(ssxym / np.sqrt(ssxm * ssym), -1.0, 1.0)
+        r_squared = correlation ** 2
+        stderr = np.sqrt((1 - r_squared) * ssym / ssxm / (n - 2)) if n > 2 else np.full_like(beta, np.nan)
+
+    return pd.DataFrame({
+        'beta': beta,
+        'alpha': alpha,
+        'correlation': correlation,
+        'r_squared': r_squared,
+        'stderr': stderr
+    }, index=labels)
+
+
+def sorted_quantile(sorted_values, q):
+    """
+    Квантиль с линейной интерполяцией (как np.percentile) по уже отсортированным значениям:
+    для вектора - число, для матрицы - квантили колонок
+    """
+    position = q * (sorted_values.shape[0] - 1)
+    lower = int(np.floor(position))
+    upper = min(lower + 1, sorted_values.shape[0] - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def tail_statistics(returns, levels=(0.01, 0.05), threshold=0.0, extreme_level=0.01, sorted_values=None):
+    """
+    Квантильные и хвостовые статистики для матрицы рядов доходности за одну сортировку.
+
+    Каждая колонка сортируется один раз, после чего квантили берутся по индексу,
+    а суммы и суммы квадратов любых хвостов (ниже VaR, ниже/выше порога, экстремальные
+    дни) - разностью накопленных сумм по отсортированным значениям. Центральные моменты
+    для асимметрии и эксцесса считаются одним проходом по центрированной матрице.
+
+    Args:
+        returns (pd.DataFrame | pd.Series | np.ndarray): Доходности (T x N), без пропусков
+        levels (tuple, optional): Уровни хвоста для VaR/CVaR (0.01 - 1%-й квантиль)
+        threshold (float, optional): Порог для коэффициента Омега
+        extreme_level (float, optional): Доля экстремальных дней с каждой стороны для Rainy Ratio
+        sorted_values (np.ndarray, optional): Уже отсортированные по колонкам доходности, если есть
+
+    Returns:
+        pd.DataFrame: По строке на колонку: 'mean', 'std', 'median', 'min', 'max',
+            'var_<level>', 'cvar_<level>', 'positive_days', 'negative_days', 'average_gain',
+            'average_loss', 'downside_std', 'omega', 'rainy_ratio', 'skew' и 'kurtosis'
+            (смещенные, как scipy.stats.skew и kurtosis)
+    """
+    if isinstance(returns, pd.Series):
+        returns = returns.to_frame()
+    labels = returns.columns if isinstance(returns, pd.DataFrame) else pd.RangeIndex(np.shape(returns)[1])
+    values = np.asarray(returns, dtype=float)
+    n_obs, n_series = values.shape
+    columns = np.arange(n_series)
+
+    if sorted_values is None:
+        sorted_values = np.sort(values, axis=0)
+    sorted_values = np.asarray(sorted_values, dtype=float).reshape(n_obs, n_series)
+    # Накопленные суммы с нулевой первой строкой: сумма k наименьших значений - cum[k]
+    zeros = np.zeros((1, n_series))
+    cum = np.vstack([zeros, np.cumsum(sorted_values, axis=0)])
+    cum_sq = np.vstack([zeros, np.cumsum(sorted_values ** 2, axis=0)])
+
+    def count_below(bound, inclusive=False):
+        return (sorted_values <= bound).sum(axis=0) if inclusive else (sorted_values < bound).sum(axis=0)
+
+    def tail_sums(start, stop):
+        """Сумма и сумма квадратов отсортированных значений в строках [start, stop) каждой колонки"""
+        return cum[stop, columns] - cum[start, columns], cum_sq[stop, columns] - cum_sq[start, columns]
+
+    def sample_std(count, total, total_sq):
+        return np.sqrt(np.maximum(total_sq - total ** 2 / count, 0) / (count - 1))
+
+    mean = cum[-1] / n_obs
+    centered = values - mean
+    squared = centered ** 2
+    m2 = squared.mean(axis=0)
+    m3 = (squared * centered).mean(axis=0)
+    m4 = (squared ** 2).mean(axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = {
+            'mean': mean,
+            'std': np.sqrt(m2 * n_obs / (n_obs - 1)),
+            'median': sorted_quantile(sorted_values, 0.5),
+            'min': sorted_values[0],
+            'max': sorted_values[-1],
+        }
+
+        for level in levels:
+            var = sorted_quantile(sorted_values, level)
+            tail_count = count_below(var, inclusive=True)
+            result[f'var_{level:g}'] = var
+            result[f'cvar_{level:g}'] = tail_sums(0, tail_count)[0] / tail_count
+
+        negative = count_below(0.0)
+        non_positive = count_below(0.0, inclusive=True)
+        loss_sum, loss_sq = tail_sums(0, negative)
+        gain_sum = tail_sums(non_positive, n_obs)[0]
+        result.update({
+            'positive_days': n_obs - non_positive,
+            'negative_days': negative,
+            'average_gain': gain_sum / (n_obs - non_positive),
+            'average_loss': loss_sum / negative,
+            'downside_std': sample_std(negative, loss_sum, loss_sq),
+        })
+
+        # Омега: сумма превышений порога к сумме недоборов до порога
+        below = count_below(threshold)
+        above = count_below(threshold, inclusive=True)
+        losses = threshold * below - tail_sums(0, below)[0]
+        gains = tail_sums(above, n_obs)[0] - threshold * (n_obs - above)
+        result['omega'] = np.where(losses != 0, gains / losses, np.inf)
+
+        # Rainy Ratio: разброс экстремальных дней (строго за квантилями) к общему
+        lower = count_below(sorted_quantile(sorted_values, extreme_level))
+        upper = count_below(sorted_quantile(sorted_values, 1 - extreme_level), inclusive=True)
+        low_sum, low_sq = tail_sums(0, lower)
+        high_sum, high_sq = tail_sums(upper, n_obs)
+        extreme_count = lower + n_obs - upper
+        result['rainy_ratio'] = sample_std(extreme_count, low_sum + high_sum, low_sq + high_sq) / result['std']
+
+        result['skew'] = m3 / m2 ** 1.5
+        result['kurtosis'] = m4 / m2 ** 2 - 3
+
+    return pd.DataFrame(result, index=labels)
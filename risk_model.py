@@ -0,0 +1,253 @@
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+
+def sample_covariance(values):
+    """Выборочная ковариационная матрица (ddof=1), как у DataFrame.cov"""
+    centered = values - values.mean(axis=0)
+    return centered.T @ centered / (values.shape[0] - 1)
+
+
+def ledoit_wolf_covariance(values):
+    """
+    Ковариационная матрица со сжатием Ледуа-Вольфа к масштабированной единичной матрице.
+
+    Returns:
+        tuple: (ковариационная матрица, коэффициент сжатия от 0 до 1)
+    """
+    n_obs, n_assets = values.shape
+    centered = values - values.mean(axis=0)
+    emp_cov = centered.T @ centered / n_obs
+
+    mu = np.trace(emp_cov) / n_assets
+    emp_cov_sq = np.sum(emp_cov ** 2)
+    # Расстояние от выборочной матрицы до цели сжатия
+    delta = (emp_cov_sq - 2 * mu * np.trace(emp_cov) + n_assets * mu ** 2) / n_assets
+    # Оценка дисперсии выборочной матрицы: sum_t ||x_t||^4 / T - ||S||^2
+    row_norms_sq = np.einsum('ij,ij->i', centered, centered)
+    beta = (row_norms_sq @ row_norms_sq / n_obs - emp_cov_sq) / (n_assets * n_obs)
+    beta = min(beta, delta)
+    shrinkage = beta / delta if delta > 0 else 0.0
+
+    shrunk = (1 - shrinkage) * emp_cov
+    shrunk[np.diag_indices(n_assets)] += shrinkage * mu
+    return shrunk, shrinkage
+
+
+def ewma_covariance(values, decay=0.94):
+    """Экспоненциально взвешенная ковариационная матрица (RiskMetrics), decay - коэффициент затухания"""
+    n_obs = values.shape[0]
+    weights = decay ** np.arange(n_obs - 1, -1, -1, dtype=float)
+    weights /= weights.sum()
+    centered = values - weights @ values
+    return (centered * weights[:, None]).T @ centered
+
+
+class RiskModel:
+    """
+    Ковариационная модель риска, строится один раз по матрице доходностей.
+
+    Все расчеты риска для весов (дисперсия, предельный и компонентный вклад)
+    выполняются матричными операциями над готовой ковариацией, без пересчета
+    рядов доходности, поэтому сценарии "что если" для весов считаются за микросекунды.
+
+    Args:
+        returns (pd.DataFrame): Дневные доходности активов (даты x тикеры), без пропусков
+        method (str, optional): 'sample', 'ledoit_wolf' или 'ewma'. По умолчанию - 'sample'.
+        decay (float, optional): Коэффициент затухания для 'ewma'. По умолчанию - 0.94.
+        periods_per_year (int, optional): Число периодов в году для годовых величин.
+    """
+
+    METHODS = ('sample', 'ledoit_wolf', 'ewma')
+
+    def __init__(self, returns, method='sample', decay=0.94, periods_per_year=TRADING_DAYS):
+        if method not in self.METHODS:
+            raise ValueError(f"Неизвестный метод оценки ковариации: {method}. Доступны: {', '.join(self.METHODS)}")
+
+        self.tickers = pd.Index(returns.columns)
+        self.method = method
+        self.periods_per_year = periods_per_year
+        self.shrinkage = 0.0
+
+        values = np.asarray(returns, dtype=float)
+        if method == 'sample':
+            self.cov = sample_covariance(values)
+        elif method == 'ledoit_wolf':
+            self.cov, self.shrinkage = ledoit_wolf_covariance(values)
+        else:
+            self.cov = ewma_covariance(values, decay)
+
+    @property
+    def covariance(self):
+        """Дневная ковариационная матрица в виде DataFrame"""
+        return pd.DataFrame(self.cov, index=self.tickers, columns=self.tickers)
+
+    @property
+    def asset_volatility(self):
+        """Годовая волатильность каждого актива"""
+        return pd.Series(np.sqrt(np.diag(self.cov) * self.periods_per_year), index=self.tickers)
+
+    def weight_vector(self, weights):
+        """
+        Приводит веса к массиву в порядке self.tickers.
+
+        Args:
+            weights: dict / pd.Series (тикер -> вес, отсутствующие считаются нулем)
+                или np.ndarray формы (N,) либо (K, N) для K наборов весов сразу
+        """
+        if isinstance(weights, dict):
+            weights = pd.Series(weights, dtype=float)
+        if isinstance(weights, pd.Series):
+            return weights.reindex(self.tickers, fill_value=0.0).to_numpy(dtype=float)
+        return np.asarray(weights, dtype=float)
+
+    def portfolio_variance(self, weights):
+        """Дневная дисперсия портфеля w' * Cov * w (для матрицы весов - по строке на набор)"""
+        w = self.weight_vector(weights)
+        return np.einsum('...i,...i->...', w @ self.cov, w)
+
+    def portfolio_volatility(self, weights, annualize=True):
+        """Волатильность портфеля, по умолчанию годовая"""
+        variance = self.portfolio_variance(weights)
+        if annualize:
+            variance = variance * self.periods_per_year
+        return np.sqrt(variance)
+
+    def marginal_contribution(self, weights, annualize=True):
+        """Предельный вклад в риск: d(sigma)/d(w) = Cov * w / sigma"""
+        w = self.weight_vector(weights)
+        cov_w = w @ self.cov
+        sigma = np.sqrt(np.einsum('...i,...i->...', cov_w, w))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            marginal = cov_w / np.expand_dims(sigma, -1)
+        if annualize:
+            marginal = marginal * np.sqrt(self.periods_per_year)
+        return marginal
+
+    def component_risk(self, weights, annualize=True):
+        """Компонентный вклад в риск w_i * MCR_i; сумма по активам равна волатильности портфеля"""
+        w = self.weight_vector(weights)
+        return w * self.marginal_contribution(w, annualize)
+
+    def decompose(self, weights, annualize=True):
+        """
+        Разложение риска портфеля по активам.
+
+        Returns:
+            pd.DataFrame: 'weight', 'marginal_risk', 'component_risk', 'risk_share' по каждому тикеру
+        """
+        w = self.weight_vector(weights)
+        marginal = self.marginal_contribution(w, annualize)
+        component = w * marginal
+        total = component.sum()
+        return pd.DataFrame({
+            'weight': w,
+            'marginal_risk': marginal,
+            'component_risk': component,
+            'risk_share': component / total if total != 0 else np.nan
+        }, index=self.tickers)
+
+
+def covariance_factor(cov):
+    """
+    Матрица A такая, что A * A' = cov. Используется разложение Холецкого,
+    для вырожденных матриц - спектральное разложение с обнулением отрицательных собственных значений.
+    """
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        eigenvalues, eigenvectors = np.linalg.eigh(cov)
+        return eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+
+
+# Параметры симуляции в процессе-воркере (передаются один раз через initializer);
+# в текущем процессе состояние передается в _simulate_chunk явно
+_MC_STATE = {}
+
+
+def _init_mc_worker(state):
+    _MC_STATE.clear()
+    _MC_STATE.update(state)
+
+
+def _simulate_chunk(state, task):
+    """Симулирует один блок путей и возвращает доходность портфеля по каждому пути"""
+    seed, n_paths = task
+    rng = np.random.default_rng(seed)
+    shocks = rng.standard_normal((n_paths, state['factor'].shape[0]))
+    asset_returns = shocks @ state['factor'].T
+    asset_returns += state['mean']
+    portfolio = asset_returns @ state['weights']
+    if len(state['gamma_index']):
+        # Дельта-гамма переоценка опционов: 0.5 * Gamma * S^2 * r^2 в долях стоимости портфеля
+        portfolio += (asset_returns[:, state['gamma_index']] ** 2) @ state['gamma_exposure']
+    return portfolio
+
+
+def _simulate_worker_chunk(task):
+    """Блок путей в процессе-воркере по состоянию из _init_mc_worker"""
+    return _simulate_chunk(_MC_STATE, task)
+
+
+def monte_carlo_var(cov, weights, mean=None, gamma_index=None, gamma_exposure=None,
+                    confidence_levels=(0.95, 0.99), n_paths=100_000, seed=None,
+                    max_chunk_bytes=64 * 1024 ** 2, n_jobs=1):
+    """
+    Монте-Карло VaR/CVaR портфеля с коррелированными доходностями активов.
+
+    Доходности моделируются как mean + A * z, где A * A' = cov. Пути считаются
+    блоками, размер которых ограничен max_chunk_bytes, поэтому память на матрицы
+    шоков не зависит от n_paths. Каждый блок получает свой генератор из SeedSequence(seed),
+    так что результат воспроизводим и не зависит от n_jobs.
+
+    Args:
+        cov (np.ndarray): Ковариационная матрица доходностей за горизонт (N x N)
+        weights (np.ndarray): Линейные (дельта) экспозиции по активам (N)
+        mean (np.ndarray, optional): Средние доходности за горизонт. По умолчанию - нули.
+        gamma_index (np.ndarray, optional): Индексы базовых активов опционных ног
+        gamma_exposure (np.ndarray, optional): 0.5 * Gamma * S^2 * количество / стоимость портфеля
+            для каждой ноги
+        confidence_levels (tuple, optional): Уровни доверия
+        n_paths (int, optional): Число симуляций
+        seed (int, optional): Зерно генератора
+        max_chunk_bytes (int, optional): Ограничение памяти на блок путей
+        n_jobs (int, optional): Число процессов; 1 - расчет в текущем процессе
+
+    Returns:
+        pd.DataFrame: Индекс - уровни доверия, колонки 'var' и 'cvar' (доходности, отрицательные - убыток)
+    """
+    cov = np.asarray(cov, dtype=float)
+    n_assets = cov.shape[0]
+    state = {
+        'factor': covariance_factor(cov),
+        'weights': np.asarray(weights, dtype=float),
+        'mean': np.zeros(n_assets) if mean is None else np.asarray(mean, dtype=float),
+        'gamma_index': np.asarray([] if gamma_index is None else gamma_index, dtype=int),
+        'gamma_exposure': np.asarray([] if gamma_exposure is None else gamma_exposure, dtype=float),
+    }
+
+    # Шоки и доходности активов занимают по 8 байт на ячейку
+    chunk_paths = max(1, int(max_chunk_bytes // (2 * 8 * max(n_assets, 1))))
+    sizes = [min(chunk_paths, n_paths - start) for start in range(0, n_paths, chunk_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = list(zip(seeds, sizes))
+
+    if n_jobs == 1 or len(tasks) == 1:
+        chunks = [_simulate_chunk(state, task) for task in tasks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_mc_worker, initargs=(state,)) as pool:
+            chunks = list(pool.map(_simulate_worker_chunk, tasks))
+
+    simulated = np.concatenate(chunks)
+    simulated.sort()
+
+    result = {}
+    for level in confidence_levels:
+        # Число путей в хвосте (как минимум один)
+        tail_size = max(1, int(np.floor((1 - level) * n_paths)))
+        var = np.quantile(simulated, 1 - level)
+        result[level] = {'var': var, 'cvar': simulated[:tail_size].mean()}
+    return pd.DataFrame.from_dict(result, orient='index')
@@ -0,0 +1,151 @@
+from collections import deque
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+TRADING_DAYS = 252
+
+ROLLING_METRICS = ('volatility', 'beta', 'correlation', 'sharpe', 'drawdown', 'var')
+
+
+class RollingAnalytics:
+    """
+    Скользящие метрики для набора рядов доходности относительно бенчмарка
+    с обновлением за O(1) на каждый новый день.
+
+    Для окна хранятся только последние window наблюдений и скользящие моменты
+    (средние, суммы квадратов отклонений и ко-моменты с бенчмарком), которые
+    обновляются по Уэлфорду: добавление нового дня и удаление выпавшего из окна.
+    Просадка считается от исторического максимума накопленной доходности,
+    VaR - параметрический по скользящим среднему и волатильности.
+
+    Args:
+        columns (list): Названия рядов (тикеры, 'portfolio' и т.п.)
+        window (int, optional): Размер окна в днях. По умолчанию - 30.
+        risk_free_rate (float, optional): Годовая безрисковая ставка для коэффициента Шарпа
+        confidence_level (float, optional): Уровень доверия для VaR
+        periods_per_year (int, optional): Число периодов в году
+    """
+
+    def __init__(self, columns, window=30, risk_free_rate=0.04, confidence_level=0.95,
+                 periods_per_year=TRADING_DAYS):
+        self.columns = pd.Index(columns)
+        self.window = window
+        self.risk_free_rate = risk_free_rate
+        self.confidence_level = confidence_level
+        self.periods_per_year = periods_per_year
+        self._z_score = NormalDist().inv_cdf(1 - confidence_level)
+
+        n_columns = len(self.columns)
+        self._buffer = deque()
+        self._count = 0
+        self._mean = np.zeros(n_columns)
+        self._m2 = np.zeros(n_columns)
+        self._co_moment = np.zeros(n_columns)
+        self._bench_mean = 0.0
+        self._bench_m2 = 0.0
+        self._wealth = np.ones(n_columns)
+        # Максимум считается с первого дня, как cummax по накопленной доходности
+        self._peak = np.zeros(n_columns)
+
+    def _add(self, values, bench):
+        self._count += 1
+        delta = values - self._mean
+        self._mean += delta / self._count
+        bench_delta = bench - self._bench_mean
+        self._bench_mean += bench_delta / self._count
+        self._m2 += delta * (values - self._mean)
+        self._bench_m2 += bench_delta * (bench - self._bench_mean)
+        self._co_moment += delta * (bench - self._bench_mean)
+
+    def _remove(self, values, bench):
+        self._count -= 1
+        if self._count == 0:
+            self._mean[:] = 0.0
+            self._m2[:] = 0.0
+            self._co_moment[:] = 0.0
+            self._bench_mean = self._bench_m2 = 0.0
+            return
+        delta = values - self._mean
+        self._mean -= delta / self._count
+        bench_delta = bench - self._bench_mean
+        self._bench_mean -= bench_delta / self._count
+        self._m2 -= delta * (values - self._mean)
+        self._bench_m2 -= bench_delta * (bench - self._bench_mean)
+        self._co_moment -= delta * (bench - self._bench_mean)
+
+    def update(self, values, benchmark_return):
+        """
+        Добавляет доходности за новый день и возвращает текущие метрики.
+
+        Args:
+            values (array-like): Доходности всех рядов в порядке self.columns
+            benchmark_return (float): Доходность бенчмарка за этот день
+
+        Returns:
+            dict: Метрика -> np.ndarray по рядам (NaN, пока окно не заполнено, кроме просадки)
+        """
+        values = np.asarray(values, dtype=float)
+        benchmark_return = float(benchmark_return)
+
+        if len(self._buffer) == self.window:
+            self._remove(*self._buffer.popleft())
+        self._buffer.append((values, benchmark_return))
+        self._add(values, benchmark_return)
+
+        self._wealth *= 1 + values
+        np.maximum(self._peak, self._wealth, out=self._peak)
+        return self.current()
+
+    def current(self):
+        """Текущие значения метрик по последнему окну"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            drawdown = np.where(self._peak > 0, self._wealth / self._peak - 1, 0.0)
+        if self._count < self.window or self.window < 2:
+            nan = np.full(len(self.columns), np.nan)
+            return {'volatility': nan, 'beta': nan, 'correlation': nan, 'sharpe': nan,
+                    'drawdown': drawdown, 'var': nan}
+
+        daily_std = np.sqrt(np.maximum(self._m2, 0) / (self._count - 1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            beta = self._co_moment / self._bench_m2
+            correlation = self._co_moment / np.sqrt(self._m2 * self._bench_m2)
+            sharpe = (self._mean - self.risk_free_rate / self.periods_per_year) / daily_std * np.sqrt(self.periods_per_year)
+        return {
+            'volatility': daily_std * np.sqrt(self.periods_per_year),
+            'beta': beta,
+            'correlation': correlation,
+            'sharpe': sharpe,
+            'drawdown': drawdown,
+            'var': self._mean + self._z_score * daily_std
+        }
+
+    def snapshot(self):
+        """Текущие метрики в виде DataFrame (ряды x метрики)"""
+        return pd.DataFrame(self.current(), index=self.columns)
+
+    @classmethod
+    def from_history(cls, returns, benchmark_returns, window=30, **kwargs):
+        """
+        Прогоняет накопители по всей истории и возвращает их вместе с рядами метрик.
+
+        Args:
+            returns (pd.DataFrame): Доходности рядов (даты x ряды)
+            benchmark_returns (pd.Series): Доходность бенчмарка
+            window (int, optional): Размер окна
+
+        Returns:
+            tuple: (RollingAnalytics, dict метрика -> pd.DataFrame даты x ряды)
+        """
+        returns, benchmark_returns = returns.align(benchmark_returns, join='inner', axis=0)
+        engine = cls(returns.columns, window=window, **kwargs)
+
+        history = {metric: np.empty(returns.shape) for metric in ROLLING_METRICS}
+        for i, (values, bench) in enumerate(zip(returns.values, benchmark_returns.values)):
+            for metric, value in engine.update(values, bench).items():
+                history[metric][i] = value
+
+        frames = {metric: pd.DataFrame(values, index=returns.index, columns=returns.columns)
+                  for metric, values in history.items()}
+        return engine, frames
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Бюджет времени импорта (секунды, медиана по запускам в чистом процессе)
+IMPORT_BUDGETS = {
+    'portfolio_volatile': 1.0,
+    'risk_model': 0.6,
+    'position_book': 0.6,
+}
+
+# Тяжелые зависимости, которые не должны загружаться при импорте расчетного ядра
+LAZY_MODULES = ('matplotlib', 'plotly', 'yfinance', 'scipy.stats', 'openpyxl', 'boto3')
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{'elapsed': elapsed, 'loaded': [m for m in {lazy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module, repeat=5):
+    """
+    Время импорта модуля в отдельных процессах Python (без прогретого кэша sys.modules).
+
+    Returns:
+        dict: 'median' и 'best' время в секундах, 'loaded' - загруженные тяжелые зависимости
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    timings, loaded = [], set()
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', _PROBE.format(module=module, lazy=LAZY_MODULES)],
+            cwd=root, capture_output=True, text=True, check=True
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result['elapsed'])
+        loaded.update(result['loaded'])
+    return {'median': statistics.median(timings), 'best': min(timings), 'loaded': sorted(loaded)}
+
+
+def run(budgets=None, repeat=5):
+    """
+    Проверяет бюджеты времени импорта.
+
+    Returns:
+        bool: True, если все модули уложились в бюджет и не загрузили тяжелых зависимостей
+    """
+    budgets = IMPORT_BUDGETS if budgets is None else budgets
+    ok = True
+    for module, budget in budgets.items():
+        result = measure_import(module, repeat)
+        passed = result['median'] <= budget and not result['loaded']
+        ok &= passed
+        status = 'OK' if passed else 'ПРЕВЫШЕН'
+        print(f"{module:<20} медиана {result['median']:.3f}с, лучшее {result['best']:.3f}с, "
+              f"бюджет {budget:.2f}с - {status}")
+        if result['loaded']:
+            print(f"    загружены при импорте: {', '.join(result['loaded'])}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк времени импорта модулей")
+    parser.add_argument('--repeat', type=int, default=5, help="Число запусков на модуль")
+    args = parser.parse_args()
+    sys.exit(0 if run(repeat=args.repeat) else 1)
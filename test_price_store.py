@@ -0,0 +1,101 @@
+import pandas as pd
+
+from price_store import FramePriceSource, PriceStore, _empty_history
+
+
+class FlakySource(FramePriceSource):
+    """Источник, который первые failures запросов возвращает пустой ответ, как yfinance при сбое"""
+
+    def __init__(self, frames, failures=1):
+        super().__init__(frames)
+        self.failures = failures
+        self.calls = []
+
+    def get_history(self, tickers, start, end):
+        self.calls.append((list(tickers), start, end))
+        if self.failures > 0:
+            self.failures -= 1
+            return _empty_history(tickers)
+        return super().get_history(tickers, start, end)
+
+
+def _close_frame(start, periods):
+    index = pd.date_range(start, periods=periods, freq='B')
+    return pd.DataFrame({'Close': range(1, periods + 1)}, index=index, dtype=float)
+
+
+def test_empty_response_does_not_mark_range_covered():
+    source = FlakySource({'AAA': _close_frame('2024-01-01', 20)})
+    store = PriceStore(':memory:', source=source)
+
+    first = store.get_history(['AAA'], '2024-01-01', '2024-02-01')
+    assert first['Close']['AAA'].dropna().empty
+    assert store.missing_ranges(['AAA'], '2024-01-01', '2024-02-01')
+
+    second = store.get_history(['AAA'], '2024-01-01', '2024-02-01')
+    assert len(source.calls) == 2
+    assert len(second['Close']['AAA'].dropna()) == 20
+    assert not store.missing_ranges(['AAA'], '2024-01-01', '2024-02-01')
+
+
+def test_coverage_extends_only_for_returned_tickers():
+    source = FlakySource({'AAA': _close_frame('2024-01-01', 20)}, failures=0)
+    store = PriceStore(':memory:', source=source)
+
+    store.get_history(['AAA', 'BBB'], '2024-01-01', '2024-02-01')
+    assert store.missing_ranges(['AAA', 'BBB'], '2024-01-01', '2024-02-01') == {
+        (pd.Timestamp('2024-01-01'), pd.Timestamp('2024-02-01')): ['BBB']
+    }
+
+
+def test_missing_ranges_without_coverage_is_whole_range():
+    store = PriceStore(':memory:')
+    assert store.missing_ranges(['AAA', 'BBB'], '2024-01-01', '2024-02-01') == {
+        (pd.Timestamp('2024-01-01'), pd.Timestamp('2024-02-01')): ['AAA', 'BBB']
+    }
+
+
+def test_missing_ranges_are_gaps_around_coverage():
+    source = FlakySource({'AAA': _close_frame('2023-12-01', 60)}, failures=0)
+    store = PriceStore(':memory:', source=source)
+    store.get_history(['AAA'], '2024-01-01', '2024-02-01')
+
+    assert store.missing_ranges(['AAA'], '2023-12-01', '2024-03-01') == {
+        (pd.Timestamp('2023-12-01'), pd.Timestamp('2024-01-01')): ['AAA'],
+        (pd.Timestamp('2024-02-01'), pd.Timestamp('2024-03-01')): ['AAA'],
+    }
+    assert not store.missing_ranges(['AAA'], '2024-01-10', '2024-01-20')
+
+
+def test_covered_range_is_served_from_cache():
+    source = FlakySource({'AAA': _close_frame('2024-01-01', 20)}, failures=0)
+    store = PriceStore(':memory:', source=source)
+    first = store.get_history(['AAA'], '2024-01-01', '2024-02-01')
+
+    second = store.get_history(['AAA'], '2024-01-08', '2024-01-20')
+    assert len(source.calls) == 1
+    pd.testing.assert_series_equal(second['Close']['AAA'],
+                                   first['Close']['AAA'].loc['2024-01-08':'2024-01-19'])
+
+
+def test_extending_range_fetches_only_the_gap():
+    source = FlakySource({'AAA': _close_frame('2024-01-01', 40)}, failures=0)
+    store = PriceStore(':memory:', source=source)
+    store.get_history(['AAA'], '2024-01-01', '2024-02-01')
+
+    history = store.get_history(['AAA'], '2024-01-01', '2024-03-01')
+    assert source.calls[1] == (['AAA'], pd.Timestamp('2024-02-01'), pd.Timestamp('2024-03-01'))
+    assert len(history['Close']['AAA'].dropna()) == 40
+
+
+def test_ticker_never_returned_is_requested_on_every_run():
+    source = FlakySource({'AAA': _close_frame('2024-01-01', 20)}, failures=0)
+    store = PriceStore(':memory:', source=source)
+
+    for _ in range(3):
+        history = store.get_history(['AAA', 'ZZZ'], '2024-01-01', '2024-02-01')
+        assert history['Close']['ZZZ'].isna().all()
+        assert len(history['Close']['AAA'].dropna()) == 20
+
+    # Первый запрос - оба тикера, дальше только тикер без данных
+    assert [tickers for tickers, _, _ in source.calls] == [['AAA', 'ZZZ'], ['ZZZ'], ['ZZZ']]